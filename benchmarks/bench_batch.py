@@ -0,0 +1,62 @@
+"""
+Compares a list of measurement dicts with a columnar MeasurementBatch:
+memory per measurement, and time to build the request bodies.
+
+    python -m benchmarks.bench_batch --size 200000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from m3ter_client.batcher import MAX_BATCH_BYTES, MAX_BATCH_SIZE
+from m3ter_client.generator import generate_measurement_batch, generate_measurements
+from m3ter_client.streaming import encode_batch, iter_encoded_batches
+
+START_TS = "2024-12-01T00:00:00.000Z"
+END_TS = "2024-12-31T20:00:00.000Z"
+MEASURES = {"memory_consumption": (1, 100), "execution_time": (1000, 5000)}
+
+
+def traced(build):
+    """Returns (result, bytes allocated by build and still held, seconds)."""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, held, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=200000)
+    args = parser.parse_args()
+
+    measurements, dict_bytes, _ = traced(lambda: generate_measurements(
+        "meter", "account", START_TS, END_TS, args.size, MEASURES, seed=42)["measurements"])
+    batch, batch_bytes, _ = traced(lambda: generate_measurement_batch(
+        "meter", "account", START_TS, END_TS, args.size, MEASURES, seed=42))
+
+    started = time.perf_counter()
+    dict_bodies = [encode_batch(rows) for rows in
+                   iter_encoded_batches(measurements, MAX_BATCH_SIZE, MAX_BATCH_BYTES)]
+    dict_elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    batch_bodies = [encode_batch(rows) for rows in
+                    batch.encoded_batches(MAX_BATCH_SIZE, MAX_BATCH_BYTES)]
+    batch_elapsed = time.perf_counter() - started
+
+    print(f"{'':18} {'bytes/measurement':>18} {'encode':>10} {'measurements/s':>16}")
+    for name, held, elapsed in (("list of dicts", dict_bytes, dict_elapsed),
+                                ("MeasurementBatch", batch_bytes, batch_elapsed)):
+        print(f"{name:18} {held / args.size:18,.0f} {elapsed:9.2f}s "
+              f"{args.size / elapsed:16,.0f}")
+    print(f"{len(dict_bodies)} / {len(batch_bodies)} request bodies, "
+          f"{sum(map(len, dict_bodies)):,} / {sum(map(len, batch_bodies)):,} bytes")
+
+
+if __name__ == "__main__":
+    main()
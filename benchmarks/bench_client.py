@@ -0,0 +1,300 @@
+"""
+Throughput benchmarks of M3terApiClient against the local stand-in server.
+
+Runs the task1 - task3 provisioning flow and the task4 ingest flow at several
+batch sizes and concurrency levels and reports requests/s, measurements/s,
+p50/p95/p99 request latency and (with --memory) peak traced memory. The
+ingest flow is also run with AsyncM3terApiClient on one event loop.
+
+    python -m benchmarks.bench_client --latency 0.005 --accounts 100
+"""
+import argparse
+import asyncio
+import copy
+import json
+import math
+import multiprocessing
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import yaml
+
+from benchmarks.stub_server import StubM3terServer
+from m3ter_client.api_client import M3terApiClient
+from m3ter_client.async_client import AsyncM3terApiClient
+from m3ter_client.generator import generate_measurements
+from m3ter_client.provisioning import provision
+
+START_TS = "2024-12-01T00:00:00.000Z"
+END_TS = "2024-12-31T20:00:00.000Z"
+MEASURES = {
+    "memory_consumption_api_6": (1, 100),
+    "execution_time_api_6": (1000, 5000),
+}
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1,
+                max(0, math.ceil(p / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class LatencyRecorder:
+    """Session response hook that records the latency of every request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+
+    def __call__(self, response, **kwargs):
+        with self._lock:
+            self.latencies.append(response.elapsed.total_seconds())
+        return response
+
+
+def run_scenario(name: str, server_url: str, concurrency: int,
+                 body: Callable[[M3terApiClient], int], trace_memory: bool) -> Dict[str, Any]:
+    """
+    Runs body(client) and returns its metrics.
+    body returns the number of measurements it sent (0 for provisioning).
+    """
+    client = M3terApiClient("bench", "bench", "bench-org",
+                            pool_maxsize=max(concurrency, 1),
+                            base_url=server_url, ingest_url=server_url)
+    client.authenticate()
+    recorder = LatencyRecorder()
+    client.session.hooks["response"].append(recorder)
+
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        measurements = body(client)
+    finally:
+        elapsed = time.perf_counter() - started
+        peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+        if trace_memory:
+            tracemalloc.stop()
+        client.close()
+
+    return scenario_metrics(name, concurrency, recorder.latencies, elapsed,
+                            measurements, peak_memory)
+
+
+def run_async_scenario(name: str, server_url: str, concurrency: int,
+                       body: Callable[[AsyncM3terApiClient, List[float]], Awaitable[int]],
+                       trace_memory: bool) -> Dict[str, Any]:
+    """
+    run_scenario for AsyncM3terApiClient: awaits body(client, latencies) on
+    a new event loop. body appends the latency of every request it sends
+    and returns the number of measurements.
+    """
+
+    async def run() -> Dict[str, Any]:
+        async with AsyncM3terApiClient("bench", "bench", "bench-org",
+                                       max_concurrency=max(concurrency, 1),
+                                       pool_maxsize=max(concurrency, 1),
+                                       base_url=server_url, ingest_url=server_url) as client:
+            await client.authenticate()
+            latencies: List[float] = []
+            if trace_memory:
+                tracemalloc.start()
+            started = time.perf_counter()
+            try:
+                measurements = await body(client, latencies)
+            finally:
+                elapsed = time.perf_counter() - started
+                peak_memory = tracemalloc.get_traced_memory()[1] if trace_memory else None
+                if trace_memory:
+                    tracemalloc.stop()
+        return scenario_metrics(name, concurrency, latencies, elapsed, measurements, peak_memory)
+
+    return asyncio.run(run())
+
+
+def scenario_metrics(name: str, concurrency: int, latencies: List[float], elapsed: float,
+                     measurements: int, peak_memory: Optional[int]) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "requests_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "measurements_per_sec": measurements / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "peak_memory_mb": peak_memory / 2**20 if peak_memory is not None else None,
+    }
+
+
+def scaled_catalog(mock_data: Dict[str, Any], accounts: int) -> Dict[str, Any]:
+    """Copy of mock_data with the Account list grown to the given size."""
+    catalog = copy.deepcopy(mock_data)
+    templates = catalog["Account"]
+    catalog["Account"] = []
+    for index in range(accounts):
+        account = copy.deepcopy(templates[index % len(templates)])
+        account["code"] = f"{account['code']}_{index}"
+        account["name"] = f"{account['name']} {index}"
+        catalog["Account"].append(account)
+    return catalog
+
+
+def provisioning_scenarios(server_url: str, mock_data: Dict[str, Any], accounts: int,
+                           concurrency_levels: Sequence[int], trace_memory: bool) -> List[Dict[str, Any]]:
+    results = []
+    for concurrency in concurrency_levels:
+        catalog = scaled_catalog(mock_data, accounts)
+
+        def body(client, catalog=catalog, concurrency=concurrency):
+            provision(client, catalog, max_workers=concurrency)
+            return 0
+
+        results.append(run_scenario(
+            f"provision accounts={accounts}", server_url, concurrency, body, trace_memory))
+    return results
+
+
+def ingest_scenarios(server_url: str, total: int, batch_sizes: Sequence[int],
+                     concurrency_levels: Sequence[int], trace_memory: bool) -> List[Dict[str, Any]]:
+    measurements = generate_measurements(
+        "bench_meter", "bench_account", START_TS, END_TS, total, MEASURES, seed=1)["measurements"]
+
+    results = []
+    for batch_size in batch_sizes:
+        batches = [measurements[i:i + batch_size]
+                   for i in range(0, len(measurements), batch_size)]
+        for concurrency in concurrency_levels:
+
+            def body(client, batches=batches, concurrency=concurrency):
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    list(executor.map(
+                        lambda batch: client.ingest_usage({"measurements": batch}), batches))
+                return sum(len(batch) for batch in batches)
+
+            results.append(run_scenario(
+                f"ingest batch={batch_size}", server_url, concurrency, body, trace_memory))
+    return results
+
+
+def async_ingest_scenarios(server_url: str, total: int, batch_sizes: Sequence[int],
+                           concurrency_levels: Sequence[int],
+                           trace_memory: bool) -> List[Dict[str, Any]]:
+    measurements = generate_measurements(
+        "bench_meter", "bench_account", START_TS, END_TS, total, MEASURES, seed=1)["measurements"]
+
+    results = []
+    for batch_size in batch_sizes:
+        batches = [measurements[i:i + batch_size]
+                   for i in range(0, len(measurements), batch_size)]
+        for concurrency in concurrency_levels:
+
+            async def body(client, latencies, batches=batches, concurrency=concurrency):
+                # concurrency tasks share the batches, so no request waits on
+                # the client's semaphore and latencies are request times only
+                remaining = iter(batches)
+
+                async def worker():
+                    for batch in remaining:
+                        started = time.perf_counter()
+                        await client.ingest_usage({"measurements": batch})
+                        latencies.append(time.perf_counter() - started)
+
+                await asyncio.gather(*(worker() for _ in range(concurrency)))
+                return sum(len(batch) for batch in batches)
+
+            results.append(run_async_scenario(
+                f"async ingest batch={batch_size}", server_url, concurrency, body, trace_memory))
+    return results
+
+
+def _serve_stub(latency: float, jitter: float, urls: multiprocessing.Queue) -> None:
+    server = StubM3terServer(latency=latency, jitter=jitter, seed=1)
+    urls.put(server.url)
+    server.serve_forever()
+
+
+def start_stub_process(latency: float, jitter: float) -> Tuple[multiprocessing.Process, str]:
+    """
+    Starts the stand-in server in a child process, so it does not compete
+    with the benchmarked client for the GIL. Returns (process, url).
+    """
+    urls = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_serve_stub, args=(latency, jitter, urls), daemon=True)
+    process.start()
+    return process, urls.get(timeout=10)
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    header = (f"{'scenario':<28}{'conc':>5}{'requests':>10}{'req/s':>10}"
+              f"{'meas/s':>12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'mem MB':>9}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        memory = f"{r['peak_memory_mb']:.1f}" if r["peak_memory_mb"] is not None else "-"
+        print(f"{r['scenario']:<28}{r['concurrency']:>5}{r['requests']:>10}"
+              f"{r['requests_per_sec']:>10.0f}{r['measurements_per_sec']:>12.0f}"
+              f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}{memory:>9}")
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mock-data", default="mock_data.yaml")
+    parser.add_argument("--accounts", type=int, default=50,
+                        help="accounts in the provisioning catalog")
+    parser.add_argument("--measurements", type=int, default=20000,
+                        help="measurements sent per ingest scenario")
+    parser.add_argument("--batch-sizes", type=_int_list, default=[1, 100, 1000])
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4, 16])
+    parser.add_argument("--latency", type=float, default=0.002,
+                        help="stand-in server latency per request in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--server-url",
+                        help="benchmark an already running server instead of a local stand-in")
+    parser.add_argument("--memory", action="store_true",
+                        help="trace peak memory (slows the run down)")
+    parser.add_argument("--json", dest="json_path",
+                        help="also write results to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.mock_data, "r") as file:
+        mock_data = yaml.safe_load(file)
+
+    process = None
+    server_url = args.server_url
+    if server_url is None:
+        process, server_url = start_stub_process(args.latency, args.jitter)
+
+    try:
+        results = provisioning_scenarios(
+            server_url, mock_data, args.accounts, args.concurrency, args.memory)
+        results += ingest_scenarios(
+            server_url, args.measurements, args.batch_sizes, args.concurrency, args.memory)
+        results += async_ingest_scenarios(
+            server_url, args.measurements, args.batch_sizes, args.concurrency, args.memory)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.join()
+
+    print_results(results)
+    if args.json_path:
+        with open(args.json_path, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
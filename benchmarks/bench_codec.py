@@ -0,0 +1,56 @@
+"""
+Compares JSON backends and gzip levels for ingest request bodies: encode
+time, compression time and bytes on the wire per batch.
+
+    python -m benchmarks.bench_codec --size 50000
+"""
+import argparse
+import json
+import time
+
+from m3ter_client.batcher import MAX_BATCH_SIZE
+from m3ter_client.codec import JSON_BACKEND, dumps, gzip_body
+from m3ter_client.generator import generate_measurements
+
+START_TS = "2024-12-01T00:00:00.000Z"
+END_TS = "2024-12-31T20:00:00.000Z"
+MEASURES = {"memory_consumption": (1, 100), "execution_time": (1000, 5000)}
+GZIP_LEVELS = (1, 6, 9)
+
+
+def timed(encode, payloads):
+    """Returns (bodies, seconds) for encoding every payload."""
+    started = time.perf_counter()
+    bodies = [encode(payload) for payload in payloads]
+    return bodies, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE)
+    args = parser.parse_args()
+
+    measurements = generate_measurements(
+        "meter", "account", START_TS, END_TS, args.size, MEASURES, seed=42)["measurements"]
+    payloads = [{"measurements": measurements[i:i + args.batch_size]}
+                for i in range(0, len(measurements), args.batch_size)]
+
+    stdlib_bodies, stdlib_elapsed = timed(lambda p: json.dumps(p).encode("utf-8"), payloads)
+    bodies, elapsed = timed(dumps, payloads)
+    raw_bytes = sum(map(len, bodies))
+
+    print(f"{len(payloads)} bodies of up to {args.batch_size} measurements")
+    print(f"{'':18} {'encode':>10} {'measurements/s':>16} {'bytes':>14} {'ratio':>7}")
+    for name, encoded, seconds in (("json.dumps", stdlib_bodies, stdlib_elapsed),
+                                   (f"codec ({JSON_BACKEND})", bodies, elapsed)):
+        print(f"{name:18} {seconds:9.3f}s {args.size / seconds:16,.0f} "
+              f"{sum(map(len, encoded)):14,} {sum(map(len, encoded)) / raw_bytes:7.2f}")
+    for level in GZIP_LEVELS:
+        compressed, seconds = timed(lambda body: gzip_body(body, level), bodies)
+        print(f"{'+ gzip ' + str(level):18} {seconds:9.3f}s {args.size / seconds:16,.0f} "
+              f"{sum(map(len, compressed)):14,} {sum(map(len, compressed)) / raw_bytes:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compares measurement generation throughput of the per-row
+generate_measurements_payload and the batched generate_measurements.
+
+    python -m benchmarks.bench_generator --size 200000
+"""
+import argparse
+import time
+
+from m3ter_client.generator import (generate_measurements,
+                                    generate_measurements_payload)
+
+START_TS = "2024-12-01T00:00:00.000Z"
+END_TS = "2024-12-31T20:00:00.000Z"
+MEASURES = {
+    "memory_consumption_api_3": (1, 100),
+    "execution_time_api_3": (1000, 5000),
+}
+
+
+def rows_per_second(func, size: int) -> float:
+    started = time.perf_counter()
+    payload = func(size)
+    elapsed = time.perf_counter() - started
+    assert len(payload["measurements"]) == size
+    return size / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=200000,
+                        help="measurements generated per run")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per generator, best run is reported")
+    args = parser.parse_args()
+
+    def per_row(size):
+        return generate_measurements_payload("meter", "account", START_TS, END_TS, size,
+                                             *MEASURES)
+
+    def batched(size):
+        return generate_measurements("meter", "account", START_TS, END_TS, size,
+                                     MEASURES, seed=42)
+
+    per_row_rate = max(rows_per_second(per_row, args.size)
+                       for _ in range(args.repeat))
+    batched_rate = max(rows_per_second(batched, args.size)
+                       for _ in range(args.repeat))
+
+    print(f"generate_measurements_payload: {per_row_rate:>12,.0f} rows/s")
+    print(f"generate_measurements:         {batched_rate:>12,.0f} rows/s")
+    print(f"speedup:                       {batched_rate / per_row_rate:>12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
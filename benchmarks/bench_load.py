@@ -0,0 +1,65 @@
+"""
+Open-loop ingest load against the local stand-in server (or any --url):
+events arrive at a target rate whether or not the server keeps up, and
+latency percentiles are reported corrected for coordinated omission.
+
+    python -m benchmarks.bench_load --rate 2000 --duration 30 --arrivals poisson --stall-rate 0.01
+"""
+import argparse
+import json
+
+from benchmarks.stub_server import StubM3terServer
+from m3ter_client.api_client import M3terApiClient
+from m3ter_client.load_generator import (CONSTANT, DEFAULT_LOAD_BATCH_SIZE, DEFAULT_LOAD_IN_FLIGHT,
+                                         POISSON, LoadStage, load_codes, parse_profile, run_load)
+
+START_TS = "2024-12-01T00:00:00.000Z"
+END_TS = "2024-12-31T20:00:00.000Z"
+MEASURES = {"memory_consumption": (1, 100), "execution_time": (1000, 5000)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=1000.0, help="events per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    parser.add_argument("--profile", help="DURATION:RATE[-RATE],... stages instead of --rate")
+    parser.add_argument("--arrivals", choices=(CONSTANT, POISSON), default=CONSTANT)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_LOAD_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_LOAD_IN_FLIGHT)
+    parser.add_argument("--accounts", type=int, default=100, help="distinct account codes")
+    parser.add_argument("--meters", type=int, default=1, help="distinct meter codes")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--url", help="running stand-in to target instead of starting one")
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall", type=float, default=1.0)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    stages = parse_profile(args.profile) if args.profile else [LoadStage(args.duration, args.rate)]
+    server = None
+    url = args.url
+    if url is None:
+        server = StubM3terServer(latency=args.latency, jitter=args.jitter,
+                                 stall_rate=args.stall_rate, stall=args.stall,
+                                 seed=args.seed).start()
+        url = server.url
+    try:
+        with M3terApiClient("bench", "bench", "bench-org", pool_maxsize=args.concurrency,
+                            base_url=url, ingest_url=url) as client:
+            client.authenticate()
+            result = run_load(client, stages, load_codes([], args.meters, "load-meter"),
+                              load_codes([], args.accounts, "load-account"), MEASURES,
+                              START_TS, END_TS, arrivals=args.arrivals,
+                              batch_size=args.batch_size, max_in_flight=args.concurrency,
+                              seed=args.seed)
+    finally:
+        if server is not None:
+            server.stop()
+
+    print(json.dumps(result.summary(), indent=2) if args.json else result.format_report())
+
+
+if __name__ == "__main__":
+    main()
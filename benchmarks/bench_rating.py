@@ -0,0 +1,70 @@
+"""
+Measures shadow-rating throughput of ShadowRater for the meter, aggregations
+and pricing in mock_data.yaml, column-wise and from measurement dicts.
+
+    python -m benchmarks.bench_rating --size 20000000
+"""
+import argparse
+import time
+
+import numpy as np
+import yaml
+
+from m3ter_client.generator import (generate_measurement_columns,
+                                    generate_measurements)
+from m3ter_client.rating import ShadowRater
+
+START_TS = "2024-12-01T00:00:00.000Z"
+END_TS = "2024-12-31T20:00:00.000Z"
+CHUNK_SIZE = 1000000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=20000000,
+                        help="measurements rated column-wise")
+    parser.add_argument("--dict-size", type=int, default=500000,
+                        help="measurements rated from dicts")
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--mock-data", default="mock_data.yaml")
+    args = parser.parse_args()
+
+    with open(args.mock_data, "r") as file:
+        mock_data = yaml.safe_load(file)
+    measures = {field["code"]: (1, 100) for field in mock_data["Meter"]["dataFields"]}
+    rng = np.random.default_rng(42)
+    account_codes = np.array([f"account_{i}" for i in range(args.accounts)])
+
+    # generation is not timed: draw one chunk and rate it repeatedly
+    chunk = generate_measurement_columns(START_TS, END_TS, min(CHUNK_SIZE, args.size),
+                                         measures, rng)
+    chunk_accounts = account_codes[rng.integers(0, args.accounts, size=len(chunk["ts"]))]
+
+    rater = ShadowRater.from_mock_data(mock_data)
+    started = time.perf_counter()
+    remaining = args.size
+    while remaining > 0:
+        count = min(remaining, len(chunk["ts"]))
+        rater.add_columns(chunk_accounts[:count],
+                          {code: values[:count] for code, values in chunk["measure"].items()},
+                          chunk["ts"][:count])
+        remaining -= count
+    line_items = rater.line_items()
+    columnar_elapsed = time.perf_counter() - started
+
+    measurements = generate_measurements("meter", "account_0", START_TS, END_TS,
+                                         args.dict_size, measures, seed=42)["measurements"]
+    rater = ShadowRater.from_mock_data(mock_data)
+    started = time.perf_counter()
+    rater.add(measurements)
+    rater.line_items()
+    dict_elapsed = time.perf_counter() - started
+
+    print(f"add_columns: {args.size:>12,} measurements in {columnar_elapsed:6.2f}s "
+          f"({args.size / columnar_elapsed:>12,.0f}/s), {len(line_items)} line items")
+    print(f"add (dicts): {args.dict_size:>12,} measurements in {dict_elapsed:6.2f}s "
+          f"({args.dict_size / dict_elapsed:>12,.0f}/s)")
+
+
+if __name__ == "__main__":
+    main()
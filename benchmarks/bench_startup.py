@@ -0,0 +1,50 @@
+"""
+Measures the startup time of the command line (python main.py --help)
+against a bare interpreter and checks it against main.STARTUP_BUDGET.
+Exits with 1 when the median overhead is over the budget.
+
+    python -m benchmarks.bench_startup --runs 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from main import STARTUP_BUDGET
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def time_command(command, runs: int) -> float:
+    """Median wall time in seconds of running command runs times."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET,
+                        help="allowed overhead over the bare interpreter, in seconds")
+    args = parser.parse_args()
+
+    baseline = time_command([sys.executable, "-c", "pass"], args.runs)
+    cli = time_command([sys.executable, MAIN_PATH, "--help"], args.runs)
+    overhead = cli - baseline
+    within = overhead <= args.budget
+
+    print(f"python -c pass:      {baseline * 1000:8.1f} ms")
+    print(f"python main.py --help: {cli * 1000:6.1f} ms")
+    print(f"overhead:            {overhead * 1000:8.1f} ms "
+          f"({'within' if within else 'OVER'} the {args.budget * 1000:.0f} ms budget)")
+    return within
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,371 @@
+"""
+Local stand-in for the m3ter config and ingest APIs.
+
+Implements the endpoints M3terApiClient uses (token, entity create, list
+and get, measurements), with configurable latency, stalls, error rate and
+429 throttling, so the client can be benchmarked offline. A measurement batch
+with an invalid measurement is rejected whole with 400, like the real API.
+Gzip request bodies (Content-Encoding: gzip) are decompressed.
+
+    python -m benchmarks.stub_server --port 8080 --latency 0.02 --throttle-rate 0.01
+"""
+import argparse
+import gzip
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+ENTITY_TYPES = ("products", "meters", "aggregations", "plantemplates", "plans",
+                "pricings", "accounts", "accountplans")
+
+_ENTITY_PATH = re.compile(r"^/organizations/([^/]+)/([a-z]+)$")
+_ENTITY_ID_PATH = re.compile(r"^/organizations/([^/]+)/([a-z]+)/([^/]+)$")
+_MEASUREMENTS_PATH = re.compile(r"^/organizations/([^/]+)/measurements$")
+
+TOKEN_LIFETIME = 18000
+
+
+def _measurement_error(measurement: Any) -> Optional[str]:
+    if not isinstance(measurement, dict):
+        return "measurement is not an object"
+    for key in ("uid", "meter", "account", "ts"):
+        if not isinstance(measurement.get(key), str) or not measurement[key]:
+            return f"{key} is missing"
+    for group in ("measure", "cost", "income"):
+        values = measurement.get(group, {})
+        if not isinstance(values, dict) or not all(
+                isinstance(value, (int, float)) and not isinstance(value, bool)
+                for value in values.values()):
+            return f"{group} values must be numbers"
+    return None
+
+
+class StubStats:
+    """Request counters of a running stub server."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.tokens_issued = 0
+        self.entities_created = 0
+        self.measurements_received = 0
+        # request body bytes after decompression, and before it for gzip bodies
+        self.bytes_received = 0
+        self.compressed_bytes_received = 0
+        self.batches_rejected = 0
+        self.errors_injected = 0
+        self.stalled = 0
+        self.throttled = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "tokens_issued": self.tokens_issued,
+                "entities_created": self.entities_created,
+                "measurements_received": self.measurements_received,
+                "bytes_received": self.bytes_received,
+                "compressed_bytes_received": self.compressed_bytes_received,
+                "batches_rejected": self.batches_rejected,
+                "errors_injected": self.errors_injected,
+                "stalled": self.stalled,
+                "throttled": self.throttled,
+            }
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real endpoints
+
+    def setup(self) -> None:
+        super().setup()
+        # headers and body are written separately; without TCP_NODELAY the
+        # body waits for the client's delayed ACK (~40 ms per request)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any],
+                   headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self) -> bytes:
+        body = self._read_raw_body()
+        if self.headers.get("Content-Encoding", "").lower() == "gzip":
+            with self.server.stats.lock:
+                self.server.stats.compressed_bytes_received += len(body)
+            body = gzip.decompress(body)
+        with self.server.stats.lock:
+            self.server.stats.bytes_received += len(body)
+        return body
+
+    def _read_raw_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b"".join(chunks)
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _inject_faults(self) -> bool:
+        """Applies latency and error injection; returns True if a response was sent."""
+        server = self.server
+        if server.latency or server.jitter:
+            time.sleep(server.latency + server.random.uniform(0, server.jitter))
+        if server.stall_rate and server.random.random() < server.stall_rate:
+            with server.stats.lock:
+                server.stats.stalled += 1
+            time.sleep(server.stall)
+
+        roll = server.random.random()
+        if roll < server.throttle_rate:
+            with server.stats.lock:
+                server.stats.throttled += 1
+            self._send_json(429, {"message": "Too Many Requests"},
+                            {"Retry-After": str(server.retry_after)})
+            return True
+        if roll < server.throttle_rate + server.error_rate:
+            with server.stats.lock:
+                server.stats.errors_injected += 1
+            self._send_json(500, {"message": "Injected server error"})
+            return True
+        return False
+
+    def do_POST(self) -> None:
+        server = self.server
+        body = self._read_body()
+        with server.stats.lock:
+            server.stats.requests += 1
+
+        if self._inject_faults():
+            return
+
+        if self.path == "/oauth/token":
+            if not self.headers.get("Authorization", "").startswith("Basic "):
+                self._send_json(401, {"message": "Missing client credentials"})
+                return
+            with server.stats.lock:
+                server.stats.tokens_issued += 1
+            self._send_json(200, {"access_token": uuid.uuid4().hex,
+                                  "token_type": "Bearer",
+                                  "expires_in": TOKEN_LIFETIME})
+            return
+
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            self._send_json(401, {"message": "Unauthorized"})
+            return
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            self._send_json(400, {"message": "Malformed JSON body"})
+            return
+
+        if _MEASUREMENTS_PATH.match(self.path):
+            measurements = payload.get("measurements")
+            if not isinstance(measurements, list):
+                self._send_json(400, {"message": "measurements must be a list"})
+                return
+            errors = [(index, error) for index, error in
+                      ((index, _measurement_error(m)) for index, m in enumerate(measurements))
+                      if error]
+            if errors:
+                with server.stats.lock:
+                    server.stats.batches_rejected += 1
+                body = {"message": f"{len(errors)} invalid measurements"}
+                if server.identify_rejects:
+                    body["errors"] = [{"index": index, "message": error} for index, error in errors]
+                self._send_json(400, body)
+                return
+            with server.stats.lock:
+                server.stats.measurements_received += len(measurements)
+            self._send_json(200, {"result": "accepted"})
+            return
+
+        match = _ENTITY_PATH.match(self.path)
+        if match and match.group(2) in ENTITY_TYPES:
+            entity = {**payload, "id": str(uuid.uuid4()), "version": 1}
+            with server.stats.lock:
+                server.stats.entities_created += 1
+                server.entities.setdefault(match.groups(), {})[entity["id"]] = entity
+            self._send_json(200, entity)
+            return
+
+        self._send_json(404, {"message": f"Unknown endpoint {self.path}"})
+
+    def do_GET(self) -> None:
+        server = self.server
+        with server.stats.lock:
+            server.stats.requests += 1
+
+        if self._inject_faults():
+            return
+
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            self._send_json(401, {"message": "Unauthorized"})
+            return
+
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+
+        match = _ENTITY_ID_PATH.match(url.path)
+        if match and match.group(2) in ENTITY_TYPES:
+            with server.stats.lock:
+                entity = server.entities.get(match.groups()[:2], {}).get(match.group(3))
+            if entity is None:
+                self._send_json(404, {"message": "Entity not found"})
+            else:
+                self._send_json(200, entity)
+            return
+
+        match = _ENTITY_PATH.match(url.path)
+        if match and match.group(2) in ENTITY_TYPES:
+            # nextToken is simply the offset of the next page
+            page_size = int(query.get("pageSize", ["100"])[0])
+            offset = int(query.get("nextToken", ["0"])[0])
+            codes = set(query.get("codes", []))
+            with server.stats.lock:
+                entities = [entity for entity in server.entities.get(match.groups(), {}).values()
+                            if not codes or entity.get("code") in codes]
+            page = entities[offset:offset + page_size]
+            body = {"data": page}
+            if offset + page_size < len(entities):
+                body["nextToken"] = str(offset + page_size)
+            self._send_json(200, body)
+            return
+
+        self._send_json(404, {"message": f"Unknown endpoint {self.path}"})
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address) -> None:
+        # clients closing keep-alive connections is normal, not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubM3terServer:
+    """
+    Threaded HTTP server that imitates api.m3ter.com and ingest.m3ter.com.
+    Every request waits latency + uniform(0, jitter) seconds, stall_rate of
+    them stall stall seconds more (a stuck connection), then fails with
+    429 (throttle_rate) or 500 (error_rate), or succeeds. With
+    identify_rejects the 400 for a rejected batch lists the bad rows.
+    Use url as both base_url and ingest_url of the client.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 retry_after: int = 1, seed: Optional[int] = None,
+                 identify_rejects: bool = False,
+                 stall_rate: float = 0.0, stall: float = 5.0):
+        self._server = _StubHTTPServer((host, port), _StubHandler)
+        self._server.latency = latency
+        self._server.jitter = jitter
+        self._server.error_rate = error_rate
+        self._server.throttle_rate = throttle_rate
+        self._server.retry_after = retry_after
+        self._server.identify_rejects = identify_rejects
+        self._server.stall_rate = stall_rate
+        self._server.stall = stall
+        self._server.random = random.Random(seed)
+        self._server.stats = StubStats()
+        # (org id, entity type) -> {id: entity}, guarded by stats.lock
+        self._server.entities = {}
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self) -> StubStats:
+        return self._server.stats
+
+    def start(self) -> "StubM3terServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="m3ter-stub-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def serve_forever(self) -> None:
+        """Runs the server in the calling thread until interrupted."""
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def __enter__(self) -> "StubM3terServer":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local m3ter stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="maximum random seconds added on top of latency")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0,
+                        help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1,
+                        help="Retry-After seconds sent with 429 responses")
+    parser.add_argument("--identify-rejects", action="store_true",
+                        help="list the invalid measurements in 400 responses")
+    parser.add_argument("--stall-rate", type=float, default=0.0,
+                        help="fraction of requests that stall for --stall seconds")
+    parser.add_argument("--stall", type=float, default=5.0,
+                        help="seconds a stalled request waits before responding")
+    args = parser.parse_args()
+
+    server = StubM3terServer(args.host, args.port, args.latency, args.jitter,
+                             args.error_rate, args.throttle_rate, args.retry_after,
+                             identify_rejects=args.identify_rejects,
+                             stall_rate=args.stall_rate, stall=args.stall)
+    print(f"m3ter stand-in listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.stats.snapshot()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,233 @@
-import base64
 import logging
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
 
 import requests
 
+from m3ter_client.auth import DEFAULT_REFRESH_MARGIN, BearerTokenAuth, TokenManager
+from m3ter_client.cache import MISSING, CodeIndex, TTLCache
+from m3ter_client.codec import DEFAULT_GZIP_THRESHOLD, BodyEncoder, dumps
+from m3ter_client.metrics import ClientMetrics, InstrumentedSession
+from m3ter_client.rate_limit import AdaptiveRateLimiter, RateLimitedHTTPAdapter
+from m3ter_client.resilience import (DEFAULT_HEDGE_PERCENTILE, CircuitBreaker,
+                                     GuardedHTTPAdapter, Hedger, Timeout)
+from m3ter_client.structured_log import PayloadSummary, StructuredLogger, truncate
+
 # Keep module-level logger
 logger = logging.getLogger(__name__)
 
+# Connection pool defaults for the shared HTTP transport.
+# pool_connections is the number of per-host pools kept by each adapter,
+# pool_maxsize is the number of keep-alive connections held per host.
+DEFAULT_POOL_CONNECTIONS = 2
+DEFAULT_POOL_MAXSIZE = 10
 
-class AuthenticationError(Exception):
-    """Custom exception for authentication failures."""
-    pass
+# Entities per page for list_* requests
+DEFAULT_PAGE_SIZE = 100
+# get_* responses are cached for this many seconds
+DEFAULT_CACHE_TTL = 300.0
 
+# Starting request rates (per second) of the adaptive rate limiters
+DEFAULT_CONFIG_RATE = 50.0
+DEFAULT_INGEST_RATE = 100.0
+
+# (connect, read) timeouts in seconds per operation. A connect timeout just
+# above a multiple of 3s lets one lost SYN be retransmitted; ingest reads
+# are kept short because a stuck batch is hedged or resent anyway
+DEFAULT_TIMEOUTS: Dict[str, Timeout] = {
+    "token": (3.05, 15.0),
+    "create": (3.05, 30.0),
+    "read": (3.05, 30.0),
+    "ingest": (3.05, 10.0),
+}
+
+# Successful ingest requests are logged once per this many, errors always
+DEFAULT_LOG_SAMPLING = {"usage.submitted": 100}
+
+DEFAULT_BASE_URL = "https://api.m3ter.com"
+DEFAULT_INGEST_URL = "https://ingest.m3ter.com"
 
-class M3terApiClient:
 
-    def __init__(self, access_key, api_secret, org_id):
+class M3terApiClient:
 
-        self.base_url = "https://api.m3ter.com"
-        self.ingest_url = "https://ingest.m3ter.com"
-        self.token = None
+    def __init__(self, access_key, api_secret, org_id,
+                 pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 pool_block: bool = False,
+                 base_url: str = DEFAULT_BASE_URL,
+                 ingest_url: str = DEFAULT_INGEST_URL,
+                 token_cache_path: Optional[str] = None,
+                 refresh_margin: float = DEFAULT_REFRESH_MARGIN,
+                 cache_ttl: float = DEFAULT_CACHE_TTL,
+                 adaptive_rate_limit: bool = True,
+                 metrics: Optional[ClientMetrics] = None,
+                 log_sampling: Optional[Dict[str, int]] = None,
+                 gzip_level: Optional[int] = None,
+                 gzip_threshold: int = DEFAULT_GZIP_THRESHOLD,
+                 timeouts: Optional[Dict[str, Timeout]] = None,
+                 hedge_percentile: Optional[float] = DEFAULT_HEDGE_PERCENTILE,
+                 circuit_breaker: bool = True):
+
+        self.base_url = base_url
+        self.ingest_url = ingest_url
 
         self.access_key = access_key
         self.api_secret = api_secret
         self.org_id = org_id
 
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+
+        # One rate governor per endpoint family, so ingest throttling
+        # does not slow down config API calls and vice versa
+        self.config_rate_limiter = None
+        self.ingest_rate_limiter = None
+        if adaptive_rate_limit:
+            self.config_rate_limiter = AdaptiveRateLimiter(
+                rate=DEFAULT_CONFIG_RATE, concurrency=pool_maxsize, max_concurrency=pool_maxsize)
+            self.ingest_rate_limiter = AdaptiveRateLimiter(
+                rate=DEFAULT_INGEST_RATE, concurrency=pool_maxsize, max_concurrency=pool_maxsize)
+
+        # Per-operation timeouts, see DEFAULT_TIMEOUTS
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        # One circuit breaker per API host: while a host keeps failing,
+        # requests to it fail fast instead of waiting for their timeouts
+        self.config_breaker = self.ingest_breaker = None
+        if circuit_breaker:
+            self.config_breaker = CircuitBreaker(base_url)
+            self.ingest_breaker = CircuitBreaker(ingest_url)
+        # Ingest requests slower than hedge_percentile of recent ones are sent
+        # a second time (m3ter deduplicates measurements by uid); None disables
+        self.hedger = Hedger(hedge_percentile, max_workers=2 * pool_maxsize) \
+            if hedge_percentile is not None else None
+
+        # Per-endpoint request metrics, see client.metrics.snapshot()
+        self.metrics = metrics if metrics is not None else ClientMetrics()
+        # Ingest bodies are encoded with the fastest JSON backend available
+        # and, with gzip_level set, gzip compressed from gzip_threshold bytes
+        self.body_encoder = BodyEncoder(gzip_level, gzip_threshold)
+        # Request events, sampled per event name (see DEFAULT_LOG_SAMPLING)
+        self.log = StructuredLogger(
+            logger, DEFAULT_LOG_SAMPLING if log_sampling is None else log_sampling)
+        self.session = self._create_session()
+
+        # Every request gets its bearer token from the token manager, which
+        # refreshes it before expiry; a 401 triggers one refresh and resend
+        self.token_manager = TokenManager(
+            self.session, self.base_url, access_key, api_secret,
+            refresh_margin=refresh_margin, cache_path=token_cache_path,
+            timeout=self.timeouts["token"])
+        self._authenticated = False
+
+        # get_* results by (entity type, id), and entity code -> id lookups
+        self.entity_cache = TTLCache(ttl=cache_ttl)
+        self.code_index = CodeIndex(self, ttl=cache_ttl)
+
+    @property
+    def token(self) -> Optional[str]:
+        """Current access token (refreshed if needed), None until authenticate() has been called."""
+        return self.token_manager.get_token() if self._authenticated else None
+
+    def _create_session(self) -> requests.Session:
+        """
+        Builds the pooled keep-alive session every request goes through.
+        The config API and the ingest API get their own adapter, so each
+        host has a separate connection pool sized by pool_maxsize, its own
+        circuit breaker and its own adaptive rate limiter when
+        adaptive_rate_limit is on. Requests sent without a timeout get the
+        host's default one. Every request is recorded in self.metrics.
+        """
+        session = InstrumentedSession(self.metrics)
+        session.headers.update({
+            "Content-Type": "application/json",
+            "Connection": "keep-alive"
+        })
+        for url, limiter, breaker, timeout in (
+                (self.base_url, self.config_rate_limiter, self.config_breaker,
+                 self.timeouts["read"]),
+                (self.ingest_url, self.ingest_rate_limiter, self.ingest_breaker,
+                 self.timeouts["ingest"])):
+            adapter_options = {"pool_connections": self.pool_connections,
+                               "pool_maxsize": self.pool_maxsize,
+                               "pool_block": self.pool_block,
+                               "timeout": timeout, "breaker": breaker}
+            if limiter is not None:
+                adapter = RateLimitedHTTPAdapter(limiter, **adapter_options)
+            else:
+                adapter = GuardedHTTPAdapter(**adapter_options)
+            session.mount(url, adapter)
+        return session
+
+    def close(self) -> None:
+        """Closes the session and releases all pooled connections."""
+        if self.hedger is not None:
+            self.hedger.close()
+        self.session.close()
+
+    def __enter__(self) -> "M3terApiClient":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
     def authenticate(self) -> None:
-        """Authenticate and store access token."""
-        auth_url = f"{self.base_url}/oauth/token"
-        creds = base64.b64encode(
-            f'{self.access_key}:{self.api_secret}'.encode('ascii')).decode()
+        """
+        Authenticate and store access token.
+        A still valid token from the token cache file is reused without a request.
+        """
+        self.token_manager.get_token()
+        self.session.auth = BearerTokenAuth(self.token_manager)
+        self._authenticated = True
 
-        headers = {
-            'Authorization': f'Basic {creds}'
-        }
+    def _post(self, url: str, action: str, summary: PayloadSummary,
+              hedge: bool = False, **kwargs) -> requests.Response:
+        """
+        Sends a POST request and returns the response.
+        With hedge, the request must be idempotent and is sent through
+        self.hedger. Failures are logged with a summary of the payload
+        instead of the payload itself, and raised as an Exception.
+        """
+        if not self.token:
+            raise Exception("Not authenticated. Call authenticate() first.")
 
-        try:
-            response = requests.post(
-                auth_url, json={"grant_type": "client_credentials"}, headers=headers)
+        def send() -> requests.Response:
+            response = self.session.post(url, **kwargs)
             response.raise_for_status()
-            self.token = response.json()["access_token"]
-            logger.info("Authentication successful")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Authentication failed: {str(e)}")
-            # raise Exception(f"Authentication failed: {e}")
-            raise AuthenticationError(
-                f"Authentication failed: {str(e)}") from e
+            return response
+
+        try:
+            if hedge and self.hedger is not None:
+                return self.hedger.call(send)
+            return send()
+
+        except requests.RequestException as e:
+            # e.response is None for connection errors; a 4xx response is
+            # falsy, so it has to be compared with None
+            response = getattr(e, "response", None)
+            status_code = response.status_code if response is not None else "N/A"
+            error_content = truncate(response.text) if response is not None else None
+
+            self.log.error("request.failed", action=action, status=status_code,
+                           payload=summary, response=error_content, error=e)
+
+            # Raise an exception with details
+            raise Exception(
+                f"Failed to {action}: {str(e)} (Status Code: {status_code})") from e
+
+    def _create(self, resource: str, entity: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POSTs one config entity and returns the created entity."""
+        url = f"{self.base_url}/organizations/{self.org_id}/{resource}"
+        response = self._post(url, f"create {entity}", PayloadSummary(payload), json=payload,
+                              timeout=self.timeouts["create"])
+        created = response.json()
+        self.log.info("entity.created", entity=entity, code=created.get("code"),
+                      id=created.get("id"))
+        if created.get("id") is not None:
+            # lookups right after a create must not wait for the index to expire
+            self.entity_cache.set((resource, created["id"]), created)
+            if created.get("code") is not None:
+                self.code_index.add(resource, created["code"], created["id"])
+        return created
 
     # Task 1
 
@@ -55,99 +237,21 @@ class M3terApiClient:
         Required: name, code
         Optional: customFields, version
         """
-        if not self.token:
-            raise Exception("Not authenticated. Call authenticate() first.")
-
-        product_url = f"{self.base_url}/organizations/{self.org_id}/products"
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
-        payload = {"name": name, "code": code, **kwargs}
-
-        try:
-            response = requests.post(
-                product_url, headers=headers, json=payload)
-            response.raise_for_status()
-            logger.info("Product created successfully: %s", response.json())
-            return response.json()
-
-        except requests.exceptions.RequestException as e:
-            status_code = response.status_code if response else "N/A"
-            error_content = response.text if response else "No response content"
-            logger.error(
-                f"Failed to create product.\nStatus Code: {status_code}\nPayload: {payload}\nResponse: {error_content}\nError: {str(e)}")
-            raise Exception(f"Failed to create product: {str(e)}") from e
+        return self._create("products", "product", {"name": name, "code": code, **kwargs})
 
     def create_meter(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         """
         Creates a meter with the provided payload.
         The payload must include required fields such as productId, name, code, dataFields, and derivedFields.
         """
-        if not self.token:
-            raise Exception("Not authenticated. Call authenticate() first.")
-
-        meter_url = f"{self.base_url}/organizations/{self.org_id}/meters"
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
-
-        try:
-            # Send the POST request to create a meter
-            response = requests.post(meter_url, headers=headers, json=payload)
-            response.raise_for_status()
-
-            # Log and return the successful response
-            logger.info("Meter created successfully: %s", response.json())
-            return response.json()
-
-        except requests.RequestException as e:
-
-            status_code = response.status_code if response else "N/A"
-            error_content = response.text if response else "No response content"
-            # Log error details
-            logger.error(
-                f"Failed to create meter.\nStatus Code: {status_code}\nPayload: {payload}\nResponse: {error_content}\nError: {str(e)}")
-            # Raise an exception with details
-            raise Exception(
-                f"Failed to create meter: {str(e)} (Status Code: {status_code})") from e
+        return self._create("meters", "meter", payload)
 
     def create_aggregation(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         """
         Creates an aggregation with the provided payload.
         The payload must include required fields such as name, code, rounding, meterId, etc.
         """
-        if not self.token:
-            raise Exception("Not authenticated. Call authenticate() first.")
-
-        aggregation_url = f"{self.base_url}/organizations/{self.org_id}/aggregations"
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
-
-        try:
-            # Send the POST request to create an aggregation
-            response = requests.post(
-                aggregation_url, headers=headers, json=payload)
-            response.raise_for_status()
-
-            # Log and return the successful response
-            logger.info("Aggregation created successfully: %s",
-                        response.json())
-            return response.json()
-
-        except requests.RequestException as e:
-            # Handle errors and safely access response attributes
-            status_code = response.status_code if response else "N/A"
-            error_content = response.text if response else "No response content"
-            # Log error details
-            logger.error(
-                f"Failed to create aggregation.\nStatus Code: {status_code}\nPayload: {payload}\nResponse: {error_content}\nError: {str(e)}")
-            # Raise an exception with details
-            raise Exception(
-                f"Failed to create aggregation: {str(e)} (Status Code: {status_code})") from e
+        return self._create("aggregations", "aggregation", payload)
 
     # Task 2
     def create_plan_template(self, payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -155,119 +259,21 @@ class M3terApiClient:
         Creates a plan template with the provided payload.
         The payload must include required fields such as productId, name, currency, and code.
         """
-        if not self.token:
-            raise Exception("Not authenticated. Call authenticate() first.")
-
-        plan_template_url = f"{self.base_url}/organizations/{self.org_id}/plantemplates"
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
-
-        try:
-            # Send the POST request to create a plan template
-            response = requests.post(
-                plan_template_url, headers=headers, json=payload)
-            response.raise_for_status()
-
-            # Log and return the successful response
-            logger.info("Plan template created successfully: %s",
-                        response.json())
-            return response.json()
-
-        except requests.RequestException as e:
-
-            status_code = response.status_code if response else "N/A"
-            error_content = response.text if response else "No response content"
-
-            # Log error details
-            logger.error(
-                "Failed to create plan template.\n"
-                "Status Code: %s\nPayload: %s\nResponse: %s\nError: %s",
-                status_code, payload, error_content, str(e)
-            )
-
-            # Raise an exception with details
-            raise Exception(
-                f"Failed to create plan template: {str(e)} (Status Code: {status_code})") from e
+        return self._create("plantemplates", "plan template", payload)
 
     def create_plan(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         """
         Creates a plan using the provided payload.
         The payload must include required fields such as planTemplateId, name, and code.
         """
-        if not self.token:
-            raise Exception("Not authenticated. Call authenticate() first.")
-
-        plan_url = f"{self.base_url}/organizations/{self.org_id}/plans"
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
-
-        try:
-            # Send the POST request to create a plan
-            response = requests.post(plan_url, headers=headers, json=payload)
-            response.raise_for_status()
-
-            # Log and return the successful response
-            logger.info("Plan created successfully: %s", response.json())
-            return response.json()
-
-        except requests.RequestException as e:
-
-            status_code = response.status_code if response else "N/A"
-            error_content = response.text if response else "No response content"
-
-            # Log error details
-            logger.error(
-                "Failed to create plan.\n"
-                "Status Code: %s\nPayload: %s\nResponse: %s\nError: %s",
-                status_code, payload, error_content, str(e)
-            )
-
-            # Raise an exception with details
-            raise Exception(
-                f"Failed to create plan: {str(e)} (Status Code: {status_code})") from e
+        return self._create("plans", "plan", payload)
 
     def create_pricing(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         """
         Creates a pricing configuration using the provided payload.
         The payload must include required fields such as aggregationId, planId, type, and pricingBands.
         """
-        if not self.token:
-            raise Exception("Not authenticated. Call authenticate() first.")
-
-        pricing_url = f"{self.base_url}/organizations/{self.org_id}/pricings"
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
-
-        try:
-            # Send the POST request to create a pricing configuration
-            response = requests.post(
-                pricing_url, headers=headers, json=payload)
-            response.raise_for_status()
-
-            # Log and return the successful response
-            logger.info("Pricing created successfully: %s", response.json())
-            return response.json()
-
-        except requests.RequestException as e:
-            status_code = response.status_code if response else "N/A"
-            error_content = response.text if response else "No response content"
-
-            # Log error details
-            logger.error(
-                "Failed to create pricing.\n"
-                "Status Code: %s\nPayload: %s\nResponse: %s\nError: %s",
-                status_code, payload, error_content, str(e)
-            )
-
-            # Raise an exception with details
-            raise Exception(
-                f"Failed to create pricing: {str(e)} (Status Code: {status_code})") from e
+        return self._create("pricings", "pricing", payload)
 
     # Task 3
     def create_account(self, payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -275,116 +281,158 @@ class M3terApiClient:
         Creates an account using the provided payload.
         The payload must include required fields such as name and code.
         """
+        return self._create("accounts", "account", payload)
+
+    def create_account_plan(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Creates an account plan using the provided payload.
+        The payload must include required fields such as accountId, planId, startDate.....
+        """
+        return self._create("accountplans", "account plan", payload)
+
+    # Task 4
+    def ingest_usage(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Submits usage data to the Measurements API.
+        The payload must include the 'measurements' field with necessary usage details.
+        """
+        usage_url = f"{self.ingest_url}/organizations/{self.org_id}/measurements"
+        raw = dumps(payload)
+        summary = PayloadSummary(payload, body_bytes=len(raw))
+        body, headers = self.body_encoder.encode(raw)
+        response = self._post(usage_url, "submit usage data", summary, hedge=True,
+                              data=body, headers=headers, timeout=self.timeouts["ingest"])
+        self.metrics.record_ingest(len(payload.get("measurements", [])))
+        self.log.info("usage.submitted", payload=summary, status=response.status_code)
+        return response.json()
+
+    def ingest_usage_body(self, body: Union[bytes, Iterable[bytes]],
+                          measurement_count: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Submits an already encoded Measurements API request body.
+        body is either the complete JSON bytes or an iterable of byte chunks,
+        which is streamed to the server with chunked transfer encoding.
+        Only complete bodies are hedged, a stream can be sent just once.
+        measurement_count, if given, is recorded in the ingest metrics.
+        """
+        usage_url = f"{self.ingest_url}/organizations/{self.org_id}/measurements"
+        summary = PayloadSummary(body, measurement_count=measurement_count)
+        body, headers = self.body_encoder.encode(body)
+        response = self._post(usage_url, "submit usage data", summary,
+                              hedge=isinstance(body, (bytes, bytearray)),
+                              data=body, headers=headers, timeout=self.timeouts["ingest"])
+        if measurement_count is not None:
+            self.metrics.record_ingest(measurement_count)
+        self.log.info("usage.submitted", payload=summary, status=response.status_code)
+        return response.json()
+
+    # Lookups
+    def _get(self, url: str, params: Optional[Dict[str, Any]], action: str) -> Dict[str, Any]:
+        """Sends a GET request and returns the JSON body."""
         if not self.token:
             raise Exception("Not authenticated. Call authenticate() first.")
 
-        account_url = f"{self.base_url}/organizations/{self.org_id}/accounts"
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
-
         try:
-            # Send the POST request to create an account
-            response = requests.post(
-                account_url, headers=headers, json=payload)
+            response = self.session.get(url, params=params, timeout=self.timeouts["read"])
             response.raise_for_status()
-
-            # Log and return the successful response
-            logger.info("Account created successfully: %s", response.json())
             return response.json()
 
         except requests.RequestException as e:
-            status_code = response.status_code if response else "N/A"
-            error_content = response.text if response else "No response content"
+            response = getattr(e, "response", None)
+            status_code = response.status_code if response is not None else "N/A"
+            error_content = truncate(response.text) if response is not None else None
 
-            # Log error details
-            logger.error(
-                "Failed to create account.\n"
-                "Status Code: %s\nPayload: %s\nResponse: %s\nError: %s",
-                status_code, payload, error_content, str(e)
-            )
+            self.log.error("request.failed", action=action, status=status_code,
+                           response=error_content, error=e)
 
             # Raise an exception with details
             raise Exception(
-                f"Failed to create account: {str(e)} (Status Code: {status_code})") from e
+                f"Failed to {action}: {str(e)} (Status Code: {status_code})") from e
 
-    def create_account_plan(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+    def list_entities(self, entity_type: str, page_size: int = DEFAULT_PAGE_SIZE,
+                      **params) -> Iterator[Dict[str, Any]]:
         """
-        Creates an account plan using the provided payload.
-        The payload must include required fields such as accountId, planId, startDate.....
+        Lazily iterates over all entities of one type, e.g. "aggregations".
+        The next page is only requested once the previous one has been consumed.
+        Extra keyword arguments are sent as query parameters (e.g. codes=[...]).
         """
-        if not self.token:
-            raise Exception("Not authenticated. Call authenticate() first.")
+        entity_url = f"{self.base_url}/organizations/{self.org_id}/{entity_type}"
+        query = {"pageSize": page_size, **params}
+
+        while True:
+            page = self._get(entity_url, query, f"list {entity_type}")
+            for entity in page.get("data", []):
+                self.entity_cache.set((entity_type, entity["id"]), entity)
+                yield entity
+
+            next_token = page.get("nextToken")
+            if not next_token:
+                return
+            query["nextToken"] = next_token
+
+    def get_entity(self, entity_type: str, entity_id: str, use_cache: bool = True) -> Dict[str, Any]:
+        """Retrieves one entity by id, served from the cache while it is fresh."""
+        if use_cache:
+            cached = self.entity_cache.get((entity_type, entity_id))
+            if cached is not MISSING:
+                return cached
+
+        entity_url = f"{self.base_url}/organizations/{self.org_id}/{entity_type}/{entity_id}"
+        entity = self._get(entity_url, None, f"get {entity_type} {entity_id}")
+        self.entity_cache.set((entity_type, entity_id), entity)
+        return entity
+
+    def find_id(self, entity_type: str, code: str) -> Optional[str]:
+        """
+        Resolves an entity code to its m3ter id, or None if it does not exist.
+        Served from the local code index, which is warmed by one bulk listing.
+        """
+        return self.code_index.get_id(entity_type, code)
 
-        account_plan_url = f"{self.base_url}/organizations/{self.org_id}/accountplans"
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
+    def list_products(self, **params) -> Iterator[Dict[str, Any]]:
+        return self.list_entities("products", **params)
 
-        try:
-            # Send the POST request to create an account plan
-            response = requests.post(
-                account_plan_url, headers=headers, json=payload)
-            response.raise_for_status()
+    def list_meters(self, **params) -> Iterator[Dict[str, Any]]:
+        return self.list_entities("meters", **params)
 
-            # Log and return the successful response
-            logger.info("Account plan created successfully: %s",
-                        response.json())
-            return response.json()
+    def list_aggregations(self, **params) -> Iterator[Dict[str, Any]]:
+        return self.list_entities("aggregations", **params)
 
-        except requests.RequestException as e:
-            status_code = response.status_code if response else "N/A"
-            error_content = response.text if response else "No response content"
+    def list_plan_templates(self, **params) -> Iterator[Dict[str, Any]]:
+        return self.list_entities("plantemplates", **params)
 
-            # Log error details
-            logger.error(
-                "Failed to create account plan.\n"
-                "Status Code: %s\nPayload: %s\nResponse: %s\nError: %s",
-                status_code, payload, error_content, str(e)
-            )
+    def list_plans(self, **params) -> Iterator[Dict[str, Any]]:
+        return self.list_entities("plans", **params)
 
-            # Raise an exception with details
-            raise Exception(
-                f"Failed to create account plan: {str(e)} (Status Code: {status_code})") from e
+    def list_pricings(self, **params) -> Iterator[Dict[str, Any]]:
+        return self.list_entities("pricings", **params)
 
-    # Task 4
-    def ingest_usage(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Submits usage data to the Measurements API.
-        The payload must include the 'measurements' field with necessary usage details.
-        """
-        if not self.token:
-            raise Exception("Not authenticated. Call authenticate() first.")
+    def list_accounts(self, **params) -> Iterator[Dict[str, Any]]:
+        return self.list_entities("accounts", **params)
 
-        usage_url = f"{self.ingest_url}/organizations/{self.org_id}/measurements"
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json"
-        }
+    def list_account_plans(self, **params) -> Iterator[Dict[str, Any]]:
+        return self.list_entities("accountplans", **params)
 
-        try:
-            # Send the POST request to submit usage data
-            response = requests.post(usage_url, headers=headers, json=payload)
-            response.raise_for_status()
+    def get_product(self, product_id: str) -> Dict[str, Any]:
+        return self.get_entity("products", product_id)
 
-            # Log and return the successful response
-            logger.info("Usage data submitted successfully: %s",
-                        response.json())
-            return response.json()
+    def get_meter(self, meter_id: str) -> Dict[str, Any]:
+        return self.get_entity("meters", meter_id)
 
-        except requests.RequestException as e:
-            status_code = response.status_code if response else "N/A"
-            error_content = response.text if response else "No response content"
+    def get_aggregation(self, aggregation_id: str) -> Dict[str, Any]:
+        return self.get_entity("aggregations", aggregation_id)
 
-            # Log error details
-            logger.error(
-                "Failed to submit usage data.\n"
-                "Status Code: %s\nPayload: %s\nResponse: %s\nError: %s",
-                status_code, payload, error_content, str(e)
-            )
+    def get_plan_template(self, plan_template_id: str) -> Dict[str, Any]:
+        return self.get_entity("plantemplates", plan_template_id)
 
-            # Raise an exception with details
-            raise Exception(
-                f"Failed to submit usage data: {str(e)} (Status Code: {status_code})") from e
+    def get_plan(self, plan_id: str) -> Dict[str, Any]:
+        return self.get_entity("plans", plan_id)
+
+    def get_pricing(self, pricing_id: str) -> Dict[str, Any]:
+        return self.get_entity("pricings", pricing_id)
+
+    def get_account(self, account_id: str) -> Dict[str, Any]:
+        return self.get_entity("accounts", account_id)
+
+    def get_account_plan(self, account_plan_id: str) -> Dict[str, Any]:
+        return self.get_entity("accountplans", account_plan_id)
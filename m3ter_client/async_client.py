@@ -0,0 +1,222 @@
+import asyncio
+import base64
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+
+from m3ter_client.api_client import (DEFAULT_BASE_URL, DEFAULT_INGEST_URL,
+                                     DEFAULT_LOG_SAMPLING, DEFAULT_TIMEOUTS,
+                                     AuthenticationError)
+from m3ter_client.codec import DEFAULT_GZIP_THRESHOLD, BodyEncoder, dumps
+from m3ter_client.structured_log import PayloadSummary, StructuredLogger, truncate
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of requests in flight at once for one client
+DEFAULT_MAX_CONCURRENCY = 50
+# Maximum number of pooled connections per host
+DEFAULT_POOL_MAXSIZE = 100
+
+
+class AsyncM3terApiClient:
+    """
+    asyncio counterpart of M3terApiClient.
+    All coroutines share one aiohttp session (one keep-alive connection pool)
+    and a semaphore that caps the number of requests in flight.
+    Use it as an async context manager, or call close() when done.
+    """
+
+    def __init__(self, access_key, api_secret, org_id,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 base_url: str = DEFAULT_BASE_URL,
+                 ingest_url: str = DEFAULT_INGEST_URL,
+                 log_sampling: Optional[Dict[str, int]] = None,
+                 gzip_level: Optional[int] = None,
+                 gzip_threshold: int = DEFAULT_GZIP_THRESHOLD,
+                 timeouts: Optional[Dict[str, Tuple[float, float]]] = None):
+
+        self.base_url = base_url
+        self.ingest_url = ingest_url
+        self.token = None
+
+        self.access_key = access_key
+        self.api_secret = api_secret
+        self.org_id = org_id
+
+        self.max_concurrency = max_concurrency
+        self.pool_maxsize = pool_maxsize
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.body_encoder = BodyEncoder(gzip_level, gzip_threshold)
+        # (connect, read) timeouts per operation, see DEFAULT_TIMEOUTS
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.log = StructuredLogger(
+            logger, DEFAULT_LOG_SAMPLING if log_sampling is None else log_sampling)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # The session must be created inside the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=0,
+                                             limit_per_host=self.pool_maxsize)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={"Content-Type": "application/json"})
+        return self._session
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Like the session, created inside the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _timeout(self, operation: str) -> aiohttp.ClientTimeout:
+        connect, read = self.timeouts[operation]
+        return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+    async def close(self) -> None:
+        """Closes the session and releases all pooled connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        # bound to this event loop too, a later asyncio.run() needs a new one
+        self._semaphore = None
+
+    async def __aenter__(self) -> "AsyncM3terApiClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    async def authenticate(self) -> None:
+        """Authenticate and store access token."""
+        auth_url = f"{self.base_url}/oauth/token"
+        creds = base64.b64encode(
+            f'{self.access_key}:{self.api_secret}'.encode('ascii')).decode()
+
+        headers = {
+            'Authorization': f'Basic {creds}'
+        }
+
+        try:
+            async with self._get_semaphore():
+                async with self._get_session().post(
+                        auth_url, json={"grant_type": "client_credentials"},
+                        headers=headers, timeout=self._timeout("token")) as response:
+                    response.raise_for_status()
+                    body = await response.json()
+            self.token = body["access_token"]
+            logger.info("Authentication successful")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error("Authentication failed: %s", e)
+            raise AuthenticationError(
+                f"Authentication failed: {str(e)}") from e
+
+    async def _post(self, url: str, payload: Dict[str, Any], action: str,
+                    operation: str = "create", encode: bool = False) -> Dict[str, Any]:
+        """
+        Sends one POST under the concurrency limit and returns the JSON body.
+        operation ("create" or "ingest") selects the timeouts and the log event.
+        With encode, the payload is encoded (and compressed) by body_encoder
+        on a worker thread, so large ingest batches do not stall the event loop.
+        """
+        if not self.token:
+            raise Exception("Not authenticated. Call authenticate() first.")
+
+        headers = {"Authorization": f"Bearer {self.token}"}
+        if encode:
+            body, body_headers, body_bytes = await asyncio.get_running_loop().run_in_executor(
+                None, self._encode, payload)
+            request_options = {"data": body, "headers": {
+                **headers, "Content-Type": "application/json", **body_headers}}
+            summary = PayloadSummary(payload, body_bytes=body_bytes)
+        else:
+            request_options = {"json": payload, "headers": headers}
+            summary = PayloadSummary(payload)
+        request_options["timeout"] = self._timeout(operation)
+        status_code = "N/A"
+        error_content = None
+
+        try:
+            async with self._get_semaphore():
+                async with self._get_session().post(
+                        url, **request_options) as response:
+                    status_code = response.status
+                    if response.status >= 400:
+                        error_content = await response.text()
+                    response.raise_for_status()
+                    body = await response.json()
+
+            if operation == "ingest":
+                self.log.info("usage.submitted", payload=summary, status=status_code)
+            else:
+                self.log.info("entity.created", entity=action[len("create "):],
+                              code=body.get("code"), id=body.get("id"))
+            return body
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.log.error("request.failed", action=action, status=status_code,
+                           payload=summary, response=truncate(error_content),
+                           error=e)
+            raise Exception(
+                f"Failed to {action}: {str(e)} (Status Code: {status_code})") from e
+
+    def _encode(self, payload: Dict[str, Any]) -> Tuple[Any, Dict[str, str], int]:
+        # runs on a worker thread: (request body, extra headers, JSON bytes)
+        raw = dumps(payload)
+        body, headers = self.body_encoder.encode(raw)
+        return body, headers, len(raw)
+
+    def _config_url(self, resource: str) -> str:
+        return f"{self.base_url}/organizations/{self.org_id}/{resource}"
+
+    # Task 1
+    async def create_product(self, name: str, code: str, **kwargs) -> Dict[str, Any]:
+        """
+        Creates a product with optional additional fields.
+        Required: name, code
+        Optional: customFields, version
+        """
+        payload = {"name": name, "code": code, **kwargs}
+        return await self._post(self._config_url("products"), payload, "create product")
+
+    async def create_meter(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Creates a meter with the provided payload."""
+        return await self._post(self._config_url("meters"), payload, "create meter")
+
+    async def create_aggregation(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Creates an aggregation with the provided payload."""
+        return await self._post(self._config_url("aggregations"), payload, "create aggregation")
+
+    # Task 2
+    async def create_plan_template(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Creates a plan template with the provided payload."""
+        return await self._post(self._config_url("plantemplates"), payload, "create plan template")
+
+    async def create_plan(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Creates a plan using the provided payload."""
+        return await self._post(self._config_url("plans"), payload, "create plan")
+
+    async def create_pricing(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Creates a pricing configuration using the provided payload."""
+        return await self._post(self._config_url("pricings"), payload, "create pricing")
+
+    # Task 3
+    async def create_account(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Creates an account using the provided payload."""
+        return await self._post(self._config_url("accounts"), payload, "create account")
+
+    async def create_account_plan(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Creates an account plan using the provided payload."""
+        return await self._post(self._config_url("accountplans"), payload, "create account plan")
+
+    # Task 4
+    async def ingest_usage(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Submits usage data to the Measurements API.
+        The payload must include the 'measurements' field with necessary usage details.
+        """
+        usage_url = f"{self.ingest_url}/organizations/{self.org_id}/measurements"
+        return await self._post(usage_url, payload, "submit usage data",
+                                operation="ingest", encode=True)
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+import requests
+from requests.auth import AuthBase
+
+logger = logging.getLogger(__name__)
+
+# Refresh the token this many seconds before it expires
+DEFAULT_REFRESH_MARGIN = 60.0
+# Used when the token response has no expires_in field
+DEFAULT_TOKEN_LIFETIME = 3600.0
+
+
+class AuthenticationError(Exception):
+    """Custom exception for authentication failures."""
+    pass
+
+
+class TokenManager:
+    """
+    Fetches and caches the OAuth client-credentials token.
+    get_token() returns the cached token until it is within refresh_margin
+    seconds of expiry, then refreshes it. Refreshes are single-flight: when
+    several threads need a new token only one of them calls /oauth/token.
+    With cache_path set, the token is also stored on disk so the next process
+    for the same credentials can reuse it.
+    """
+
+    def __init__(self, session: requests.Session, base_url: str, access_key, api_secret,
+                 refresh_margin: float = DEFAULT_REFRESH_MARGIN,
+                 cache_path: Optional[str] = None,
+                 timeout: Optional[Tuple[float, float]] = None):
+        self.session = session
+        self.auth_url = f"{base_url}/oauth/token"
+        self.access_key = access_key
+        self.api_secret = api_secret
+        self.refresh_margin = refresh_margin
+        self.cache_path = cache_path
+        self.timeout = timeout
+
+        # Cache entries are only valid for the same endpoint and credentials
+        self._cache_key = hashlib.sha256(
+            f"{base_url}:{access_key}:{api_secret}".encode("utf-8")).hexdigest()
+
+        self.token = None
+        self.expires_at = 0.0
+        self._lock = threading.Lock()
+
+        if self.cache_path:
+            self._load_cache()
+
+    def _is_fresh(self) -> bool:
+        return self.token is not None and time.time() < self.expires_at - self.refresh_margin
+
+    def get_token(self) -> str:
+        """Returns a valid access token, fetching a new one if needed."""
+        if self._is_fresh():
+            return self.token
+        with self._lock:
+            # another thread may have refreshed while we waited for the lock
+            if not self._is_fresh():
+                self._fetch_token()
+            return self.token
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """
+        Marks the token as expired, e.g. after the server rejected it with 401.
+        If token is given, only that token is invalidated, so a token that was
+        already refreshed by another thread is kept.
+        """
+        with self._lock:
+            if token is None or token == self.token:
+                self.token = None
+                self.expires_at = 0.0
+
+    def _fetch_token(self) -> None:
+        try:
+            response = self.session.post(
+                self.auth_url, json={"grant_type": "client_credentials"},
+                auth=(self.access_key, self.api_secret), timeout=self.timeout)
+            response.raise_for_status()
+            body = response.json()
+            self.token = body["access_token"]
+            self.expires_at = time.time() + float(
+                body.get("expires_in", DEFAULT_TOKEN_LIFETIME))
+            logger.info("Authentication successful")
+        except requests.exceptions.RequestException as e:
+            logger.error("Authentication failed: %s", e)
+            raise AuthenticationError(
+                f"Authentication failed: {str(e)}") from e
+
+        if self.cache_path:
+            self._save_cache()
+
+    def _load_cache(self) -> None:
+        try:
+            with open(self.cache_path, "r") as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            return
+
+        if cached.get("key") == self._cache_key:
+            self.token = cached.get("access_token")
+            self.expires_at = float(cached.get("expires_at", 0.0))
+            if self._is_fresh():
+                logger.info("Using cached access token")
+
+    def _save_cache(self) -> None:
+        # Write to a private temp file and rename, so readers never see a partial file
+        temp_path = f"{self.cache_path}.tmp"
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as file:
+                json.dump({"key": self._cache_key, "access_token": self.token,
+                           "expires_at": self.expires_at}, file)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            logger.warning("Could not write token cache %s: %s",
+                           self.cache_path, e)
+
+
+class BearerTokenAuth(AuthBase):
+    """
+    requests auth handler that adds the current bearer token to every request
+    and, on a 401 response, refreshes the token and resends the request once.
+    """
+
+    def __init__(self, token_manager: TokenManager):
+        self.token_manager = token_manager
+
+    def __call__(self, request: requests.PreparedRequest) -> requests.PreparedRequest:
+        request.headers["Authorization"] = f"Bearer {self.token_manager.get_token()}"
+        request.register_hook("response", self._handle_401)
+        return request
+
+    def _handle_401(self, response: requests.Response, **kwargs) -> requests.Response:
+        request = response.request
+        if response.status_code != 401 or getattr(request, "_token_retried", False):
+            return response
+        # A streamed (generator) body has been consumed and cannot be resent
+        if not isinstance(request.body, (bytes, str, type(None))):
+            return response
+
+        rejected = request.headers.get("Authorization", "")[len("Bearer "):]
+        self.token_manager.invalidate(rejected)
+        logger.info("Access token rejected with 401, retrying with a new token")
+
+        # Release the connection back to the pool before resending
+        response.content
+        response.close()
+
+        retry = request.copy()
+        retry._token_retried = True
+        retry.headers["Authorization"] = f"Bearer {self.token_manager.get_token()}"
+        retry_response = response.connection.send(retry, **kwargs)
+        retry_response.history.append(response)
+        retry_response.request = retry
+        return retry_response
@@ -0,0 +1,272 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from m3ter_client.api_client import M3terApiClient
+from m3ter_client.codec import dumps
+from m3ter_client.dead_letter import DeadLetterFile
+from m3ter_client.dedupe import UidDeduplicator
+from m3ter_client.recovery import ingest_with_recovery
+from m3ter_client.schema import MeterSchema
+from m3ter_client.spool import IngestSpool
+
+logger = logging.getLogger(__name__)
+
+# Measurements API limits for a single ingest request
+MAX_BATCH_SIZE = 1000
+MAX_BATCH_BYTES = 512 * 1024
+
+# Bytes of the {"measurements": []} envelope around the batch
+_ENVELOPE_BYTES = len(dumps({"measurements": []}))
+# How often blocked add() / flush() calls check that the worker is still running
+_POLL_INTERVAL = 0.1
+
+
+class _FlushMarker:
+    """Queued by flush(); the worker sends its open batch and sets the event."""
+
+    def __init__(self):
+        self.event = threading.Event()
+
+
+_CLOSE = object()
+
+
+class IngestBatcher:
+    """
+    Collects single measurements and sends them to the Measurements API in batches.
+    A batch is sent when it reaches max_batch_size measurements, when the next
+    measurement would push it over max_batch_bytes, or when the oldest measurement
+    has waited max_linger seconds. Sending happens on a background worker thread.
+    add() blocks when max_queue_size measurements are waiting (backpressure).
+    With a spool, every batch is written to disk before it is sent and acked
+    after the server accepted it, so failed batches can be replayed later.
+    With a schema, each batch is validated before it is sent; invalid
+    measurements are left out and written to dead_letter, if given.
+    A batch the server rejects is split up to find the bad measurements
+    (see ingest_with_recovery); the rest is sent and the rejected ones go
+    to dead_letter as well.
+    With a dedupe, measurements whose uid the server already accepted are
+    dropped before sending, and the uids of every sent part are recorded.
+    A batch that fails with an unexpected error is logged and counted in
+    failed_measurements; add() and flush() raise RuntimeError once the
+    batcher is closed or its worker has stopped.
+    """
+
+    def __init__(self, client: M3terApiClient,
+                 max_batch_size: int = MAX_BATCH_SIZE,
+                 max_batch_bytes: int = MAX_BATCH_BYTES,
+                 max_linger: float = 1.0,
+                 max_queue_size: int = 10000,
+                 on_error: Optional[Callable[[List[Dict[str, Any]], Exception], None]] = None,
+                 spool: Optional[IngestSpool] = None,
+                 schema: Optional[MeterSchema] = None,
+                 dead_letter: Optional[DeadLetterFile] = None,
+                 dedupe: Optional[UidDeduplicator] = None):
+
+        if not 0 < max_batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(
+                f"max_batch_size must be between 1 and {MAX_BATCH_SIZE}")
+
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.max_linger = max_linger
+        self.on_error = on_error
+        self.spool = spool
+        self.schema = schema
+        self.dead_letter = dead_letter
+        self.dedupe = dedupe
+
+        self.sent_batches = 0
+        self.sent_measurements = 0
+        self.failed_measurements = 0
+        self.rejected_measurements = 0
+        self.duplicate_measurements = 0
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._closed = False
+        self._worker_error: Optional[BaseException] = None
+        self._worker = threading.Thread(
+            target=self._run, name="m3ter-ingest-batcher", daemon=True)
+        self._worker.start()
+
+    def add(self, measurement: Dict[str, Any], timeout: Optional[float] = None) -> None:
+        """
+        Queues a single measurement for ingest.
+        Blocks while the queue is full; raises queue.Full if timeout expires first.
+        """
+        self._put(measurement, timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Sends everything queued so far and waits for it to complete.
+        Returns False if timeout expired before the flush finished.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        marker = _FlushMarker()
+        try:
+            self._put(marker, timeout)
+        except queue.Full:
+            return False
+        while not marker.event.wait(self._wait_time(deadline)):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self._check_running()
+        return True
+
+    def close(self) -> None:
+        """Flushes remaining measurements and stops the worker."""
+        if self._closed:
+            return
+        self._closed = True
+        while self._worker.is_alive():
+            try:
+                self._queue.put(_CLOSE, timeout=_POLL_INTERVAL)
+                break
+            except queue.Full:
+                continue
+        self._worker.join()
+
+    def _check_running(self) -> None:
+        if self._closed:
+            raise RuntimeError("IngestBatcher is closed")
+        if not self._worker.is_alive():
+            raise RuntimeError(f"IngestBatcher worker stopped: {self._worker_error}")
+
+    @staticmethod
+    def _wait_time(deadline: Optional[float]) -> float:
+        if deadline is None:
+            return _POLL_INTERVAL
+        return max(0.0, min(_POLL_INTERVAL, deadline - time.monotonic()))
+
+    def _put(self, item: Any, timeout: Optional[float]) -> None:
+        # waits in short slices, so a full queue whose worker has stopped
+        # raises instead of blocking forever
+        self._check_running()
+        try:
+            self._queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                self._queue.put(item, timeout=self._wait_time(deadline))
+                return
+            except queue.Full:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+            self._check_running()
+
+    def __enter__(self) -> "IngestBatcher":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        try:
+            self._batch_loop()
+        except BaseException as e:
+            self._worker_error = e
+            logger.exception("IngestBatcher worker stopped")
+
+    def _batch_loop(self) -> None:
+        batch = []
+        batch_bytes = _ENVELOPE_BYTES
+        deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(
+                0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                # linger expired for the oldest measurement in the batch
+                self._send(batch)
+                batch, batch_bytes, deadline = [], _ENVELOPE_BYTES, None
+                continue
+
+            if item is _CLOSE:
+                self._send(batch)
+                return
+
+            if isinstance(item, _FlushMarker):
+                self._send(batch)
+                batch, batch_bytes, deadline = [], _ENVELOPE_BYTES, None
+                item.event.set()
+                continue
+
+            # +1 accounts for the "," separator between measurements
+            item_bytes = len(dumps(item)) + 1
+            if batch and batch_bytes + item_bytes > self.max_batch_bytes:
+                self._send(batch)
+                batch, batch_bytes, deadline = [], _ENVELOPE_BYTES, None
+
+            batch.append(item)
+            batch_bytes += item_bytes
+            if deadline is None:
+                deadline = time.monotonic() + self.max_linger
+
+            if len(batch) >= self.max_batch_size:
+                self._send(batch)
+                batch, batch_bytes, deadline = [], _ENVELOPE_BYTES, None
+
+    def _send(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            self._send_batch(batch)
+        except Exception as e:
+            # e.g. a failing spool or dedupe store; the worker keeps running
+            self.failed_measurements += len(batch)
+            logger.error("Failed to ingest batch of %s measurements: %s", len(batch), e)
+
+    def _send_batch(self, batch: List[Dict[str, Any]]) -> None:
+        if batch and self.dedupe is not None:
+            new = self.dedupe.filter_new(batch)
+            self.duplicate_measurements += len(batch) - len(new)
+            batch = new
+        if batch and self.schema is not None:
+            batch = self._validate(batch)
+        if not batch:
+            return
+        payload = {"measurements": batch}
+        record_id = self.spool.append(payload) if self.spool is not None else None
+        result = ingest_with_recovery(self._ingest, batch, self.dead_letter)
+
+        if result.sent:
+            self.sent_batches += 1
+            self.sent_measurements += result.sent
+        self.rejected_measurements += len(result.rejected)
+        if record_id is not None and len(result.failed) < len(batch):
+            # only the unsent part has to be replayed, rejected rows would fail again
+            if result.failed:
+                self.spool.append({"measurements": result.failed})
+            self.spool.ack(record_id)
+
+        if result.failed:
+            self.failed_measurements += len(result.failed)
+            logger.error("Failed to ingest batch of %s measurements: %s",
+                         len(result.failed), result.error)
+            if self.on_error is not None:
+                try:
+                    self.on_error(result.failed, result.error)
+                except Exception as e:
+                    logger.error("IngestBatcher on_error callback failed: %s", e)
+
+    def _ingest(self, measurements: List[Dict[str, Any]]) -> None:
+        self.client.ingest_usage(payload={"measurements": measurements})
+        if self.dedupe is not None:
+            self.dedupe.record(measurements)
+
+    def _validate(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        result = self.schema.validate(batch)
+        if result.rejected:
+            self.rejected_measurements += len(result.rejected)
+            logger.warning("Rejected %s of %s measurements before ingest, first error: %s",
+                           len(result.rejected), len(batch), result.rejected[0][1])
+            if self.dead_letter is not None:
+                self.dead_letter.write_many(result.rejected)
+        return result.valid
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+# Sentinel returned by TTLCache.get on a miss, since None can be a cached value
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire ttl seconds after they were set.
+    When maxsize entries are stored, the least recently used one is evicted.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Removes one key, or every entry when key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class CodeIndex:
+    """
+    Local entity code -> m3ter id index for one organization.
+    The first lookup for an entity type (e.g. "aggregations") warms the index
+    with a single paginated listing; later lookups are dictionary hits until
+    the index is older than ttl seconds and is listed again. Entities created
+    through add() are visible immediately.
+    """
+
+    def __init__(self, client, ttl: float = 300.0):
+        # client is an M3terApiClient; not imported here to avoid an import cycle
+        self.client = client
+        self.ttl = ttl
+        self._ids: Dict[str, Dict[str, str]] = {}
+        self._warmed_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def warm(self, entity_type: str) -> None:
+        """(Re)builds the index of one entity type with a bulk listing."""
+        ids = {entity["code"]: entity["id"]
+               for entity in self.client.list_entities(entity_type)
+               if entity.get("code") is not None}
+        with self._lock:
+            self._ids[entity_type] = ids
+            self._warmed_at[entity_type] = time.monotonic()
+
+    def _is_fresh(self, entity_type: str) -> bool:
+        warmed_at = self._warmed_at.get(entity_type)
+        return warmed_at is not None and time.monotonic() - warmed_at < self.ttl
+
+    def get_id(self, entity_type: str, code: str) -> Optional[str]:
+        """Returns the id for code, or None if no such entity exists."""
+        if not self._is_fresh(entity_type):
+            self.warm(entity_type)
+        with self._lock:
+            return self._ids.get(entity_type, {}).get(code)
+
+    def add(self, entity_type: str, code: str, m3ter_id: str) -> None:
+        """Records an entity created locally, so it can be found without re-listing."""
+        with self._lock:
+            self._ids.setdefault(entity_type, {})[code] = m3ter_id
@@ -0,0 +1,61 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Union
+
+logger = logging.getLogger(__name__)
+
+
+class DeadLetterFile:
+    """
+    Append-only JSON Lines file of measurements that will not be ingested.
+    Each line holds the measurement, the reasons it was rejected and when,
+    so the rows can be inspected, fixed and sent again later.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, measurement: Any, errors: Union[str, List[str]]) -> None:
+        self.write_many([(measurement, errors)])
+
+    def write_many(self, rejected: List[tuple]) -> None:
+        """Appends (measurement, errors) pairs and flushes them to the file."""
+        if not rejected:
+            return
+        rejected_at = datetime.now(timezone.utc).isoformat()
+        lines = [json.dumps({"measurement": measurement,
+                             "errors": [errors] if isinstance(errors, str) else list(errors),
+                             "rejected_at": rejected_at}, default=str) + "\n"
+                 for measurement, errors in rejected]
+        with self._lock:
+            self._file.writelines(lines)
+            self._file.flush()
+            self.count += len(lines)
+        logger.warning("Quarantined %s measurements in %s", len(lines), self.path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> "DeadLetterFile":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def read_dead_letters(path: str) -> Iterator[Dict[str, Any]]:
+    """Yields the entries of a dead-letter file ({"measurement", "errors", "rejected_at"})."""
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,350 @@
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# An accepted uid is remembered for DEFAULT_RETENTION_WINDOWS windows of
+# DEFAULT_WINDOW_SECONDS, i.e. one week of daily windows
+DEFAULT_WINDOW_SECONDS = 24 * 60 * 60
+DEFAULT_RETENTION_WINDOWS = 7
+# First Bloom filter of a window; once full, a filter of twice the capacity
+# is added, so a window grows with the traffic instead of losing accuracy
+DEFAULT_INITIAL_CAPACITY = 1_000_000
+# False positive rate of each filter; a false positive only costs one
+# lookup in the exact store, it never drops a measurement
+DEFAULT_ERROR_RATE = 0.001
+# Recorded uids are committed to SQLite at most this often (seconds); uids
+# lost in a crash before their commit are only sent once more
+DEFAULT_COMMIT_INTERVAL = 1.0
+
+# Bloom file: magic, number of filters and uids in the exact store when it
+# was saved; then per filter its capacity, count, size in bits and number
+# of hashes, followed by the bits
+_FILE_HEADER = struct.Struct("<4sIQ")
+_FILTER_HEADER = struct.Struct("<QQQI")
+_MAGIC = b"UIDB"
+_BLOOM_SUFFIX = ".bloom"
+_DB_SUFFIX = ".db"
+_WINDOW_PREFIX = "window-"
+# Parameters per SQLite IN (...) query
+_LOOKUP_CHUNK = 500
+# SQLite page cache per window; uids are random, so inserts touch pages
+# all over the index
+_CACHE_KIB = 64 * 1024
+# Uids read at a time when rebuilding a filter from the exact store
+_REBUILD_CHUNK = 100_000
+
+
+def _hash_pairs(uids: Sequence[str]) -> np.ndarray:
+    """Two independent 64-bit hashes per uid, as an (n, 2) uint64 array."""
+    digests = b"".join(hashlib.blake2b(uid.encode("utf-8"), digest_size=16).digest()
+                       for uid in uids)
+    return np.frombuffer(digests, dtype=np.uint64).reshape(-1, 2)
+
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter over precomputed hash pairs (see _hash_pairs).
+    The k bit positions of an item are h1 + i * h2 mod size (double hashing).
+    """
+
+    def __init__(self, capacity: int, error_rate: float = DEFAULT_ERROR_RATE,
+                 size: Optional[int] = None, hashes: Optional[int] = None,
+                 bits: Optional[np.ndarray] = None, count: int = 0):
+        self.capacity = capacity
+        if size is None:
+            size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+            size = (size + 7) // 8 * 8
+        if hashes is None:
+            hashes = max(1, round(size / capacity * math.log(2)))
+        self.size = size
+        self.hashes = hashes
+        self.count = count
+        self.bits = bits if bits is not None else np.zeros(size // 8, dtype=np.uint8)
+        self._steps = np.arange(hashes, dtype=np.uint64)
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def _positions(self, pairs: np.ndarray) -> np.ndarray:
+        # uint64 arithmetic wraps around, which is fine for hashing
+        h1 = pairs[:, :1]
+        h2 = pairs[:, 1:] | np.uint64(1)
+        return (h1 + self._steps * h2) % np.uint64(self.size)
+
+    def add(self, pairs: np.ndarray) -> None:
+        positions = self._positions(pairs).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3),
+                         (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+        self.count += len(pairs)
+
+    def contains(self, pairs: np.ndarray) -> np.ndarray:
+        """Boolean array: True where the item may have been added."""
+        positions = self._positions(pairs)
+        masks = np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)
+        return ((self.bits[positions >> np.uint64(3)] & masks) != 0).all(axis=1)
+
+
+class _Window:
+    """Accepted uids of one time window: Bloom filters plus an exact SQLite set."""
+
+    def __init__(self, directory: str, number: int, initial_capacity: int, error_rate: float):
+        self.number = number
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        base = os.path.join(directory, f"{_WINDOW_PREFIX}{number:010d}")
+        self.bloom_path = base + _BLOOM_SUFFIX
+        self.db_path = base + _DB_SUFFIX
+        self.dirty = False
+
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            # losing the last commits on power loss only means resending
+            # those uids, which m3ter deduplicates anyway
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(f"PRAGMA cache_size=-{_CACHE_KIB}")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS uids (uid TEXT PRIMARY KEY) WITHOUT ROWID")
+
+        self.filters, saved_rows = self._load()
+        self.rows = self.connection.execute("SELECT COUNT(*) FROM uids").fetchone()[0]
+        if saved_rows != self.rows:
+            # the filters were not saved after the last uids were recorded,
+            # e.g. after a crash; rebuild them from the exact store
+            logger.info("Rebuilding uid filter of window %s from %s stored uids",
+                        number, self.rows)
+            self.filters = []
+            cursor = self.connection.execute("SELECT uid FROM uids")
+            while True:
+                rows = cursor.fetchmany(_REBUILD_CHUNK)
+                if not rows:
+                    break
+                self.add(_hash_pairs([row[0] for row in rows]))
+
+    def _load(self) -> Tuple[List[BloomFilter], int]:
+        """Returns the saved filters and the exact store size they cover."""
+        try:
+            with open(self.bloom_path, "rb") as file:
+                magic, count, rows = _FILE_HEADER.unpack(file.read(_FILE_HEADER.size))
+                if magic != _MAGIC:
+                    raise ValueError("not a uid filter file")
+                filters = []
+                for _ in range(count):
+                    capacity, items, size, hashes = _FILTER_HEADER.unpack(
+                        file.read(_FILTER_HEADER.size))
+                    bits = np.frombuffer(file.read(size // 8), dtype=np.uint8).copy()
+                    if len(bits) != size // 8:
+                        raise ValueError("truncated uid filter file")
+                    filters.append(BloomFilter(capacity, size=size, hashes=hashes,
+                                               bits=bits, count=items))
+                return filters, rows
+        except FileNotFoundError:
+            return [], 0
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning("Ignoring unreadable uid filter %s: %s", self.bloom_path, e)
+            return [], -1
+
+    def commit(self) -> None:
+        if self.connection.in_transaction:
+            self.connection.commit()
+
+    def save(self) -> None:
+        """Commits the exact store and writes the filters atomically (temporary file + rename)."""
+        self.commit()
+        temporary = self.bloom_path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(_FILE_HEADER.pack(_MAGIC, len(self.filters), self.rows))
+            for f in self.filters:
+                file.write(_FILTER_HEADER.pack(f.capacity, f.count, f.size, f.hashes))
+                file.write(f.bits.tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.bloom_path)
+        self.dirty = False
+
+    def add(self, pairs: np.ndarray) -> None:
+        start = 0
+        while start < len(pairs):
+            if not self.filters or self.filters[-1].full:
+                capacity = self.filters[-1].capacity * 2 if self.filters else self.initial_capacity
+                self.filters.append(BloomFilter(capacity, self.error_rate))
+            current = self.filters[-1]
+            end = start + (current.capacity - current.count)
+            current.add(pairs[start:end])
+            start = end
+        self.dirty = True
+
+    def may_contain(self, pairs: np.ndarray) -> np.ndarray:
+        suspected = np.zeros(len(pairs), dtype=bool)
+        for f in self.filters:
+            suspected |= f.contains(pairs)
+        return suspected
+
+    def stored(self, uids: Sequence[str]) -> set:
+        """The subset of uids in the exact store."""
+        found = set()
+        for start in range(0, len(uids), _LOOKUP_CHUNK):
+            chunk = uids[start:start + _LOOKUP_CHUNK]
+            rows = self.connection.execute(
+                f"SELECT uid FROM uids WHERE uid IN ({','.join('?' * len(chunk))})", chunk)
+            found.update(row[0] for row in rows)
+        return found
+
+    def close(self) -> None:
+        if self.dirty:
+            self.save()
+        self.commit()
+        self.connection.close()
+
+    def remove(self) -> None:
+        self.connection.close()
+        for path in (self.bloom_path, self.db_path,
+                     self.db_path + "-wal", self.db_path + "-shm"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class UidDeduplicator:
+    """
+    Persistent record of measurement uids the Measurements API accepted,
+    so retried and replayed batches can be trimmed to rows not sent yet.
+
+    Uids are kept per time window (window_seconds, by acceptance time) for
+    retention_windows windows; older windows are deleted as a whole. Each
+    window has Bloom filters in memory, saved to directory on close, and
+    an exact SQLite set committed every commit_interval seconds. A uid is
+    looked up in the filters first and only the suspected hits are checked
+    against SQLite, so new uids (the common case) never touch the disk and
+    a false positive never drops a row.
+    """
+
+    def __init__(self, directory: str,
+                 window_seconds: float = DEFAULT_WINDOW_SECONDS,
+                 retention_windows: int = DEFAULT_RETENTION_WINDOWS,
+                 initial_capacity: int = DEFAULT_INITIAL_CAPACITY,
+                 error_rate: float = DEFAULT_ERROR_RATE,
+                 commit_interval: float = DEFAULT_COMMIT_INTERVAL,
+                 clock: Callable[[], float] = time.time):
+        if retention_windows < 1:
+            raise ValueError("retention_windows must be at least 1")
+
+        self.directory = directory
+        self.window_seconds = window_seconds
+        self.retention_windows = retention_windows
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.commit_interval = commit_interval
+        self.clock = clock
+
+        self.duplicates = 0
+        self.false_positives = 0
+
+        self._lock = threading.Lock()
+        self._windows: Dict[int, _Window] = {}
+        self._last_commit = time.monotonic()
+
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            if name.startswith(_WINDOW_PREFIX) and name.endswith(_DB_SUFFIX):
+                number = int(name[len(_WINDOW_PREFIX):-len(_DB_SUFFIX)])
+                self._windows[number] = _Window(directory, number, initial_capacity, error_rate)
+        self._expire(self._current_window())
+
+    def _current_window(self) -> int:
+        return int(self.clock() // self.window_seconds)
+
+    def _expire(self, current: int) -> None:
+        for number in [n for n in self._windows if n <= current - self.retention_windows]:
+            logger.info("Dropping uid window %s", number)
+            self._windows.pop(number).remove()
+
+    def filter_new(self, measurements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Returns the measurements whose uid was not accepted before, in order.
+        Measurements without a uid are always kept.
+        """
+        keyed = [(row, m["uid"]) for row, m in enumerate(measurements)
+                 if isinstance(m.get("uid"), str)]
+        if not keyed:
+            return measurements
+        uids = [uid for _, uid in keyed]
+        pairs = _hash_pairs(uids)
+
+        duplicate_rows = set()
+        with self._lock:
+            for window in self._windows.values():
+                suspected = np.flatnonzero(window.may_contain(pairs))
+                if not len(suspected):
+                    continue
+                candidates = [uids[i] for i in suspected]
+                stored = window.stored(candidates)
+                self.false_positives += len(candidates) - len(stored)
+                duplicate_rows.update(keyed[i][0] for i in suspected if uids[i] in stored)
+
+        if not duplicate_rows:
+            return measurements
+        self.duplicates += len(duplicate_rows)
+        logger.info("Skipping %s of %s measurements already accepted",
+                    len(duplicate_rows), len(measurements))
+        return [m for row, m in enumerate(measurements) if row not in duplicate_rows]
+
+    def record(self, measurements: Iterable[Dict[str, Any]]) -> None:
+        """Remembers the uids of measurements the server accepted."""
+        uids = [m["uid"] for m in measurements if isinstance(m.get("uid"), str)]
+        if not uids:
+            return
+        pairs = _hash_pairs(uids)
+        with self._lock:
+            current = self._current_window()
+            window = self._windows.get(current)
+            if window is None:
+                self._expire(current)
+                window = _Window(self.directory, current, self.initial_capacity, self.error_rate)
+                self._windows[current] = window
+            # uids are random, so every insert lands on a different page;
+            # committing per batch would rewrite most of the index each time
+            cursor = window.connection.executemany(
+                "INSERT OR IGNORE INTO uids (uid) VALUES (?)", ((uid,) for uid in uids))
+            window.rows += cursor.rowcount
+            window.add(pairs)
+            if time.monotonic() - self._last_commit >= self.commit_interval:
+                for w in self._windows.values():
+                    w.commit()
+                self._last_commit = time.monotonic()
+
+    def __len__(self) -> int:
+        """Approximate number of uids remembered, counting repeats."""
+        with self._lock:
+            return sum(f.count for w in self._windows.values() for f in w.filters)
+
+    def save(self) -> None:
+        """Writes the in-memory filters to disk."""
+        with self._lock:
+            for window in self._windows.values():
+                if window.dirty:
+                    window.save()
+
+    def close(self) -> None:
+        with self._lock:
+            for window in self._windows.values():
+                window.close()
+            self._windows.clear()
+
+    def __enter__(self) -> "UidDeduplicator":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
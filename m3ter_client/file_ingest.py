@@ -0,0 +1,371 @@
+import csv
+import json
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from m3ter_client.api_client import M3terApiClient
+from m3ter_client.batcher import MAX_BATCH_BYTES, MAX_BATCH_SIZE
+from m3ter_client.codec import dumps
+from m3ter_client.dead_letter import DeadLetterFile
+from m3ter_client.recovery import ingest_with_recovery
+from m3ter_client.streaming import encode_batch
+
+logger = logging.getLogger(__name__)
+
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+_FORMATS_BY_EXTENSION = {".csv": FORMAT_CSV, ".jsonl": FORMAT_JSONL, ".ndjson": FORMAT_JSONL}
+
+# Read buffer of the input file; rows are parsed straight out of it
+READ_BUFFER_SIZE = 1024 * 1024
+# Ingest requests in flight at once
+DEFAULT_MAX_IN_FLIGHT = 4
+
+# Measurement field groups whose values are numbers
+_NUMERIC_GROUPS = ("measure", "cost", "income")
+# Namespace of the uids generated for rows without a uid column
+_UID_NAMESPACE = uuid.UUID("6f0c4d3e-8f0a-4c59-9a57-3d1c2b8e7a10")
+_OVERHEAD = len(encode_batch([]))
+
+
+class FileIngestProgress:
+    """Progress of an ingest_file run, passed to on_progress after every batch."""
+
+    def __init__(self, path: str, total_bytes: int, start_offset: int):
+        self.path = path
+        self.total_bytes = total_bytes
+        self.start_offset = start_offset
+        # everything before offset has been accepted by the API
+        self.offset = start_offset
+        self.measurements = 0
+        # measurements the API rejected, see ingest_file(dead_letter=...)
+        self.rejected = 0
+        self.batches = 0
+        self.started_at = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def percent(self) -> float:
+        return 100.0 * self.offset / self.total_bytes if self.total_bytes else 100.0
+
+    @property
+    def measurements_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.measurements / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        elapsed = self.elapsed
+        return (self.offset - self.start_offset) / elapsed if elapsed > 0 else 0.0
+
+
+def detect_format(path: str) -> str:
+    """Returns FORMAT_CSV or FORMAT_JSONL from the file extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in _FORMATS_BY_EXTENSION:
+        raise ValueError(
+            f"Cannot detect the format of '{path}', pass file_format='csv' or 'jsonl'")
+    return _FORMATS_BY_EXTENSION[extension]
+
+
+def _to_number(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def _set_field(measurement: Dict[str, Any], field: str, value: Any) -> None:
+    # "measure.memory" -> measurement["measure"]["memory"]
+    group, _, name = field.partition(".")
+    if not name:
+        measurement[field] = value
+        return
+    if group in _NUMERIC_GROUPS:
+        value = _to_number(value)
+    measurement.setdefault(group, {})[name] = value
+
+
+def _lookup(record: Dict[str, Any], key: str) -> Any:
+    # a flat key wins, otherwise the dotted key is a path into nested objects
+    if key in record:
+        return record[key]
+    value = record
+    for part in key.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+class _OffsetLines:
+    """
+    Iterates over the decoded lines of a binary file and tracks the byte offset
+    just past the last line handed out, so callers know where a record ends.
+    """
+
+    def __init__(self, file, offset: int):
+        self._file = file
+        self.offset = offset
+
+    def __iter__(self) -> Iterator[str]:
+        for line in self._file:
+            self.offset += len(line)
+            yield line.decode("utf-8")
+
+
+def read_csv(path: str, columns: Optional[Dict[str, str]] = None,
+             defaults: Optional[Dict[str, Any]] = None,
+             start_offset: int = 0,
+             on_invalid: Optional[Callable[[Any, Exception], None]] = None
+             ) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """
+    Yields (measurement, end_offset) for every row of a CSV file with a header.
+    columns maps measurement fields ("meter", "account", "ts", "uid",
+    "measure.<name>", ...) to CSV column names; without it the column names
+    must be the field names. defaults supplies fields missing from the file.
+    end_offset is the byte offset just past the row, for resuming.
+
+    A row that cannot be parsed (a non-numeric measure, say) raises
+    ValueError, or with on_invalid is passed to on_invalid(row, error)
+    as a {column: value} dict and skipped.
+    """
+    with open(path, "rb", buffering=READ_BUFFER_SIZE) as file:
+        header_line = file.readline()
+        header = next(csv.reader([header_line.decode("utf-8-sig")]))
+        mapping = columns or {name: name for name in header}
+        missing = [column for column in mapping.values() if column not in header]
+        if missing:
+            raise ValueError(f"Columns {missing} not found in the header of '{path}'")
+        # compile the mapping to (field, column index) once, not per row
+        fields = [(field, header.index(column)) for field, column in mapping.items()]
+
+        file.seek(max(start_offset, len(header_line)))
+        lines = _OffsetLines(file, file.tell())
+        for row in csv.reader(lines):
+            if not row:
+                continue
+            measurement = dict(defaults or {})
+            try:
+                for field, index in fields:
+                    if index < len(row) and row[index] != "":
+                        _set_field(measurement, field, row[index])
+            except ValueError as e:
+                if on_invalid is None:
+                    raise
+                on_invalid(dict(zip(header, row)), e)
+                continue
+            yield measurement, lines.offset
+
+
+def read_jsonl(path: str, columns: Optional[Dict[str, str]] = None,
+               defaults: Optional[Dict[str, Any]] = None,
+               start_offset: int = 0,
+               on_invalid: Optional[Callable[[Any, Exception], None]] = None
+               ) -> Iterator[Tuple[Dict[str, Any], int]]:
+    """
+    Yields (measurement, end_offset) for every line of a JSON Lines file.
+    Without columns each line is taken as a measurement as is; with columns,
+    fields are picked from the record by key (dotted keys reach into nested
+    objects), like read_csv. A line that is not a JSON object raises
+    ValueError, or with on_invalid is passed to on_invalid(line, error) and
+    skipped.
+    """
+    with open(path, "rb", buffering=READ_BUFFER_SIZE) as file:
+        file.seek(start_offset)
+        offset = start_offset
+        for line in file:
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError(f"Expected a JSON object, got {type(record).__name__}")
+                if columns is None:
+                    measurement = {**defaults, **record} if defaults else record
+                else:
+                    measurement = dict(defaults or {})
+                    for field, key in columns.items():
+                        value = _lookup(record, key)
+                        if value is not None:
+                            _set_field(measurement, field, value)
+            except ValueError as e:
+                if on_invalid is None:
+                    raise
+                on_invalid(line.decode("utf-8", errors="replace").rstrip("\r\n"), e)
+                continue
+            yield measurement, offset
+
+
+class FileCheckpoint:
+    """
+    Byte offset up to which a file has been ingested, kept in a small JSON file.
+    The checkpoint is replaced atomically, so a crash leaves either the old or
+    the new offset, never a torn file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self, source_path: str, source_size: int) -> int:
+        """Returns the saved offset, or 0 if there is no usable checkpoint."""
+        try:
+            with open(self.path, "r") as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            return 0
+
+        offset = int(saved.get("offset", 0))
+        if saved.get("source") != os.path.abspath(source_path) or offset > source_size:
+            logger.warning("Ignoring checkpoint %s, it does not match %s",
+                           self.path, source_path)
+            return 0
+        return offset
+
+    def save(self, source_path: str, offset: int, measurements: int) -> None:
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"source": os.path.abspath(source_path), "offset": offset,
+                       "measurements": measurements}, file)
+        os.replace(temp_path, self.path)
+
+
+def _log_progress(progress: FileIngestProgress) -> None:
+    logger.info("%s: %.1f%% (%s measurements, %.0f measurements/s)",
+                progress.path, progress.percent, progress.measurements,
+                progress.measurements_per_second)
+
+
+def ingest_file(client: M3terApiClient, path: str,
+                file_format: Optional[str] = None,
+                columns: Optional[Dict[str, str]] = None,
+                defaults: Optional[Dict[str, Any]] = None,
+                batch_size: int = MAX_BATCH_SIZE,
+                max_batch_bytes: int = MAX_BATCH_BYTES,
+                max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                checkpoint_path: Optional[str] = None,
+                resume: bool = True,
+                on_progress: Optional[Callable[[FileIngestProgress], None]] = None,
+                progress_interval: float = 5.0,
+                dead_letter: Optional[DeadLetterFile] = None) -> FileIngestProgress:
+    """
+    Ingests every measurement of a CSV or JSONL file.
+
+    The file is read sequentially in constant memory and sent in batches,
+    with up to max_in_flight requests in flight. After each batch is accepted
+    the checkpoint (default "<path>.checkpoint") advances to the end of the
+    last row of the batch and of every batch before it; with resume=True a
+    rerun starts there, so an interrupted backfill continues where it stopped
+    and a file that has grown since only sends the new rows. Rows without a
+    uid get one derived from the file's absolute path, the row offset and
+    the row's content, so rows resent after a crash are deduplicated by
+    m3ter while equally named files elsewhere get uids of their own.
+
+    Rows the API rejects are isolated by splitting their batch (see
+    ingest_with_recovery) and written to dead_letter, if given, while the
+    rest of the batch is still ingested. Rows that cannot be parsed are
+    written to dead_letter as read, with the parse error, and skipped.
+
+    on_progress is called after every accepted batch; by default progress is
+    logged every progress_interval seconds. Raises the first ingest error
+    after waiting for requests already in flight.
+    """
+    file_format = file_format or detect_format(path)
+    if file_format == FORMAT_CSV:
+        reader = read_csv
+    elif file_format == FORMAT_JSONL:
+        reader = read_jsonl
+    else:
+        raise ValueError(f"Unsupported file format '{file_format}'")
+
+    checkpoint = FileCheckpoint(checkpoint_path or f"{path}.checkpoint")
+    total_bytes = os.path.getsize(path)
+    start_offset = checkpoint.load(path, total_bytes) if resume else 0
+    if start_offset:
+        logger.info("Resuming %s at byte %s of %s", path, start_offset, total_bytes)
+
+    progress = FileIngestProgress(path, total_bytes, start_offset)
+    uid_prefix = os.path.abspath(path)
+    last_logged = time.monotonic()
+
+    def send_part(measurements: List[bytes]) -> None:
+        client.ingest_usage_body(encode_batch(measurements), measurement_count=len(measurements))
+
+    def send(batch: List[bytes]) -> int:
+        result = ingest_with_recovery(send_part, batch, dead_letter)
+        if result.error is not None:
+            raise result.error
+        return len(result.rejected)
+
+    def skip_invalid(row: Any, error: Exception) -> None:
+        logger.warning("Skipping unparsable row of %s: %s", path, error)
+        progress.rejected += 1
+        if dead_letter is not None:
+            dead_letter.write(row, f"Failed to parse row: {error}")
+
+    def complete(future, end_offset: int, count: int) -> None:
+        nonlocal last_logged
+        rejected = future.result()
+        progress.offset = end_offset
+        progress.measurements += count - rejected
+        progress.rejected += rejected
+        progress.batches += 1
+        checkpoint.save(path, end_offset, progress.measurements)
+        if on_progress is not None:
+            on_progress(progress)
+        elif time.monotonic() - last_logged >= progress_interval:
+            last_logged = time.monotonic()
+            _log_progress(progress)
+
+    # batches complete in submission order, so the checkpoint only ever
+    # covers rows whose batch and all earlier batches were accepted
+    in_flight = deque()
+    batch: List[bytes] = []
+    batch_bytes = _OVERHEAD
+    batch_end = start_offset
+
+    with ThreadPoolExecutor(max_workers=max_in_flight,
+                            thread_name_prefix="m3ter-file-ingest") as executor:
+        try:
+            for measurement, end_offset in reader(path, columns, defaults, start_offset,
+                                                  skip_invalid):
+                encoded = dumps(measurement)
+                if "uid" not in measurement:
+                    # the row's end offset and content identify it within the file
+                    measurement["uid"] = str(uuid.uuid5(
+                        _UID_NAMESPACE, f"{uid_prefix}:{end_offset}:{encoded.decode('utf-8')}"))
+                    encoded = dumps(measurement)
+                # +1 accounts for the "," separator between measurements
+                item_bytes = len(encoded) + (1 if batch else 0)
+                if batch and (len(batch) >= batch_size or batch_bytes + item_bytes > max_batch_bytes):
+                    in_flight.append((executor.submit(send, batch), batch_end, len(batch)))
+                    batch, batch_bytes, item_bytes = [], _OVERHEAD, len(encoded)
+                    if len(in_flight) >= max_in_flight:
+                        complete(*in_flight.popleft())
+
+                batch.append(encoded)
+                batch_bytes += item_bytes
+                batch_end = end_offset
+
+            if batch:
+                in_flight.append((executor.submit(send, batch), batch_end, len(batch)))
+            while in_flight:
+                complete(*in_flight.popleft())
+        finally:
+            # on error, let running requests finish but start no new ones
+            for future, _, _ in in_flight:
+                future.cancel()
+
+    _log_progress(progress)
+    return progress
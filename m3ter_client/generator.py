@@ -0,0 +1,164 @@
+import gc
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from m3ter_client.measurement_batch import MeasurementBatch
+from m3ter_client.schema import MeterSchema
+
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+# Positions of the 32 hex digits inside a 36 character uuid string
+_UUID_HEX_POSITIONS = np.array(
+    [i for i in range(36) if i not in (8, 13, 18, 23)])
+
+
+def generate_random_timestamp(start_ts: str, end_ts: str) -> str:
+    # Generates a random timestamp between start_ts and end_ts date strings.
+
+    start = datetime.strptime(start_ts, "%Y-%m-%dT%H:%M:%S.%fZ")
+    end = datetime.strptime(end_ts, "%Y-%m-%dT%H:%M:%S.%fZ")
+    delta = end - start
+    random_seconds = random.randint(0, int(delta.total_seconds()))
+    ts = (start + timedelta(seconds=random_seconds)
+          ).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    return ts
+
+
+def generate_measurements_payload(meter_code: str, account_code: str, start_ts: str, end_ts: str, size: int,
+                                  memory_code: Optional[str] = None,
+                                  execution_time_code: Optional[str] = None,
+                                  schema: Optional[MeterSchema] = None) -> Dict[str, Any]:
+    # Generates a payload with a list of random measurements.
+    # memory_code and execution_time_code are the codes of the meter's data fields;
+    # when not given they are looked up in schema, the MeterSchema of the Meter
+    # (task4 uses the Meter in mock_data_after_task3.yaml)
+    # this function will generate below values for each measurement:
+    #   - a random uid
+    #   - a random integer for memory consumption between 1 and 100
+    #   - a random integer for execution time between 1000 and 5000
+    #   - a random timestamp in December 2024
+
+    if schema is not None:
+        memory_code = memory_code or schema.field_code("memory_consumption")
+        execution_time_code = execution_time_code or schema.field_code("execution_time")
+    if memory_code is None or execution_time_code is None:
+        raise ValueError("Measure codes not found, pass memory_code and execution_time_code "
+                         "or the schema of a meter with those data fields")
+
+    measurements = []
+    for _ in range(size):
+        measurement = {
+            "uid": str(uuid.uuid4()),
+            "meter": meter_code,
+            "account": account_code,
+            "ts": generate_random_timestamp(start_ts, end_ts),
+            "measure": {
+                memory_code: random.randint(1, 100),
+                execution_time_code: random.randint(1000, 5000)
+            }
+        }
+        measurements.append(measurement)
+
+    return {"measurements": measurements}
+
+
+def _parse_timestamp(ts: str) -> np.datetime64:
+    # "2024-12-01T00:00:00.000Z" -> numpy datetime64 with microsecond resolution
+    return np.datetime64(ts.rstrip("Z"), "us")
+
+
+def _random_uuid4_strings(rng: np.random.Generator, size: int) -> np.ndarray:
+    """Draws size random version 4 uuids and formats them in bulk."""
+    raw = rng.integers(0, 256, size=(size, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+
+    digits = np.empty((size, 32), dtype=np.uint8)
+    digits[:, 0::2] = _HEX_DIGITS[raw >> 4]
+    digits[:, 1::2] = _HEX_DIGITS[raw & 0x0F]
+
+    chars = np.full((size, 36), ord("-"), dtype=np.uint8)
+    chars[:, _UUID_HEX_POSITIONS] = digits
+    return chars.view("S36").ravel()
+
+
+def generate_measurement_columns(start_ts: str, end_ts: str, size: int,
+                                 measures: Dict[str, Tuple[int, int]],
+                                 rng: Optional[np.random.Generator] = None) -> Dict[str, Any]:
+    """
+    Draws size random measurements column-wise.
+    measures maps each measure code to an inclusive (low, high) integer range.
+    Returns {"uid": [...], "ts": [...], "measure": {code: ndarray}}; timestamps use
+    the same format as generate_random_timestamp, bounds are parsed only once.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    start = _parse_timestamp(start_ts)
+    end = _parse_timestamp(end_ts)
+    total_seconds = int((end - start) // np.timedelta64(1, "s"))
+
+    offsets = rng.integers(0, total_seconds + 1, size=size)
+    timestamps = start + offsets.astype("timedelta64[s]")
+    ts = np.char.add(np.datetime_as_string(timestamps, unit="us"), "Z")
+
+    return {
+        "uid": _random_uuid4_strings(rng, size).astype("U36"),
+        "ts": ts,
+        "measure": {code: rng.integers(low, high + 1, size=size)
+                    for code, (low, high) in measures.items()},
+    }
+
+
+def generate_measurements(meter_code: str, account_code: str, start_ts: str, end_ts: str,
+                          size: int, measures: Dict[str, Tuple[int, int]],
+                          seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Batched version of generate_measurements_payload.
+    All random values are drawn in bulk by generate_measurement_columns; pass a
+    seed to get the same measurements on every run.
+    """
+    columns = generate_measurement_columns(
+        start_ts, end_ts, size, measures, np.random.default_rng(seed))
+
+    codes = list(columns["measure"])
+    values = zip(*(column.tolist() for column in columns["measure"].values()))
+
+    # Building millions of small dicts would trigger the cyclic garbage
+    # collector over and over; none of them can form a cycle, so pause it
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        measurements = [
+            {
+                "uid": uid,
+                "meter": meter_code,
+                "account": account_code,
+                "ts": ts,
+                "measure": dict(zip(codes, row))
+            }
+            for uid, ts, row in zip(columns["uid"].tolist(), columns["ts"].tolist(), values)
+        ]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    return {"measurements": measurements}
+
+
+def generate_measurement_batch(meter_code: str, account_code: str, start_ts: str, end_ts: str,
+                               size: int, measures: Dict[str, Tuple[int, int]],
+                               seed: Optional[int] = None,
+                               rng: Optional[np.random.Generator] = None) -> MeasurementBatch:
+    """
+    Like generate_measurements, but returns a columnar MeasurementBatch
+    without building a dict per measurement. Pass rng to continue an
+    existing random stream instead of seeding a new one.
+    """
+    columns = generate_measurement_columns(
+        start_ts, end_ts, size, measures, rng if rng is not None else np.random.default_rng(seed))
+    return MeasurementBatch.from_columns(meter_code, account_code, columns["uid"],
+                                         columns["ts"], columns["measure"])
@@ -0,0 +1,317 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from m3ter_client.api_client import M3terApiClient
+from m3ter_client.generator import generate_measurement_columns
+from m3ter_client.measurement_batch import MeasurementBatch
+from m3ter_client.metrics import LATENCY_BUCKETS, Histogram
+
+logger = logging.getLogger(__name__)
+
+CONSTANT = "constant"
+POISSON = "poisson"
+
+DEFAULT_LOAD_BATCH_SIZE = 100
+# A request is sent once it has batch_size events or its first event has
+# waited this long, like IngestBatcher's max_linger
+DEFAULT_MAX_LINGER = 0.1
+DEFAULT_LOAD_IN_FLIGHT = 32
+# Percentiles in the report
+REPORT_PERCENTILES = (50, 90, 99, 99.9)
+
+_STOP = object()
+
+
+class LoadStage:
+    """duration seconds of load whose rate moves linearly from start_rate to end_rate events/s."""
+
+    def __init__(self, duration: float, start_rate: float, end_rate: Optional[float] = None):
+        if duration <= 0 or start_rate < 0 or (end_rate is not None and end_rate < 0):
+            raise ValueError("Load stages need a positive duration and non-negative rates")
+        self.duration = duration
+        self.start_rate = start_rate
+        self.end_rate = start_rate if end_rate is None else end_rate
+
+    def rate_at(self, offset: float) -> float:
+        return self.start_rate + (self.end_rate - self.start_rate) * offset / self.duration
+
+    def __repr__(self) -> str:
+        if self.start_rate == self.end_rate:
+            return f"{self.duration:g}s at {self.start_rate:g}/s"
+        return f"{self.duration:g}s from {self.start_rate:g}/s to {self.end_rate:g}/s"
+
+
+def parse_profile(spec: str) -> List[LoadStage]:
+    """
+    Parses a load profile of comma separated DURATION:RATE or
+    DURATION:START-END stages, e.g. "30:100-1000,120:1000" ramps from 100 to
+    1000 events/s over 30 seconds and then holds 1000 events/s for two minutes.
+    """
+    stages = []
+    for part in spec.split(","):
+        try:
+            duration, rates = part.strip().split(":")
+            start, _, end = rates.partition("-")
+            stages.append(LoadStage(float(duration), float(start), float(end) if end else None))
+        except ValueError as e:
+            raise ValueError(f"Invalid load stage {part!r}, expected DURATION:RATE "
+                             f"or DURATION:START-END") from e
+    return stages
+
+
+def load_codes(codes: Sequence[str], count: Optional[int], prefix: str) -> List[str]:
+    """
+    count codes for the load: the first count of codes, padded with
+    synthetic "<prefix>-<n>" codes when more are asked for than exist.
+    Synthetic codes suit a stand-in server; m3ter itself only knows
+    the accounts and meters that were created.
+    """
+    if count is None:
+        return list(codes)
+    return list(codes[:count]) + [f"{prefix}-{n}" for n in range(len(codes) + 1, count + 1)]
+
+
+def arrival_times(stages: Sequence[LoadStage], arrivals: str = CONSTANT,
+                  rng: Optional[np.random.Generator] = None) -> Iterator[float]:
+    """
+    Yields event arrival times in seconds from the start of the run.
+    Constant arrivals are evenly spaced at the current rate; Poisson arrivals
+    have exponentially distributed gaps with the current rate as mean.
+    """
+    if arrivals not in (CONSTANT, POISSON):
+        raise ValueError(f"Unknown arrival process: {arrivals}")
+    rng = rng if rng is not None else np.random.default_rng()
+    stage_start = 0.0
+    for stage in stages:
+        offset = 0.0
+        while True:
+            rate = stage.rate_at(offset)
+            if rate <= 0:
+                # no events while the rate is zero, look again a bit later
+                offset += 0.01
+            elif arrivals == POISSON:
+                offset += rng.exponential(1.0 / rate)
+            else:
+                offset += 1.0 / rate
+            if offset >= stage.duration:
+                break
+            if rate > 0:
+                yield stage_start + offset
+        stage_start += stage.duration
+
+
+def request_schedule(arrivals: Iterator[float], batch_size: int,
+                     max_linger: float) -> Iterator[Tuple[float, int]]:
+    """
+    Groups event arrivals into ingest requests.
+    Yields (intended send time, events) for every request: the arrival of
+    its batch_size-th event, or max_linger after its first one.
+    """
+    first = None
+    events = 0
+    for arrival in arrivals:
+        if first is not None and arrival - first > max_linger:
+            yield first + max_linger, events
+            first, events = None, 0
+        if first is None:
+            first = arrival
+        events += 1
+        if events >= batch_size:
+            yield arrival, events
+            first, events = None, 0
+    if events:
+        yield first + max_linger, events
+
+
+def percentiles(latencies: Sequence[float],
+                points: Sequence[float] = REPORT_PERCENTILES) -> Dict[float, float]:
+    if not len(latencies):
+        return {point: 0.0 for point in points}
+    values = np.percentile(np.asarray(latencies), points, method="higher")
+    return dict(zip(points, values.tolist()))
+
+
+class LoadResult:
+    """
+    Outcome of run_load. corrected latencies run from the time a request
+    was scheduled to be sent to its response, so a stalled server also
+    delays every request queued behind it (corrected for coordinated
+    omission); service latencies run from the actual send. Failed requests
+    are not mixed into those: their corrected latencies, up to the error,
+    are kept in failed.
+    """
+
+    def __init__(self, stages: Sequence[LoadStage], arrivals: str):
+        self.stages = list(stages)
+        self.arrivals = arrivals
+        self.requests = 0
+        self.events = 0
+        self.errors = 0
+        self.failed_events = 0
+        self.elapsed = 0.0
+        self.max_backlog = 0
+        self.corrected: List[float] = []
+        self.service: List[float] = []
+        self.failed: List[float] = []
+        self.histogram = Histogram(LATENCY_BUCKETS)
+        self.first_error: Optional[Exception] = None
+
+    @property
+    def duration(self) -> float:
+        return sum(stage.duration for stage in self.stages)
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "profile": [repr(stage) for stage in self.stages],
+            "arrivals": self.arrivals,
+            "elapsed": self.elapsed,
+            "requests": self.requests,
+            "events": self.events,
+            "events_per_second": self.events_per_second,
+            "errors": self.errors,
+            "failed_events": self.failed_events,
+            "max_backlog": self.max_backlog,
+            "corrected": percentiles(self.corrected),
+            "service": percentiles(self.service),
+            "failed": percentiles(self.failed),
+            "histogram": self.histogram.snapshot(),
+        }
+
+    def format_report(self) -> str:
+        target = sum(stage.duration * (stage.start_rate + stage.end_rate) / 2
+                     for stage in self.stages)
+        lines = [
+            f"Profile: {', '.join(map(repr, self.stages))}, {self.arrivals} arrivals",
+            f"Sent {self.events:,} of {target:,.0f} target events in {self.requests:,} requests "
+            f"over {self.elapsed:.1f}s: {self.events_per_second:,.1f} events/s, "
+            f"{self.errors} failed requests ({self.failed_events:,} events), "
+            f"max backlog {self.max_backlog} requests",
+            f"{'latency (ms)':14}" + "".join(f"{'p' + format(p, 'g'):>9}" for p in REPORT_PERCENTILES)
+            + f"{'max':>9}",
+        ]
+        rows = [("corrected", self.corrected), ("service", self.service)]
+        if self.failed:
+            rows.append(("failed", self.failed))
+        for name, latencies in rows:
+            values = percentiles(latencies)
+            lines.append(f"{name:14}" + "".join(f"{values[p] * 1000:9.1f}"
+                                                for p in REPORT_PERCENTILES)
+                         + f"{max(latencies, default=0.0) * 1000:9.1f}")
+        lines.append("corrected latency histogram:")
+        total = max(1, self.histogram.count)
+        lower = 0.0
+        for bound, count in zip(self.histogram.buckets + (float("inf"),), self.histogram.counts):
+            if count:
+                label = f"{lower * 1000:g}-{bound * 1000:g} ms" if bound != float("inf") \
+                    else f">{lower * 1000:g} ms"
+                lines.append(f"  {label:>16} {count:9,} {'#' * round(40 * count / total)}")
+            lower = bound
+        return "\n".join(lines)
+
+
+def run_load(client: M3terApiClient, stages: Sequence[LoadStage],
+             meter_codes: Sequence[str], account_codes: Sequence[str],
+             measures: Dict[str, Tuple[int, int]], start_ts: str, end_ts: str,
+             arrivals: str = CONSTANT, batch_size: int = DEFAULT_LOAD_BATCH_SIZE,
+             max_linger: float = DEFAULT_MAX_LINGER,
+             max_in_flight: int = DEFAULT_LOAD_IN_FLIGHT, seed: Optional[int] = None,
+             report_interval: float = 5.0,
+             on_progress: Optional[Callable[[float, LoadResult], None]] = None) -> LoadResult:
+    """
+    Open-loop ingest load: events arrive on the schedule of stages
+    (constant or Poisson arrivals) whether or not earlier requests have
+    finished, are grouped into requests by request_schedule and sent by up
+    to max_in_flight worker threads. Each request carries random
+    measurements (generate_measurement_columns) for meters and accounts
+    drawn uniformly from meter_codes and account_codes, with timestamps
+    between start_ts and end_ts. Every worker generates its bodies with its
+    own random generator, so workers do not wait on each other, and the
+    service latency starts once the body is ready. Every report_interval
+    seconds progress is logged, or passed to on_progress(elapsed, result).
+    Returns when the schedule is done and every request has finished.
+    """
+    # one stream for the arrivals, one per worker: numpy generators are not thread safe
+    seeds = np.random.SeedSequence(seed).spawn(max_in_flight + 1)
+    result = LoadResult(stages, arrivals)
+    meters = np.asarray(meter_codes, dtype=object)
+    accounts = np.asarray(account_codes, dtype=object)
+    pending = queue.Queue()
+    lock = threading.Lock()
+
+    def encode(events: int, rng: np.random.Generator) -> bytes:
+        columns = generate_measurement_columns(start_ts, end_ts, events, measures, rng)
+        meter = meters[rng.integers(0, len(meters), events)].tolist()
+        account = accounts[rng.integers(0, len(accounts), events)].tolist()
+        return MeasurementBatch.from_columns(meter, account, columns["uid"], columns["ts"],
+                                             columns["measure"]).to_body()
+
+    def work(rng: np.random.Generator) -> None:
+        while True:
+            item = pending.get()
+            if item is _STOP:
+                return
+            intended, events = item
+            try:
+                body = encode(events, rng)
+                sent_at = time.perf_counter()
+                client.ingest_usage_body(body, measurement_count=events)
+            except Exception as e:
+                failed_at = time.perf_counter()
+                with lock:
+                    result.errors += 1
+                    result.failed_events += events
+                    result.failed.append(failed_at - intended)
+                    if result.first_error is None:
+                        result.first_error = e
+                continue
+            done = time.perf_counter()
+            with lock:
+                result.requests += 1
+                result.events += events
+                result.corrected.append(done - intended)
+                result.service.append(done - sent_at)
+                result.histogram.observe(done - intended)
+
+    workers = [threading.Thread(target=work, args=(np.random.default_rng(seeds[i + 1]),),
+                                name=f"m3ter-load-{i}", daemon=True)
+               for i in range(max_in_flight)]
+    for worker in workers:
+        worker.start()
+
+    started = time.perf_counter()
+    next_report = report_interval
+    for offset, events in request_schedule(
+            arrival_times(stages, arrivals, np.random.default_rng(seeds[0])),
+            batch_size, max_linger):
+        delay = started + offset - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pending.put((started + offset, events))
+        backlog = pending.qsize()
+        with lock:
+            result.max_backlog = max(result.max_backlog, backlog)
+        if offset >= next_report:
+            next_report += report_interval
+            if on_progress is not None:
+                on_progress(offset, result)
+            else:
+                logger.info("Load at %.0fs: %s events sent, %s failed requests, backlog %s",
+                            offset, result.events, result.errors, pending.qsize())
+
+    for _ in workers:
+        pending.put(_STOP)
+    for worker in workers:
+        worker.join()
+    result.elapsed = time.perf_counter() - started
+    if result.first_error is not None:
+        logger.error("%s load requests failed, first error: %s", result.errors, result.first_error)
+    return result
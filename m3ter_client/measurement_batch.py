@@ -0,0 +1,477 @@
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from m3ter_client.codec import dumps, loads
+from m3ter_client.schema import CATEGORY_GROUPS, NUMERIC_GROUPS
+
+# Rows a new batch has room for before its columns grow
+DEFAULT_CAPACITY = 1024
+
+_GROUPS = frozenset(CATEGORY_GROUPS.values())
+_ENVELOPE_KEYS = ("uid", "meter", "account", "ts")
+_KNOWN_KEYS = frozenset(_ENVELOPE_KEYS) | _GROUPS
+
+# Index of a missing value in a text column
+_MISSING_CODE = np.uint32(0xFFFFFFFF)
+# Integers beyond this do not survive a float64 column
+_MAX_EXACT_INTEGER = 2 ** 53
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_UUID_HEX_POSITIONS = np.array([i for i in range(36) if i not in (8, 13, 18, 23)])
+# ASCII code -> hex digit value, 255 for anything that is not 0-9 / a-f
+_HEX_VALUES = np.full(256, 255, dtype=np.uint8)
+_HEX_VALUES[_HEX_DIGITS] = np.arange(16, dtype=np.uint8)
+
+# compact, like the codec's dumps
+_BODY_PREFIX = '{"measurements":['
+_BODY_SUFFIX = ']}'
+_SEPARATOR = ','
+
+
+def _pack_uid(uid: Any) -> Optional[bytes]:
+    # a canonical lowercase uuid as 16 bytes; None for any other uid,
+    # which would not come back out unchanged
+    if type(uid) is not str or len(uid) != 36 or uid != uid.lower() \
+            or uid[8] != "-" or uid[13] != "-" or uid[18] != "-" or uid[23] != "-":
+        return None
+    try:
+        packed = bytes.fromhex(uid.replace("-", ""))
+    except ValueError:
+        return None
+    return packed if len(packed) == 16 else None
+
+
+def _pack_uids(uids: np.ndarray) -> Optional[np.ndarray]:
+    """Packs an array of canonical uuid strings into (n, 16) bytes, None if any is not one."""
+    chars = np.ascontiguousarray(np.asarray(uids).astype("S36")).view(np.uint8).reshape(-1, 36)
+    if len(chars) and not (chars[:, [8, 13, 18, 23]] == ord("-")).all():
+        return None
+    digits = _HEX_VALUES[chars[:, _UUID_HEX_POSITIONS]]
+    if (digits == 255).any():
+        return None
+    return (digits[:, 0::2] << 4) | digits[:, 1::2]
+
+
+def _format_uids(packed: np.ndarray) -> List[str]:
+    digits = np.empty((len(packed), 32), dtype=np.uint8)
+    digits[:, 0::2] = _HEX_DIGITS[packed >> 4]
+    digits[:, 1::2] = _HEX_DIGITS[packed & 0x0F]
+    chars = np.full((len(packed), 36), ord("-"), dtype=np.uint8)
+    chars[:, _UUID_HEX_POSITIONS] = digits
+    return chars.view("S36").ravel().astype("U36").tolist()
+
+
+def _ts_micros(ts: Any) -> Optional[int]:
+    # microseconds since the epoch (UTC); None unless ts is an ISO 8601 string with a time zone
+    if type(ts) is not str:
+        return None
+    try:
+        parsed = datetime.fromisoformat(ts[:-1] + "+00:00" if ts[-1:] == "Z" else ts)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        return None
+    return (parsed - _EPOCH) // _MICROSECOND
+
+
+def _format_timestamps(micros: np.ndarray) -> List[str]:
+    # milliseconds, like the API's own examples, unless a value needs microseconds
+    unit = "ms" if not (micros % 1000).any() else "us"
+    return np.char.add(np.datetime_as_string(micros.astype("datetime64[us]"), unit=unit),
+                       "Z").tolist()
+
+
+class _Columns:
+    """Storage shared by a MeasurementBatch and the slices taken from it."""
+
+    def __init__(self, capacity: int):
+        self.size = 0
+        self.capacity = max(1, capacity)
+        self.uid = np.zeros((self.capacity, 16), dtype=np.uint8)
+        self.meter = np.zeros(self.capacity, dtype=np.uint32)
+        self.account = np.zeros(self.capacity, dtype=np.uint32)
+        self.ts = np.zeros(self.capacity, dtype=np.int64)
+        # (group, code) -> float64 values, NaN where a row has no value
+        self.numeric: Dict[Tuple[str, str], np.ndarray] = {}
+        # (group, code) of numeric columns holding only integers so far
+        self.integral = set()
+        # (group, code) -> index into strings, _MISSING_CODE where a row has no value
+        self.text: Dict[Tuple[str, str], np.ndarray] = {}
+        # interned meter / account codes and text values, and their JSON encoding
+        self.strings: List[str] = []
+        self.encoded_strings: List[str] = []
+        self.string_index: Dict[str, int] = {}
+        # row -> measurement, for rows the columns cannot hold exactly
+        self.fallback: Dict[int, Dict[str, Any]] = {}
+
+    def intern(self, value: str) -> int:
+        index = self.string_index.get(value)
+        if index is None:
+            index = self.string_index[value] = len(self.strings)
+            self.strings.append(value)
+            self.encoded_strings.append(dumps(value).decode("utf-8"))
+        return index
+
+    def reserve(self, count: int) -> None:
+        needed = self.size + count
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2)
+
+        def grown(array: np.ndarray, fill) -> np.ndarray:
+            new = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            new[:self.size] = array[:self.size]
+            return new
+
+        self.uid = grown(self.uid, 0)
+        self.meter = grown(self.meter, 0)
+        self.account = grown(self.account, 0)
+        self.ts = grown(self.ts, 0)
+        self.numeric = {key: grown(column, np.nan) for key, column in self.numeric.items()}
+        self.text = {key: grown(column, _MISSING_CODE) for key, column in self.text.items()}
+        self.capacity = capacity
+
+    def numeric_column(self, key: Tuple[str, str]) -> np.ndarray:
+        column = self.numeric.get(key)
+        if column is None:
+            column = self.numeric[key] = np.full(self.capacity, np.nan)
+            self.integral.add(key)
+        return column
+
+    def text_column(self, key: Tuple[str, str]) -> np.ndarray:
+        column = self.text.get(key)
+        if column is None:
+            column = self.text[key] = np.full(self.capacity, _MISSING_CODE, dtype=np.uint32)
+        return column
+
+    def append(self, measurement: Any) -> None:
+        self.reserve(1)
+        row = self.size
+        self.size += 1
+
+        parsed = self._parse(measurement)
+        if parsed is None:
+            self.fallback[row] = measurement
+            return
+        uid, ts, groups = parsed
+        self.uid[row] = np.frombuffer(uid, dtype=np.uint8)
+        self.meter[row] = self.intern(measurement["meter"])
+        self.account[row] = self.intern(measurement["account"])
+        self.ts[row] = ts
+        for group, values in groups:
+            if group in NUMERIC_GROUPS:
+                for code, value in values.items():
+                    key = (group, code)
+                    self.numeric_column(key)[row] = value
+                    if type(value) is not int:
+                        self.integral.discard(key)
+            else:
+                for code, value in values.items():
+                    self.text_column((group, code))[row] = self.intern(value)
+
+    @staticmethod
+    def _parse(measurement: Any):
+        # (packed uid, ts, [(group, values)]) if the columns can hold the
+        # measurement so that it serialises back unchanged, else None
+        if type(measurement) is not dict or not measurement.keys() <= _KNOWN_KEYS:
+            return None
+        if type(measurement.get("meter")) is not str or type(measurement.get("account")) is not str:
+            return None
+        uid = _pack_uid(measurement.get("uid"))
+        ts = _ts_micros(measurement.get("ts"))
+        if uid is None or ts is None:
+            return None
+
+        groups = []
+        for group in _GROUPS.intersection(measurement):
+            values = measurement[group]
+            if type(values) is not dict:
+                return None
+            if group in NUMERIC_GROUPS:
+                for value in values.values():
+                    if type(value) is int:
+                        if abs(value) > _MAX_EXACT_INTEGER:
+                            return None
+                    elif type(value) is not float or not math.isfinite(value):
+                        return None
+            elif not all(type(value) is str for value in values.values()):
+                return None
+            groups.append((group, values))
+        return uid, ts, groups
+
+
+class MeasurementBatch:
+    """
+    Measurements stored column-wise instead of as a list of dicts.
+
+    uids are packed into 16 bytes, timestamps into int64 microseconds,
+    meter and account codes (and who / what / where values) are interned
+    once per batch, and each measure / cost / income field is a float64
+    column. A row costs about 50 bytes instead of roughly 1 KB as a
+    nested dict. Slicing returns a view that shares the columns; appending
+    to a view copies it first. to_body() builds the Measurements API
+    request body directly from the columns.
+
+    Rows the columns cannot reproduce exactly (a uid that is not a
+    lowercase uuid, a timestamp without a time zone, unknown keys or
+    non-numeric measures) are kept as the original dicts. Timestamps are
+    written back in UTC with a Z suffix, and a numeric field that mixes
+    integers and floats is written as floats.
+    """
+
+    def __init__(self, measurements: Iterable[Dict[str, Any]] = (),
+                 capacity: int = DEFAULT_CAPACITY):
+        self._columns = _Columns(capacity)
+        self._start = 0
+        self._stop = 0
+        self.extend(measurements)
+
+    @classmethod
+    def _view(cls, columns: _Columns, start: int, stop: int) -> "MeasurementBatch":
+        batch = cls.__new__(cls)
+        batch._columns = columns
+        batch._start = start
+        batch._stop = stop
+        return batch
+
+    @classmethod
+    def from_columns(cls, meter: Union[str, Sequence[str]], account: Union[str, Sequence[str]],
+                     uid: Sequence[str], ts: Any,
+                     measure: Dict[str, Sequence[float]]) -> "MeasurementBatch":
+        """Builds a batch straight from columns, e.g. of generate_measurement_columns."""
+        batch = cls(capacity=len(uid))
+        batch.extend_columns(meter, account, uid, ts, measure)
+        return batch
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[Dict[str, Any], "MeasurementBatch"]:
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                raise ValueError("MeasurementBatch slices must be contiguous")
+            return self._view(self._columns, self._start + start,
+                              self._start + max(start, stop))
+        index = item + len(self) if item < 0 else item
+        if not 0 <= index < len(self):
+            raise IndexError("MeasurementBatch index out of range")
+        return self[index:index + 1].to_dicts()[0]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.to_dicts())
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate bytes used by the rows of this batch (not counting fallback dicts)."""
+        columns = self._columns
+        per_row = 16 + 4 + 4 + 8 + 8 * len(columns.numeric) + 4 * len(columns.text)
+        return per_row * len(self) + sum(len(value) + 50 for value in columns.strings)
+
+    def _writable(self, count: int) -> _Columns:
+        # appending in place is only safe at the end of the shared columns
+        columns = self._columns
+        if self._stop != columns.size:
+            copy = MeasurementBatch(capacity=len(self) + count)
+            copy.extend(self.to_dicts())
+            self._columns, self._start, self._stop = copy._columns, 0, len(copy)
+            columns = self._columns
+        columns.reserve(count)
+        return columns
+
+    def append(self, measurement: Dict[str, Any]) -> None:
+        self._writable(1).append(measurement)
+        self._stop += 1
+
+    def extend(self, measurements: Iterable[Dict[str, Any]]) -> None:
+        if not isinstance(measurements, (list, tuple)):
+            measurements = list(measurements)
+        if not measurements:
+            return
+        columns = self._writable(len(measurements))
+        for measurement in measurements:
+            columns.append(measurement)
+        self._stop += len(measurements)
+
+    def extend_columns(self, meter: Union[str, Sequence[str]], account: Union[str, Sequence[str]],
+                       uid: Sequence[str], ts: Any, measure: Dict[str, Sequence[float]]) -> None:
+        """
+        Appends rows given column-wise. meter and account are one code for
+        every row or one per row, ts is a datetime64 array or ISO 8601
+        strings, measure maps field codes to value arrays.
+        """
+        count = len(uid)
+        packed = _pack_uids(uid)
+        micros = None
+        if np.issubdtype(np.asarray(ts).dtype, np.datetime64):
+            micros = np.asarray(ts).astype("datetime64[us]").astype(np.int64)
+        elif all(isinstance(value, str) and value.endswith("Z") for value in np.asarray(ts).tolist()):
+            micros = np.char.rstrip(np.asarray(ts, dtype=str), "Z") \
+                .astype("datetime64[us]").astype(np.int64)
+        if packed is None or micros is None or any(
+                not np.issubdtype(np.asarray(values).dtype, np.number)
+                or not np.isfinite(values).all() for values in measure.values()):
+            # not the simple shape the bulk path covers, append row by row
+            uids = list(uid)
+            timestamps = np.asarray(ts).astype(str).tolist() if micros is None \
+                else _format_timestamps(micros)
+            meters = [meter] * count if isinstance(meter, str) else list(meter)
+            accounts = [account] * count if isinstance(account, str) else list(account)
+            values = list(zip(*(np.asarray(column).tolist() for column in measure.values()))) \
+                if measure else [()] * count
+            self.extend({"uid": uids[row], "meter": meters[row], "account": accounts[row],
+                         "ts": timestamps[row], "measure": dict(zip(measure, values[row]))}
+                        for row in range(count))
+            return
+
+        columns = self._writable(count)
+        rows = slice(columns.size, columns.size + count)
+        columns.uid[rows] = packed
+        for target, codes in ((columns.meter, meter), (columns.account, account)):
+            if isinstance(codes, str):
+                target[rows] = columns.intern(codes)
+            else:
+                lookup = {}
+                target[rows] = np.fromiter((lookup[code] if code in lookup else
+                                            lookup.setdefault(code, columns.intern(code))
+                                            for code in codes), dtype=np.uint32, count=count)
+        columns.ts[rows] = micros
+        for code, values in measure.items():
+            key = ("measure", code)
+            values = np.asarray(values)
+            columns.numeric_column(key)[rows] = values
+            if not np.issubdtype(values.dtype, np.integer):
+                columns.integral.discard(key)
+        columns.size += count
+        self._stop += count
+
+    def _row_strings(self) -> Tuple[List[str], List[Optional[str]]]:
+        # (JSON text of each row, None where the row must be built as a dict)
+        columns = self._columns
+        rows = slice(self._start, self._stop)
+        count = len(self)
+        uids = _format_uids(columns.uid[rows])
+        timestamps = _format_timestamps(columns.ts[rows])
+        encoded = np.array(columns.encoded_strings + [None], dtype=object)
+        meters = encoded[columns.meter[rows]].tolist()
+        accounts = encoded[columns.account[rows]].tolist()
+
+        irregular = np.zeros(count, dtype=bool)
+        template = '{"uid":"%s","meter":%s,"account":%s,"ts":"%s"'
+        fields = [uids, meters, accounts, timestamps]
+        for group in CATEGORY_GROUPS.values():
+            keys = [key for key in (columns.numeric if group in NUMERIC_GROUPS else columns.text)
+                    if key[0] == group]
+            group_fields = []
+            for key in keys:
+                if group in NUMERIC_GROUPS:
+                    values = columns.numeric[key][rows]
+                    missing = np.isnan(values)
+                    if missing.all():
+                        continue
+                    if key in columns.integral:
+                        values = np.where(missing, 0, values).astype(np.int64)
+                    fields.append(values.tolist())
+                else:
+                    indexes = columns.text[key][rows]
+                    missing = indexes == _MISSING_CODE
+                    if missing.all():
+                        continue
+                    fields.append(encoded[np.where(missing, len(encoded) - 1, indexes)].tolist())
+                irregular |= missing
+                # a % in a field code must not be taken for a placeholder
+                group_fields.append(dumps(key[1]).decode("utf-8").replace("%", "%%") + ":%s")
+            if group_fields:
+                template += f',"{group}":{{' + ",".join(group_fields) + "}"
+        template += "}"
+
+        for row in columns.fallback:
+            if self._start <= row < self._stop:
+                irregular[row - self._start] = True
+        texts = [template % values for values in zip(*fields)]
+        return texts, irregular
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """The measurements as the dicts ingest_usage sends."""
+        if not len(self):
+            return []
+        texts, irregular = self._row_strings()
+        columns = self._columns
+        measurements = []
+        for index, text in enumerate(texts):
+            row = self._start + index
+            if row in columns.fallback:
+                measurements.append(columns.fallback[row])
+            elif irregular[index]:
+                measurements.append(self._sparse_row(row))
+            else:
+                measurements.append(loads(text))
+        return measurements
+
+    def _sparse_row(self, row: int) -> Dict[str, Any]:
+        # a row that leaves out some of the batch's fields
+        columns = self._columns
+        measurement = {"uid": _format_uids(columns.uid[row:row + 1])[0],
+                       "meter": columns.strings[columns.meter[row]],
+                       "account": columns.strings[columns.account[row]],
+                       "ts": _format_timestamps(columns.ts[row:row + 1])[0]}
+        for (group, code), column in columns.numeric.items():
+            if not np.isnan(column[row]):
+                value = column[row].item()
+                measurement.setdefault(group, {})[code] = \
+                    int(value) if (group, code) in columns.integral else value
+        for (group, code), column in columns.text.items():
+            if column[row] != _MISSING_CODE:
+                measurement.setdefault(group, {})[code] = columns.strings[column[row]]
+        return {key: measurement[key] for key in (*_ENVELOPE_KEYS, *CATEGORY_GROUPS.values())
+                if key in measurement}
+
+    def encoded_rows(self) -> List[bytes]:
+        """Each measurement as JSON bytes, for encode_batch / stream_batch."""
+        if not len(self):
+            return []
+        texts, irregular = self._row_strings()
+        encoded = [text.encode("utf-8") for text in texts]
+        if irregular.any():
+            columns = self._columns
+            for index in np.flatnonzero(irregular).tolist():
+                row = self._start + index
+                measurement = columns.fallback[row] if row in columns.fallback \
+                    else self._sparse_row(row)
+                encoded[index] = dumps(measurement)
+        return encoded
+
+    def to_body(self) -> bytes:
+        """The Measurements API request body, {"measurements": [...]}, as bytes."""
+        if not len(self):
+            return (_BODY_PREFIX + _BODY_SUFFIX).encode("utf-8")
+        texts, irregular = self._row_strings()
+        if irregular.any():
+            return b"".join((_BODY_PREFIX.encode("utf-8"),
+                             _SEPARATOR.encode("utf-8").join(self.encoded_rows()),
+                             _BODY_SUFFIX.encode("utf-8")))
+        return (_BODY_PREFIX + _SEPARATOR.join(texts) + _BODY_SUFFIX).encode("utf-8")
+
+    def encoded_batches(self, batch_size: int, max_batch_bytes: int) -> Iterator[List[bytes]]:
+        """
+        Encodes the batch once and groups the rows like iter_encoded_batches:
+        at most batch_size measurements per group, and a request body within
+        max_batch_bytes (a single larger row is sent alone).
+        """
+        overhead = len(_BODY_PREFIX) + len(_BODY_SUFFIX)
+        group: List[bytes] = []
+        group_bytes = overhead
+        for encoded in self.encoded_rows():
+            item_bytes = len(encoded) + (len(_SEPARATOR) if group else 0)
+            if group and (len(group) >= batch_size or group_bytes + item_bytes > max_batch_bytes):
+                yield group
+                group, group_bytes, item_bytes = [], overhead, len(encoded)
+            group.append(encoded)
+            group_bytes += item_bytes
+        if group:
+            yield group
@@ -0,0 +1,311 @@
+import bisect
+import json
+import logging
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds, Prometheus style (le=...)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000)
+
+# /organizations/<orgId> is the same for every call of a client
+_ORG_PREFIX = re.compile(r"^/organizations/[^/]+")
+
+
+def endpoint_name(method: str, url: str) -> str:
+    """
+    Returns the metrics label of a request, e.g. "POST /meters" or "GET /plans/{id}".
+    The organization prefix is dropped and entity ids are replaced by {id}, so
+    every call of the same API operation lands in the same series.
+    """
+    path = _ORG_PREFIX.sub("", urlsplit(url).path) or "/"
+    segments = path.strip("/").split("/")
+    # m3ter paths alternate collection / id: /plans/{id}, /accounts/{id}/...
+    normalized = [segment if index % 2 == 0 or segment == "token" else "{id}"
+                  for index, segment in enumerate(segments)]
+    return f"{method.upper()} /{'/'.join(normalized)}"
+
+
+class Histogram:
+    """Cumulative bucket histogram with sum and count, like a Prometheus histogram."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimates a quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+            "overflow": self.counts[-1],
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class RequestEvent:
+    """
+    One completed HTTP request, as passed to metrics hooks.
+    status_code is None and error is set when no response was received.
+    retries counts throttled attempts resent by the rate limiter.
+    """
+
+    def __init__(self, endpoint: str, method: str, url: str, status_code: Optional[int],
+                 elapsed: float, bytes_sent: int, bytes_received: int, retries: int = 0,
+                 error: Optional[BaseException] = None):
+        self.endpoint = endpoint
+        self.method = method
+        self.url = url
+        self.status_code = status_code
+        self.elapsed = elapsed
+        self.bytes_sent = bytes_sent
+        self.bytes_received = bytes_received
+        self.retries = retries
+        self.error = error
+
+
+class EndpointStats:
+    """Counters and latency histogram of one endpoint."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.status_codes: Dict[str, int] = {}
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "status_codes": dict(self.status_codes),
+            "retries": self.retries,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "latency_seconds": self.latency.snapshot(),
+        }
+
+
+MetricsHook = Callable[[RequestEvent], None]
+
+
+class ClientMetrics:
+    """
+    In-process metrics of an M3terApiClient.
+    Every request is recorded per endpoint (request count, latency histogram,
+    bytes sent/received, status codes, throttled retries, connection errors),
+    ingest calls also record their batch size. Additional hooks receive each
+    RequestEvent, e.g. to forward it to StatsD. Read the numbers with
+    snapshot() / to_json() or expose to_prometheus() on a /metrics endpoint.
+    """
+
+    def __init__(self, hooks: Optional[Iterable[MetricsHook]] = None):
+        self.started_at = time.monotonic()
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.ingest_batches = Histogram(BATCH_SIZE_BUCKETS)
+        self.ingested_measurements = 0
+        self._hooks: List[MetricsHook] = list(hooks or [])
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: MetricsHook) -> None:
+        """Registers a callable that is invoked with every RequestEvent."""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook: MetricsHook) -> None:
+        self._hooks.remove(hook)
+
+    def record_request(self, event: RequestEvent) -> None:
+        with self._lock:
+            stats = self.endpoints.get(event.endpoint)
+            if stats is None:
+                stats = self.endpoints[event.endpoint] = EndpointStats()
+            stats.requests += 1
+            stats.retries += event.retries
+            stats.bytes_sent += event.bytes_sent
+            stats.bytes_received += event.bytes_received
+            stats.latency.observe(event.elapsed)
+            if event.status_code is None:
+                stats.errors += 1
+            else:
+                code = str(event.status_code)
+                stats.status_codes[code] = stats.status_codes.get(code, 0) + 1
+
+        for hook in self._hooks:
+            try:
+                hook(event)
+            except Exception:
+                # a broken hook must never fail the API call it observes
+                logger.exception("Metrics hook %r failed", hook)
+
+    def record_ingest(self, measurements: int) -> None:
+        """Records one accepted ingest request carrying this many measurements."""
+        with self._lock:
+            self.ingest_batches.observe(measurements)
+            self.ingested_measurements += measurements
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns all metrics as a JSON-serializable dict."""
+        with self._lock:
+            uptime = time.monotonic() - self.started_at
+            return {
+                "uptime_seconds": uptime,
+                "endpoints": {name: stats.snapshot()
+                              for name, stats in sorted(self.endpoints.items())},
+                "ingest": {
+                    "measurements": self.ingested_measurements,
+                    "measurements_per_second":
+                        self.ingested_measurements / uptime if uptime > 0 else 0.0,
+                    "batch_size": self.ingest_batches.snapshot(),
+                },
+            }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_prometheus(self, prefix: str = "m3ter_client") -> str:
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str) -> str:
+            full_name = f"{prefix}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            return full_name
+
+        def histogram(name: str, labels: str, hist: Histogram) -> None:
+            separator = "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(hist.buckets, hist.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {hist.count}')
+            lines.append(f"{name}_sum{{{labels}}} {hist.sum}")
+            lines.append(f"{name}_count{{{labels}}} {hist.count}")
+
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+
+            name = metric("requests_total", "counter", "HTTP requests sent, by endpoint.")
+            for endpoint, stats in endpoints:
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {stats.requests}')
+
+            name = metric("responses_total", "counter", "HTTP responses, by endpoint and status code.")
+            for endpoint, stats in endpoints:
+                for code, count in sorted(stats.status_codes.items()):
+                    lines.append(f'{name}{{endpoint="{endpoint}",code="{code}"}} {count}')
+
+            name = metric("request_errors_total", "counter",
+                          "Requests that failed without a response, by endpoint.")
+            for endpoint, stats in endpoints:
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {stats.errors}')
+
+            name = metric("retries_total", "counter", "Throttled requests resent, by endpoint.")
+            for endpoint, stats in endpoints:
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {stats.retries}')
+
+            name = metric("sent_bytes_total", "counter", "Request body bytes sent, by endpoint.")
+            for endpoint, stats in endpoints:
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {stats.bytes_sent}')
+
+            name = metric("received_bytes_total", "counter",
+                          "Response body bytes received, by endpoint.")
+            for endpoint, stats in endpoints:
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {stats.bytes_received}')
+
+            name = metric("request_duration_seconds", "histogram",
+                          "Request latency including throttled retries, by endpoint.")
+            for endpoint, stats in endpoints:
+                histogram(name, f'endpoint="{endpoint}"', stats.latency)
+
+            name = metric("ingested_measurements_total", "counter",
+                          "Measurements accepted by the Measurements API.")
+            lines.append(f"{name} {self.ingested_measurements}")
+
+            name = metric("ingest_batch_size", "histogram", "Measurements per ingest request.")
+            histogram(name, "", self.ingest_batches)
+
+        return "\n".join(lines) + "\n"
+
+
+class _CountingBody:
+    """Wraps a streamed request body and counts the bytes the adapter reads from it."""
+
+    def __init__(self, body: Iterable[bytes]):
+        self._body = body
+        self.bytes = 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._body:
+            self.bytes += len(chunk)
+            yield chunk
+
+
+class InstrumentedSession(requests.Session):
+    """requests.Session that records every request it sends into a ClientMetrics."""
+
+    def __init__(self, metrics: ClientMetrics):
+        super().__init__()
+        self.metrics = metrics
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        endpoint = endpoint_name(request.method, request.url)
+        counting_body = None
+        if request.body is None:
+            bytes_sent = 0
+        elif isinstance(request.body, (bytes, str)):
+            bytes_sent = len(request.body)
+        else:
+            counting_body = request.body = _CountingBody(request.body)
+            bytes_sent = 0
+
+        start = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception as e:
+            self.metrics.record_request(RequestEvent(
+                endpoint, request.method, request.url, None, time.perf_counter() - start,
+                counting_body.bytes if counting_body else bytes_sent, 0, error=e))
+            raise
+        elapsed = time.perf_counter() - start
+
+        if counting_body is not None:
+            bytes_sent = counting_body.bytes
+        if kwargs.get("stream"):
+            # don't consume a body the caller wants to stream
+            bytes_received = int(response.headers.get("Content-Length") or 0)
+        else:
+            bytes_received = len(response.content)
+        self.metrics.record_request(RequestEvent(
+            endpoint, request.method, request.url, response.status_code, elapsed,
+            bytes_sent, bytes_received, retries=getattr(response, "throttle_retries", 0)))
+        return response
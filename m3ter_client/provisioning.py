@@ -0,0 +1,236 @@
+import copy
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from m3ter_client.api_client import M3terApiClient
+from m3ter_client.schema import find_aggregation_index
+from m3ter_client.state_store import ProvisioningStateStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class ProvisioningError(Exception):
+    """Raised when one or more entities could not be created."""
+
+    def __init__(self, message: str, failures: Dict[str, Exception]):
+        super().__init__(message)
+        self.failures = failures
+
+
+class ProvisioningNode:
+    """
+    One entity to create.
+    links maps a payload field (e.g. "meterId") to the key of the node whose
+    m3ter id fills it; those nodes are this node's dependencies.
+    entity_type and code identify the entity in a ProvisioningStateStore.
+    """
+
+    def __init__(self, key: str, payload: Dict[str, Any],
+                 create: Callable[[M3terApiClient, Dict[str, Any]], Dict[str, Any]],
+                 links: Optional[Dict[str, str]] = None,
+                 entity_type: Optional[str] = None, code: Optional[str] = None):
+        self.key = key
+        self.payload = payload
+        self.create = create
+        self.links = links or {}
+        self.entity_type = entity_type or key.split("[")[0]
+        self.code = code if code is not None else payload.get("code", key)
+
+    @property
+    def dependencies(self) -> List[str]:
+        return list(self.links.values())
+
+
+def build_provisioning_graph(mock_data: Dict[str, Any]) -> Dict[str, ProvisioningNode]:
+    """
+    Builds the entity dependency graph for everything task1 - task3 create.
+    Node payloads are the dicts inside mock_data, so created ids are written
+    back into mock_data as the graph executes. AccountPlan nodes hold a
+    per-account copy of the AccountPlan template instead.
+    """
+    nodes = {}
+
+    def add(node: ProvisioningNode) -> None:
+        nodes[node.key] = node
+
+    add(ProvisioningNode(
+        "Product", mock_data["Product"],
+        lambda client, p: client.create_product(name=p["name"], code=p["code"])))
+    add(ProvisioningNode(
+        "Meter", mock_data["Meter"],
+        lambda client, p: client.create_meter(p),
+        {"productId": "Product"}))
+
+    aggregations = mock_data.get("Aggregation", [])
+    for index, aggregation in enumerate(aggregations):
+        add(ProvisioningNode(
+            f"Aggregation[{index}]", aggregation,
+            lambda client, p: client.create_aggregation(p),
+            {"meterId": "Meter"}))
+
+    if "PlanTemplate" in mock_data:
+        add(ProvisioningNode(
+            "PlanTemplate", mock_data["PlanTemplate"],
+            lambda client, p: client.create_plan_template(p),
+            {"productId": "Product"}))
+        add(ProvisioningNode(
+            "Plan", mock_data["Plan"],
+            lambda client, p: client.create_plan(p),
+            {"planTemplateId": "PlanTemplate"}))
+
+        for index, pricing in enumerate(mock_data.get("Pricing", [])):
+            aggregation_index = find_aggregation_index(pricing, aggregations)
+            # aggregationCode is a local hint only, not a Pricing API field
+            pricing.pop("aggregationCode", None)
+            # pricings have no code of their own: one pricing per plan + aggregation
+            add(ProvisioningNode(
+                f"Pricing[{index}]", pricing,
+                lambda client, p: client.create_pricing(p),
+                {"planId": "Plan",
+                 "aggregationId": f"Aggregation[{aggregation_index}]"},
+                code=f"{mock_data['Plan']['code']}:{aggregations[aggregation_index]['code']}"))
+
+    for index, account in enumerate(mock_data.get("Account", [])):
+        add(ProvisioningNode(
+            f"Account[{index}]", account,
+            lambda client, p: client.create_account(p)))
+
+        if "AccountPlan" in mock_data and "Plan" in nodes:
+            # every account gets its own copy of the AccountPlan template; the
+            # copy stays on the node so the Account payload is posted as is.
+            # Measurement is the task4 sample nested under AccountPlan, not a field.
+            account_plan = copy.deepcopy(mock_data["AccountPlan"])
+            account_plan.pop("Measurement", None)
+            add(ProvisioningNode(
+                f"AccountPlan[{index}]", account_plan,
+                lambda client, p: client.create_account_plan(p),
+                {"accountId": f"Account[{index}]", "planId": "Plan"},
+                code=f"{account['code']}:{mock_data['Plan']['code']}"))
+
+    return nodes
+
+
+class ProvisioningExecutor:
+    """
+    Creates the nodes of a provisioning graph with a pool of worker threads.
+    A node is submitted as soon as all its dependencies have ids, so total
+    time follows the critical path of the graph rather than the node count.
+    With a state store, nodes already recorded there are not created again
+    and every new id is recorded as soon as the API returns it.
+    """
+
+    def __init__(self, client: M3terApiClient, max_workers: int = DEFAULT_MAX_WORKERS,
+                 state_store: Optional[ProvisioningStateStore] = None):
+        self.client = client
+        self.max_workers = max_workers
+        self.state_store = state_store
+
+    def _create(self, node: ProvisioningNode) -> Optional[str]:
+        # runs on a worker thread
+        m3ter_id = node.create(self.client, node.payload).get("id")
+        if self.state_store is not None and m3ter_id is not None:
+            self.state_store.record(node.entity_type, node.code, m3ter_id)
+        return m3ter_id
+
+    def run(self, nodes: Dict[str, ProvisioningNode]) -> Dict[str, str]:
+        """
+        Executes the graph and returns the created id for each node key.
+        Stops scheduling new nodes after the first failure and raises
+        ProvisioningError once running nodes have finished.
+        """
+        for node in nodes.values():
+            for dependency in node.dependencies:
+                if dependency not in nodes:
+                    raise ValueError(
+                        f"Node '{node.key}' depends on unknown node '{dependency}'")
+
+        pending = {key: set(node.dependencies) for key, node in nodes.items()}
+        dependents = {key: [] for key in nodes}
+        for key, node in nodes.items():
+            for dependency in node.dependencies:
+                dependents[dependency].append(key)
+
+        ids = {}
+        failures = {}
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix="m3ter-provision") as executor:
+
+            def complete(key: str, m3ter_id: Optional[str]) -> None:
+                ids[key] = m3ter_id
+                nodes[key].payload["id"] = m3ter_id
+                for dependent in dependents[key]:
+                    if dependent in pending:
+                        pending[dependent].discard(key)
+
+            def submit_ready() -> None:
+                ready = [key for key, deps in pending.items() if not deps]
+                while ready:
+                    resumed = []
+                    for key in ready:
+                        del pending[key]
+                        node = nodes[key]
+                        for field, parent in node.links.items():
+                            node.payload[field] = ids[parent]
+
+                        stored_id = self.state_store.get_id(node.entity_type, node.code) \
+                            if self.state_store is not None else None
+                        if stored_id is not None:
+                            logger.info("Skipping %s, already created as %s", key, stored_id)
+                            complete(key, stored_id)
+                            resumed.append(key)
+                        else:
+                            running[executor.submit(self._create, node)] = key
+                    # nodes unblocked by resumed entities can be scheduled right away
+                    ready = [key for key, deps in pending.items() if not deps] if resumed else []
+
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    try:
+                        m3ter_id = future.result()
+                    except Exception as e:
+                        logger.error("Failed to provision %s: %s", key, e)
+                        failures[key] = e
+                        continue
+                    complete(key, m3ter_id)
+
+                if not failures:
+                    submit_ready()
+
+        if pending and not failures:
+            raise ValueError(
+                f"Provisioning graph has a cycle: {sorted(pending)}")
+        if failures:
+            raise ProvisioningError(
+                f"Failed to provision {len(failures)} entities: {sorted(failures)}",
+                failures)
+
+        return ids
+
+
+def provision(client: M3terApiClient, mock_data: Dict[str, Any],
+              max_workers: int = DEFAULT_MAX_WORKERS,
+              state_store: Optional[ProvisioningStateStore] = None) -> Dict[str, str]:
+    """
+    Creates every entity described in mock_data, filling in ids in place.
+    Once everything exists, each Account gets an accountPlans list with
+    its created AccountPlan. Pass a state_store to make the run resumable.
+    """
+    nodes = build_provisioning_graph(mock_data)
+    executor = ProvisioningExecutor(
+        client, max_workers=max_workers, state_store=state_store)
+    ids = executor.run(nodes)
+
+    # accounts are created by now, so their plans can be listed with them
+    for index, account in enumerate(mock_data.get("Account", [])):
+        account_plan = nodes.get(f"AccountPlan[{index}]")
+        if account_plan is not None:
+            account["accountPlans"] = [account_plan.payload]
+    return ids
@@ -0,0 +1,183 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import requests
+
+from m3ter_client.resilience import GuardedHTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Status codes that mean "slow down"
+THROTTLE_STATUS_CODES = (429, 503)
+_IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header (seconds or HTTP date) into seconds from now."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket plus concurrency limit for one endpoint family, tuned by AIMD.
+    While requests succeed the rate grows by about rate_increase per second of
+    traffic and the concurrency limit by about concurrency_increase per window
+    of requests. A 429/503 cuts both by decrease_factor (at most once per
+    decrease_cooldown seconds, since one overload usually throttles every
+    request in flight) and, if the server sent Retry-After, holds all requests
+    until it has passed. Failed requests (connection errors, timeouts,
+    5xx) free their slot without growing either limit.
+    """
+
+    def __init__(self, rate: float = 50.0, min_rate: float = 1.0, max_rate: float = 1000.0,
+                 concurrency: float = 8.0, min_concurrency: float = 1.0,
+                 max_concurrency: float = 64.0,
+                 rate_increase: float = 5.0, concurrency_increase: float = 1.0,
+                 decrease_factor: float = 0.5, decrease_cooldown: float = 1.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.rate_increase = rate_increase
+        self.concurrency_increase = concurrency_increase
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+
+        self.in_flight = 0
+        self.throttled = 0
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        # bucket capacity is one second worth of requests
+        capacity = max(1.0, self.rate)
+        self._tokens = min(capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self) -> None:
+        """Blocks until the request may be sent."""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self.in_flight >= max(1, int(self.concurrency)):
+                    wait = None  # woken up by release()
+                elif self._tokens < 1.0:
+                    wait = (1.0 - self._tokens) / self.rate
+                else:
+                    self._tokens -= 1.0
+                    self.in_flight += 1
+                    return
+                self._condition.wait(wait)
+
+    def release(self, throttled: bool = False, retry_after: Optional[float] = None,
+                failed: bool = False) -> None:
+        """
+        Reports the outcome of a request started with acquire(): throttled
+        lowers the limits, failed leaves them as they are, success raises them.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                self.throttled += 1
+                if retry_after:
+                    self._blocked_until = max(self._blocked_until, now + retry_after)
+                if now - self._last_decrease >= self.decrease_cooldown:
+                    self._last_decrease = now
+                    self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                    self.concurrency = max(self.min_concurrency,
+                                           self.concurrency * self.decrease_factor)
+                    logger.warning("Throttled by server, rate lowered to %.1f/s, concurrency to %.1f",
+                                   self.rate, self.concurrency)
+            elif not failed:
+                self.rate = min(self.max_rate,
+                                self.rate + self.rate_increase / max(self.rate, 1.0))
+                self.concurrency = min(self.max_concurrency,
+                                       self.concurrency + self.concurrency_increase / max(self.concurrency, 1.0))
+            self._condition.notify_all()
+
+
+class RateLimitedHTTPAdapter(GuardedHTTPAdapter):
+    """
+    GuardedHTTPAdapter that sends every request through an AdaptiveRateLimiter.
+    A throttled request (429/503) is retried up to max_retries_throttled times
+    with jittered exponential backoff, never sooner than Retry-After. A 429
+    means the request was not processed, so any request is retried; a 503 is
+    only retried for idempotent requests (reads and measurement ingest, which
+    m3ter deduplicates by uid).
+    """
+
+    def __init__(self, limiter: AdaptiveRateLimiter, max_retries_throttled: int = 5,
+                 backoff_base: float = 0.5, backoff_cap: float = 30.0, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+        self.max_retries_throttled = max_retries_throttled
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+    @staticmethod
+    def _is_idempotent(request: requests.PreparedRequest) -> bool:
+        return request.method in _IDEMPOTENT_METHODS or \
+            request.path_url.split("?")[0].endswith("/measurements")
+
+    def _can_retry(self, request: requests.PreparedRequest, status_code: int) -> bool:
+        # a streamed (generator) body has been consumed and cannot be resent
+        if not isinstance(request.body, (bytes, str, type(None))):
+            return False
+        return status_code == 429 or self._is_idempotent(request)
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                response = super().send(request, **kwargs)
+            except BaseException:
+                self.limiter.release(failed=True)
+                raise
+
+            throttled = response.status_code in THROTTLE_STATUS_CODES
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            self.limiter.release(throttled, retry_after, failed=response.status_code >= 500)
+
+            if not throttled or attempt >= self.max_retries_throttled \
+                    or not self._can_retry(request, response.status_code):
+                # read by InstrumentedSession for the retry metrics
+                response.throttle_retries = attempt
+                return response
+
+            # full jitter backoff, but not before the server said to come back
+            delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+            delay = max(delay, retry_after or 0.0)
+            attempt += 1
+            logger.info("%s %s returned %s, retry %s in %.2fs", request.method,
+                        request.path_url, response.status_code, attempt, delay)
+            # drain the body so the connection goes back to the pool
+            response.content
+            response.close()
+            time.sleep(delay)
@@ -0,0 +1,353 @@
+import logging
+import math
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from m3ter_client.schema import MeterSchema, find_aggregation_index
+
+logger = logging.getLogger(__name__)
+
+# Measurements converted to columns per step by ShadowRater.add
+DEFAULT_RATING_CHUNK = 100000
+
+AGGREGATION_FUNCTIONS = ("SUM", "COUNT", "MIN", "MAX", "MEAN", "LATEST")
+
+# Microsecond timestamp of a missing or empty ts (NaT)
+_NO_TS = np.iinfo(np.int64).min
+
+
+def timestamp_micros(ts: Any) -> np.ndarray:
+    """
+    ISO 8601 UTC timestamps ("2024-12-01T00:00:00.000Z", with any number of
+    fraction digits) as int64 microseconds since the epoch, so they compare
+    by time rather than as text. Empty strings become NaT (int64 minimum).
+    """
+    ts = np.asarray(ts)
+    if not np.issubdtype(ts.dtype, np.datetime64):
+        ts = np.char.rstrip(ts.astype(str), "Z")
+    return ts.astype("datetime64[us]").astype(np.int64)
+
+
+def round_quantity(quantities: np.ndarray, rounding: str) -> np.ndarray:
+    """Applies an aggregation's rounding (NONE, UP, DOWN, NEAREST) to quantities."""
+    if rounding in (None, "NONE"):
+        return quantities
+    if rounding == "UP":
+        return np.ceil(quantities)
+    if rounding == "DOWN":
+        return np.floor(quantities)
+    if rounding == "NEAREST":
+        # half up, like m3ter, rather than numpy's half to even
+        return np.floor(quantities + 0.5)
+    raise ValueError(f"Unsupported rounding '{rounding}'")
+
+
+def price_quantities(quantities: np.ndarray, pricing_bands: Sequence[Dict[str, Any]],
+                     cumulative: bool = True) -> np.ndarray:
+    """
+    Prices an array of quantities (one per account) with a pricing's bands.
+    cumulative=True is tiered pricing: each band prices the units between its
+    lowerLimit and the next band's. cumulative=False is volume pricing: all
+    units are priced by the band the total quantity falls into. A band's
+    fixedPrice is charged once when the quantity reaches into it.
+    """
+    bands = sorted(pricing_bands, key=lambda band: band["lowerLimit"])
+    lower = np.array([band["lowerLimit"] for band in bands], dtype=np.float64)
+    unit_price = np.array([band.get("unitPrice", 0.0) for band in bands], dtype=np.float64)
+    fixed_price = np.array([band.get("fixedPrice", 0.0) for band in bands], dtype=np.float64)
+    quantities = np.asarray(quantities, dtype=np.float64)
+
+    if cumulative:
+        upper = np.append(lower[1:], np.inf)
+        # units of every account (rows) in every band (columns)
+        in_band = np.clip(quantities[:, None] - lower[None, :], 0.0, upper - lower)
+        reached = quantities[:, None] > lower[None, :]
+        return in_band @ unit_price + reached @ fixed_price
+
+    band = np.clip(np.searchsorted(lower, quantities, side="right") - 1, 0, None)
+    return np.where(quantities > 0,
+                    quantities * unit_price[band] + fixed_price[band], 0.0)
+
+
+class _Accumulator:
+    """Running per-account state of one aggregation function."""
+
+    def __init__(self, function: str):
+        if function not in AGGREGATION_FUNCTIONS:
+            raise ValueError(f"Unsupported aggregation '{function}'")
+        self.function = function
+        self.count = np.zeros(0)
+        self.sum = np.zeros(0)
+        self.min = np.zeros(0)
+        self.max = np.zeros(0)
+        self.latest_ts = np.zeros(0, dtype=np.int64)
+        self.latest = np.zeros(0)
+
+    def _grow(self, size: int) -> None:
+        extra = size - len(self.count)
+        if extra <= 0:
+            return
+        self.count = np.append(self.count, np.zeros(extra))
+        self.sum = np.append(self.sum, np.zeros(extra))
+        self.min = np.append(self.min, np.full(extra, np.inf))
+        self.max = np.append(self.max, np.full(extra, -np.inf))
+        self.latest_ts = np.append(self.latest_ts, np.full(extra, _NO_TS, dtype=np.int64))
+        self.latest = np.append(self.latest, np.zeros(extra))
+
+    def update(self, accounts: np.ndarray, values: np.ndarray, ts: Optional[np.ndarray],
+               size: int) -> None:
+        self._grow(size)
+        present = ~np.isnan(values)
+        accounts, values = accounts[present], values[present]
+
+        self.count += np.bincount(accounts, minlength=size)
+        if self.function in ("SUM", "MEAN"):
+            self.sum += np.bincount(accounts, weights=values, minlength=size)
+        elif self.function == "MIN":
+            np.minimum.at(self.min, accounts, values)
+        elif self.function == "MAX":
+            np.maximum.at(self.max, accounts, values)
+        elif self.function == "LATEST" and len(accounts):
+            if ts is None:
+                raise ValueError("LATEST aggregations need measurement timestamps")
+            ts = ts[present]
+            # last row of each account once sorted by account, then timestamp
+            order = np.lexsort((ts, accounts))
+            accounts, ts, values = accounts[order], ts[order], values[order]
+            last = np.append(accounts[1:] != accounts[:-1], True)
+            for account, row_ts, value in zip(accounts[last], ts[last], values[last]):
+                if row_ts >= self.latest_ts[account]:
+                    self.latest_ts[account] = row_ts
+                    self.latest[account] = value
+
+    def result(self, size: int) -> np.ndarray:
+        self._grow(size)
+        if self.function == "COUNT":
+            return self.count.copy()
+        if self.function == "SUM":
+            return self.sum.copy()
+        if self.function == "MEAN":
+            return np.divide(self.sum, self.count, out=np.zeros(size), where=self.count > 0)
+        if self.function == "MIN":
+            return np.where(self.count > 0, self.min, 0.0)
+        if self.function == "MAX":
+            return np.where(self.count > 0, self.max, 0.0)
+        return self.latest.copy()
+
+
+class LineItem:
+    """One expected invoice line: an account's charge for one pricing."""
+
+    def __init__(self, account: str, aggregation: Optional[str], description: str,
+                 quantity: float, amount: float, currency: str):
+        self.account = account
+        self.aggregation = aggregation
+        self.description = description
+        self.quantity = quantity
+        self.amount = amount
+        self.currency = currency
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "account": self.account,
+            "aggregation": self.aggregation,
+            "description": self.description,
+            "quantity": self.quantity,
+            "amount": self.amount,
+            "currency": self.currency,
+        }
+
+    def __repr__(self) -> str:
+        return (f"LineItem({self.account!r}, {self.description!r}, "
+                f"quantity={self.quantity}, amount={self.amount} {self.currency})")
+
+
+class ShadowRater:
+    """
+    Local re-implementation of m3ter rating for one meter and plan.
+    Measurements are added in chunks and folded column-wise into running
+    per-account aggregates, so memory does not grow with the number of
+    measurements. line_items() then applies quantityPerUnit, rounding and
+    the pricing bands to give the expected invoice lines, for reconciling
+    against invoices generated by m3ter Billing.
+    Only measurements with period_start <= ts < period_end are rated when a
+    billing period is given.
+    """
+
+    def __init__(self, meter: Dict[str, Any], aggregations: List[Dict[str, Any]],
+                 pricings: List[Dict[str, Any]], currency: str = "USD",
+                 standing_charge: float = 0.0,
+                 period_start: Optional[str] = None, period_end: Optional[str] = None):
+        self.meter = meter
+        self.aggregations = aggregations
+        self.currency = currency
+        self.standing_charge = standing_charge
+        self.period_start = period_start
+        self.period_end = period_end
+        # bounds as microseconds, so "...00.000Z" and "...00.000000Z" compare equal
+        self._period_start = None if period_start is None else int(timestamp_micros(period_start))
+        self._period_end = None if period_end is None else int(timestamp_micros(period_end))
+
+        schema = MeterSchema(meter)
+        self.data_fields = schema.data_fields
+        self.derived_fields = schema.derived_fields
+
+        for aggregation in aggregations:
+            target = aggregation["targetField"]
+            if target not in self.data_fields and target not in self.derived_fields:
+                raise ValueError(
+                    f"Aggregation '{aggregation['code']}' targets unknown field '{target}'")
+
+        # every pricing is linked to its aggregation the same way provisioning links them
+        self.pricings = [(pricing, find_aggregation_index(pricing, aggregations))
+                         for pricing in pricings]
+
+        # timestamps are only parsed when a period or LATEST needs them
+        self._needs_ts = period_start is not None or period_end is not None or \
+            any(aggregation["aggregation"] == "LATEST" for aggregation in aggregations)
+        self.accounts: Dict[str, int] = {}
+        self.measurements = 0
+        # measure values given as null, rated as not set
+        self.null_values = 0
+        self._accumulators = [_Accumulator(aggregation["aggregation"])
+                              for aggregation in aggregations]
+
+    @classmethod
+    def from_mock_data(cls, mock_data: Dict[str, Any], **kwargs) -> "ShadowRater":
+        """Builds a rater for the Meter, Aggregations and Pricings of mock_data.yaml."""
+        plan_template = mock_data.get("PlanTemplate", {})
+        return cls(mock_data["Meter"], mock_data.get("Aggregation", []),
+                   mock_data.get("Pricing", []),
+                   currency=plan_template.get("currency", "USD"),
+                   standing_charge=plan_template.get("standingCharge", 0.0),
+                   **kwargs)
+
+    def _account_indexes(self, accounts: Union[str, np.ndarray], size: int) -> np.ndarray:
+        if isinstance(accounts, str):
+            index = self.accounts.setdefault(accounts, len(self.accounts))
+            return np.full(size, index, dtype=np.intp)
+        # a dict lookup per row beats np.unique, which sorts the strings
+        index = self.accounts
+        return np.fromiter((index.setdefault(code, len(index)) for code in np.asarray(accounts).tolist()),
+                           dtype=np.intp, count=size)
+
+    def add_columns(self, accounts: Union[str, np.ndarray], columns: Dict[str, np.ndarray],
+                    ts: Optional[np.ndarray] = None) -> None:
+        """
+        Adds measurements given column-wise, the fast path for large volumes.
+        accounts is one account code for all rows or an array with a code per
+        row; columns maps data field codes to value arrays (NaN = not set),
+        e.g. the "measure" columns of generate_measurement_columns.
+        """
+        size = len(next(iter(columns.values()))) if columns else len(ts)
+        self._add(self._account_indexes(accounts, size), columns, ts)
+
+    def add(self, measurements: Iterable[Dict[str, Any]],
+            chunk_size: int = DEFAULT_RATING_CHUNK) -> None:
+        """
+        Adds measurement dicts in the Measurements API format, e.g. the
+        "measurements" list of an ingest_usage payload or iter_measurements().
+        A null value is skipped like a missing one and counted in null_values.
+        """
+        iterator = iter(measurements)
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                return
+            size = len(chunk)
+            index = self.accounts
+            account_index = np.fromiter(
+                (index.setdefault(m["account"], len(index)) for m in chunk),
+                dtype=np.intp, count=size)
+            columns = {}
+            for code, group in self.data_fields.items():
+                values = [(m.get(group) or {}).get(code, math.nan) for m in chunk]
+                nulls = values.count(None)
+                if nulls:
+                    # rated like missing values
+                    self.null_values += nulls
+                    values = [math.nan if value is None else value for value in values]
+                columns[code] = np.array(values, dtype=np.float64)
+            ts = np.array([m.get("ts", "") for m in chunk])
+            self._add(account_index, columns, ts)
+
+    def _add(self, account_index: np.ndarray, columns: Dict[str, np.ndarray],
+             ts: Optional[np.ndarray]) -> None:
+        size = len(account_index)
+        columns = {code: np.asarray(values, dtype=np.float64) for code, values in columns.items()}
+        for code in self.data_fields:
+            if code not in columns:
+                columns[code] = np.full(size, np.nan)
+
+        if ts is not None and self._needs_ts:
+            ts = timestamp_micros(ts)
+        if self._period_start is not None or self._period_end is not None:
+            if ts is None:
+                raise ValueError("Timestamps are needed to rate a billing period")
+            in_period = ts != _NO_TS
+            if self._period_start is not None:
+                in_period &= ts >= self._period_start
+            if self._period_end is not None:
+                in_period &= ts < self._period_end
+            account_index, ts = account_index[in_period], ts[in_period]
+            columns = {code: values[in_period] for code, values in columns.items()}
+            size = int(in_period.sum())
+
+        for code, calculation in self.derived_fields.items():
+            columns[code] = calculation(columns)
+
+        for aggregation, accumulator in zip(self.aggregations, self._accumulators):
+            accumulator.update(account_index, columns[aggregation["targetField"]],
+                               ts, len(self.accounts))
+        self.measurements += size
+
+    def quantities(self) -> Dict[str, np.ndarray]:
+        """Returns {aggregation code: rated quantity per account}, in accounts order."""
+        size = len(self.accounts)
+        result = {}
+        for aggregation, accumulator in zip(self.aggregations, self._accumulators):
+            value = accumulator.result(size)
+            quantity = value / float(aggregation.get("quantityPerUnit") or 1)
+            result[aggregation["code"]] = round_quantity(quantity, aggregation.get("rounding"))
+        return result
+
+    def line_items(self) -> List[LineItem]:
+        """Returns the expected invoice lines of every account seen so far."""
+        accounts = list(self.accounts)
+        quantities = self.quantities()
+        items = []
+
+        if self.standing_charge:
+            for account in accounts:
+                items.append(LineItem(account, None, "Standing charge", 1.0,
+                                      float(self.standing_charge), self.currency))
+
+        for pricing, aggregation_index in self.pricings:
+            aggregation = self.aggregations[aggregation_index]
+            quantity = quantities[aggregation["code"]]
+            amounts = price_quantities(quantity, pricing["pricingBands"],
+                                       pricing.get("cumulative", True))
+            amounts = np.maximum(amounts, pricing.get("minimumSpend") or 0.0)
+            description = pricing.get("description") or aggregation["name"]
+            for account, account_quantity, amount in zip(accounts, quantity.tolist(),
+                                                         amounts.tolist()):
+                items.append(LineItem(account, aggregation["code"], description,
+                                      account_quantity, amount, self.currency))
+        return items
+
+    def totals(self) -> Dict[str, float]:
+        """Returns the expected bill total of every account."""
+        totals = {account: 0.0 for account in self.accounts}
+        for item in self.line_items():
+            totals[item.account] += item.amount
+        return totals
+
+
+def shadow_rate(mock_data: Dict[str, Any], measurements: Iterable[Dict[str, Any]],
+                **kwargs) -> List[LineItem]:
+    """Rates a measurement stream with the pricing of mock_data and returns the line items."""
+    rater = ShadowRater.from_mock_data(mock_data, **kwargs)
+    rater.add(measurements)
+    return rater.line_items()
@@ -0,0 +1,238 @@
+import json
+import logging
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import requests
+
+from m3ter_client.dead_letter import DeadLetterFile
+from m3ter_client.structured_log import truncate
+
+logger = logging.getLogger(__name__)
+
+# Status codes meaning the server rejected the content of the batch, so
+# sending smaller parts of it can succeed; anything else is retried whole
+REJECTED_STATUS_CODES = frozenset({400, 413, 422})
+# Requests one batch may use to isolate its rejected measurements; with a
+# single bad row a batch of 1000 needs about 2 * log2(1000) = 20
+DEFAULT_MAX_RECOVERY_REQUESTS = 64
+
+# "measurements[12]" / "measurements.12" in an error message
+_INDEX_PATTERN = re.compile(r"measurements\s*(?:\[\s*(\d+)\s*\]|\.(\d+))")
+
+# A measurement either as a dict or already JSON encoded
+Measurement = Union[Dict[str, Any], bytes]
+
+
+class RecoveryResult:
+    """Outcome of ingest_with_recovery for one batch."""
+
+    def __init__(self):
+        self.sent = 0
+        self.requests = 0
+        # (measurement, error message) for every measurement the server rejected
+        self.rejected: List[Tuple[Measurement, str]] = []
+        # measurements not sent because of error (a transient failure)
+        self.failed: List[Measurement] = []
+        self.error: Optional[Exception] = None
+
+
+def rejection_response(error: Exception) -> Optional[requests.Response]:
+    """The response of a failed ingest request if the server rejected the batch, else None."""
+    while error is not None:
+        response = getattr(error, "response", None)
+        if response is not None:
+            return response if response.status_code in REJECTED_STATUS_CODES else None
+        error = error.__cause__
+    return None
+
+
+def error_message(response: requests.Response) -> str:
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    message = body.get("message") if isinstance(body, dict) else None
+    return f"HTTP {response.status_code}: {message or truncate(response.text)}"
+
+
+def _error_kind(response: requests.Response) -> Tuple[int, Any]:
+    # status and JSON message, without the response text: a server echoing
+    # the request would make every part's error look different
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    return response.status_code, body.get("message") if isinstance(body, dict) else None
+
+
+def _uid(measurement: Measurement) -> Any:
+    if isinstance(measurement, (bytes, bytearray)):
+        measurement = json.loads(measurement)
+    return measurement.get("uid") if isinstance(measurement, dict) else None
+
+
+def _walk(body: Any):
+    # every dict nested anywhere in a JSON body
+    if isinstance(body, dict):
+        yield body
+        for value in body.values():
+            yield from _walk(value)
+    elif isinstance(body, list):
+        for value in body:
+            yield from _walk(value)
+
+
+def identify_rejected(response: requests.Response,
+                      batch: Sequence[Measurement]) -> Dict[int, str]:
+    """
+    Finds the measurements an error response points at, as row -> error.
+    Understands error objects with a "uid" or "index" of the batch, and
+    messages naming a uid or "measurements[i]". Returns {} when the
+    response does not say which rows are bad, including a response that
+    echoes the request and so names every uid of it.
+    """
+    text = response.text or ""
+    message = error_message(response)
+    rows: Dict[int, str] = {}
+    uids = None
+
+    try:
+        body = json.loads(text)
+    except ValueError:
+        body = None
+    for entry in _walk(body):
+        entry_message = entry.get("message") or entry.get("error") or message
+        index = entry.get("index")
+        if isinstance(index, int) and not isinstance(index, bool) and 0 <= index < len(batch):
+            rows[index] = str(entry_message)
+        elif isinstance(entry.get("uid"), str):
+            if uids is None:
+                uids = {_uid(m): row for row, m in enumerate(batch)}
+            if entry["uid"] in uids:
+                rows[uids[entry["uid"]]] = str(entry_message)
+    if rows:
+        return rows
+
+    for match in _INDEX_PATTERN.finditer(text):
+        index = int(match.group(1) or match.group(2))
+        if index < len(batch):
+            rows[index] = message
+    if rows or not text:
+        return rows
+    for row, measurement in enumerate(batch):
+        uid = _uid(measurement)
+        if isinstance(uid, str) and uid and uid in text:
+            rows[row] = message
+    if len(batch) > 1 and len(rows) == len(batch):
+        return {}
+    return rows
+
+
+def ingest_with_recovery(send: Callable[[List[Measurement]], Any],
+                         batch: List[Measurement],
+                         dead_letter: Optional[DeadLetterFile] = None,
+                         max_requests: int = DEFAULT_MAX_RECOVERY_REQUESTS) -> RecoveryResult:
+    """
+    Sends batch with send(measurements) and recovers from a rejected batch
+    (HTTP 400 / 413 / 422) by sending only its good measurements.
+
+    When the error response names the bad rows they are taken out and the
+    rest is resent; otherwise the batch is split in half and each half sent
+    on its own, recursively, until every rejected measurement is isolated.
+    Rejected measurements are written to dead_letter with the server's
+    error. Other failures (connection errors, 5xx, exhausted retries) stop
+    the recovery: what has not been sent yet is returned in result.failed
+    with the error, to be retried or spooled by the caller.
+
+    A request the server refuses as a whole (a bad envelope or encoding)
+    fails every part with the same error. So when the first two single
+    measurements are rejected with the full batch's error before any part
+    got through, one measurement from the far end of the batch is sent on
+    its own as a probe. If it fails the same way the batch fails as a whole
+    instead of dead-lettering its rows; otherwise the two were bad rows and
+    bisecting goes on.
+    """
+    result = RecoveryResult()
+    # parts still to send, the next one last
+    pending = [batch]
+    batch_error = None
+    # single measurements rejected like the full batch before anything was
+    # sent: bad rows, or the first signs of a batch-wide rejection
+    unconfirmed: List[Tuple[Measurement, str]] = []
+    probe: Optional[List[Measurement]] = None
+
+    while pending:
+        part = pending.pop()
+        if result.error is not None:
+            result.failed.extend(part)
+            continue
+        if result.requests >= max_requests:
+            result.error = Exception(
+                f"Failed to isolate rejected measurements within {max_requests} requests")
+            result.failed.extend(part)
+            continue
+
+        result.requests += 1
+        try:
+            send(part)
+            result.sent += len(part)
+            continue
+        except Exception as e:
+            response = rejection_response(e)
+            if response is None:
+                result.error = e
+                result.failed.extend(part)
+                continue
+
+        if result.requests == 1:
+            batch_error = _error_kind(response)
+        rows = identify_rejected(response, part)
+        if len(part) == 1:
+            rejection = (part[0], rows.get(0, error_message(response)))
+            like_batch = result.sent == 0 and _error_kind(response) == batch_error
+            if part is probe and like_batch:
+                result.error = Exception(
+                    f"Failed to ingest batch, the server rejected every part of it: "
+                    f"{rejection[1]}")
+                result.failed.extend(measurement for measurement, _ in unconfirmed)
+                result.failed.append(part[0])
+                unconfirmed = []
+            elif probe is None and len(batch) > 1 and like_batch:
+                unconfirmed.append(rejection)
+                if len(unconfirmed) == 2 and pending:
+                    # probe with the first row of the part farthest from these two
+                    farthest = pending.pop(0)
+                    if len(farthest) > 1:
+                        pending.insert(0, farthest[1:])
+                    probe = farthest[:1]
+                    pending.append(probe)
+            else:
+                result.rejected.append(rejection)
+        elif rows:
+            result.rejected.extend((part[row], error) for row, error in rows.items())
+            rest = [measurement for row, measurement in enumerate(part) if row not in rows]
+            if rest:
+                pending.append(rest)
+        else:
+            middle = len(part) // 2
+            pending.append(part[middle:])
+            pending.append(part[:middle])
+
+    if unconfirmed:
+        # the probe got through (or failed differently), so the rows were
+        # bad; unless the recovery stopped before anything was sent
+        if result.error is not None and result.sent == 0:
+            result.failed[:0] = [measurement for measurement, _ in unconfirmed]
+        else:
+            result.rejected[:0] = unconfirmed
+
+    if result.rejected:
+        logger.warning("Isolated %s rejected of %s measurements in %s requests, first error: %s",
+                       len(result.rejected), len(batch), result.requests, result.rejected[0][1])
+        if dead_letter is not None:
+            dead_letter.write_many([
+                (json.loads(measurement) if isinstance(measurement, (bytes, bytearray))
+                 else measurement, error)
+                for measurement, error in result.rejected])
+    return result
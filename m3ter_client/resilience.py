@@ -0,0 +1,246 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Optional, Tuple, TypeVar
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker defaults: open after this many consecutive failures, stay
+# open for reset_timeout seconds, doubled after every failed probe up to
+# max_reset_timeout
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 5.0
+DEFAULT_MAX_RESET_TIMEOUT = 60.0
+
+# Hedging defaults: a duplicate is sent once a request has taken longer than
+# this percentile of recent latencies (never sooner than DEFAULT_HEDGE_MIN_DELAY),
+# for at most DEFAULT_HEDGE_BUDGET of all requests
+DEFAULT_HEDGE_PERCENTILE = 95.0
+DEFAULT_HEDGE_MIN_DELAY = 0.05
+DEFAULT_HEDGE_BUDGET = 0.1
+# Latencies kept for the percentile, and needed before the first hedge
+_LATENCY_WINDOW = 256
+_MIN_LATENCY_SAMPLES = 20
+
+# 5xx responses that mean the host is unhealthy; 503 (and 429) are
+# throttling, handled by the adaptive rate limiter instead
+_FAILURE_STATUS_CODES = frozenset({500, 502, 504})
+
+# (connect timeout, read timeout) in seconds, as requests takes it
+Timeout = Tuple[float, float]
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of sending a request while the host's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker.
+    Closed: requests pass, consecutive failures (connection errors, timeouts,
+    500/502/504) are counted. After failure_threshold of them the circuit
+    opens and every request fails fast with CircuitOpenError. After
+    reset_timeout seconds it is half-open: a single probe request is let
+    through; success closes the circuit, failure opens it again for twice
+    as long (up to max_reset_timeout).
+    """
+
+    def __init__(self, name: str, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+                 max_reset_timeout: float = DEFAULT_MAX_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+
+        self.state = CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self._open_for = reset_timeout
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_request(self) -> None:
+        """Raises CircuitOpenError unless a request may be sent now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self._open_for:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                logger.info("Circuit %s half-open, probing", self.name)
+                return
+            self.rejected += 1
+            retry_in = max(0.0, self._opened_at + self._open_for - time.monotonic())
+        raise CircuitOpenError(f"Circuit for {self.name} is open, retry in {retry_in:.1f}s")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("Circuit %s closed", self.name)
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+            self._open_for = self.reset_timeout
+
+    def release_probe(self) -> None:
+        """Lets another request probe after one that ended without an outcome."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self._probing = False
+                self._open_for = min(self.max_reset_timeout, self._open_for * 2)
+            elif self.state == OPEN or self.failures < self.failure_threshold:
+                return
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+            logger.warning("Circuit %s opened after %s failures, failing fast for %.1fs",
+                           self.name, self.failures, self._open_for)
+
+
+class GuardedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that applies a default (connect, read) timeout to requests
+    sent without one and, with a breaker, fails fast while the host is down.
+    """
+
+    def __init__(self, timeout: Optional[Timeout] = None,
+                 breaker: Optional[CircuitBreaker] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+        self.breaker = breaker
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        if self.breaker is None:
+            return super().send(request, **kwargs)
+
+        self.breaker.before_request()
+        succeeded = None
+        try:
+            response = super().send(request, **kwargs)
+            succeeded = response.status_code not in _FAILURE_STATUS_CODES
+        except Exception:
+            succeeded = False
+            raise
+        finally:
+            if succeeded is None:
+                # interrupted (KeyboardInterrupt, ...): no outcome to record,
+                # but a half-open circuit must not wait for this probe forever
+                self.breaker.release_probe()
+            elif succeeded:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+        return response
+
+
+class Hedger:
+    """
+    Hedged calls for idempotent requests: when a call has not finished
+    after the percentile of recent latencies, the same call is started once
+    more and whichever succeeds first is returned; the other one runs to
+    completion (or its read timeout) in the background. Hedges are limited
+    to budget times the number of calls, so a slow server does not get
+    twice the load.
+    """
+
+    def __init__(self, percentile: float = DEFAULT_HEDGE_PERCENTILE,
+                 min_delay: float = DEFAULT_HEDGE_MIN_DELAY,
+                 budget: float = DEFAULT_HEDGE_BUDGET, max_workers: int = 16):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.budget = budget
+        self.max_workers = max_workers
+
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies = deque(maxlen=_LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, None while there are too few samples."""
+        with self._lock:
+            if len(self._latencies) < _MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[index])
+
+    def _timed(self, call: Callable[[], T]) -> T:
+        started = time.perf_counter()
+        try:
+            return call()
+        finally:
+            # failures take time too, leaving them out skews the hedge delay
+            with self._lock:
+                self._latencies.append(time.perf_counter() - started)
+
+    def _may_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges >= self.budget * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def call(self, call: Callable[[], T]) -> T:
+        """Runs call(), hedged; raises the first error if every attempt failed."""
+        with self._lock:
+            self.calls += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers,
+                                                    thread_name_prefix="m3ter-hedge")
+        delay = self.delay()
+        if delay is None:
+            return self._timed(call)
+
+        # the delay runs from when the primary starts, not while it waits for a worker
+        started = threading.Event()
+
+        def primary_call() -> T:
+            started.set()
+            return self._timed(call)
+
+        primary = self._executor.submit(primary_call)
+        started.wait()
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._may_hedge():
+            return primary.result()
+
+        hedge = self._executor.submit(self._timed, call)
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                if error is None or future is primary:
+                    error = future.exception()
+        raise error
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
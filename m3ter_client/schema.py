@@ -0,0 +1,282 @@
+import ast
+import math
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Data field categories and the measurement key holding their values
+CATEGORY_GROUPS = {
+    "WHO": "who",
+    "WHAT": "what",
+    "WHERE": "where",
+    "OTHER": "other",
+    "METADATA": "metadata",
+    "MEASURE": "measure",
+    "INCOME": "income",
+    "COST": "cost",
+}
+# Groups whose values must be numbers
+NUMERIC_GROUPS = ("measure", "income", "cost")
+
+_PLAIN_NUMBER_TYPES = {int, float, type(None)}
+
+
+_BINARY_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+    ast.Pow: np.power,
+}
+_UNARY_OPERATORS = {
+    ast.USub: np.negative,
+    ast.UAdd: np.positive,
+}
+
+
+def is_timestamp(value: Any) -> bool:
+    """True for an ISO 8601 date-time with a time zone, e.g. "2024-12-01T00:00:00.000Z"."""
+    try:
+        # fromisoformat only understands a trailing Z from Python 3.11 on
+        if value[-1] == "Z":
+            value = value[:-1] + "+00:00"
+        return value[10] == "T" and datetime.fromisoformat(value).tzinfo is not None
+    except (ValueError, IndexError, TypeError):
+        return False
+
+
+def find_aggregation_index(pricing: Dict[str, Any], aggregations: List[Dict[str, Any]]) -> int:
+    """
+    Index of the aggregation a pricing is for: an explicit aggregationCode
+    wins, otherwise the pricing description keyword must appear in the
+    aggregation name (same rule as create_pricing_payload in tasks.py).
+    """
+    code = pricing.get("aggregationCode")
+    for index, aggregation in enumerate(aggregations):
+        if code is not None and aggregation["code"] == code:
+            return index
+        if code is None and pricing["description"] in aggregation["name"]:
+            return index
+    raise ValueError(
+        f"No aggregation found for pricing '{pricing.get('description')}'")
+
+
+class Calculation:
+    """
+    A derived field calculation (e.g. "memory_consumption*execution_time")
+    compiled once into a function over columns.
+    Only numbers, field codes, + - * / ** and parentheses are accepted;
+    the expression is never passed to eval().
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.fields: List[str] = []
+        try:
+            tree = ast.parse(expression, mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"Invalid calculation '{expression}': {e.msg}") from e
+        self._function = self._compile(tree.body)
+
+    def _compile(self, node: ast.AST) -> Callable[[Dict[str, np.ndarray]], Any]:
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+            operator = _BINARY_OPERATORS[type(node.op)]
+            left, right = self._compile(node.left), self._compile(node.right)
+            return lambda columns: operator(left(columns), right(columns))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+            operator = _UNARY_OPERATORS[type(node.op)]
+            operand = self._compile(node.operand)
+            return lambda columns: operator(operand(columns))
+        if isinstance(node, ast.Name):
+            name = node.id
+            if name not in self.fields:
+                self.fields.append(name)
+            return lambda columns: columns[name]
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            value = float(node.value)
+            return lambda columns: value
+        raise ValueError(
+            f"Unsupported element '{ast.dump(node)}' in calculation '{self.expression}'")
+
+    def __call__(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """Evaluates the calculation; rows with a missing input give NaN."""
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            return np.asarray(self._function(columns), dtype=np.float64)
+
+
+class ValidationResult:
+    """Outcome of MeterSchema.validate: the measurements to send and the rejected ones."""
+
+    def __init__(self, valid: List[Dict[str, Any]],
+                 rejected: List[Tuple[Dict[str, Any], List[str]]]):
+        self.valid = valid
+        # (measurement, [error, ...]) for every rejected measurement
+        self.rejected = rejected
+
+    @property
+    def ok(self) -> bool:
+        return not self.rejected
+
+
+class MeterSchema:
+    """
+    A Meter definition compiled into a measurement validator.
+    Field tables and derived field calculations are built once; validate()
+    then checks a whole batch, evaluating the derived fields column-wise,
+    and returns the rows the Measurements API would reject together with
+    the reasons, so they can be quarantined instead of failing the batch.
+    """
+
+    def __init__(self, meter: Dict[str, Any]):
+        self.meter_code = meter.get("code")
+
+        # data field code -> measurement group ("MEASURE" -> measurement["measure"])
+        self.data_fields: Dict[str, str] = {}
+        for field in meter.get("dataFields", []):
+            category = field.get("category", "MEASURE")
+            if category not in CATEGORY_GROUPS:
+                raise ValueError(
+                    f"Data field '{field['code']}' has unknown category '{category}'")
+            self.data_fields[field["code"]] = CATEGORY_GROUPS[category]
+
+        self.derived_fields: Dict[str, Calculation] = {}
+        for field in meter.get("derivedFields", []):
+            calculation = Calculation(field["calculation"])
+            unknown = [name for name in calculation.fields
+                       if self.data_fields.get(name) not in NUMERIC_GROUPS]
+            if unknown:
+                raise ValueError(
+                    f"Derived field '{field['code']}' uses unknown or non-numeric fields {unknown}")
+            self.derived_fields[field["code"]] = calculation
+
+        self.group_fields: Dict[str, frozenset] = {}
+        for code, group in self.data_fields.items():
+            self.group_fields[group] = self.group_fields.get(group, frozenset()) | {code}
+        self._numeric_fields = [(code, group) for code, group in self.data_fields.items()
+                                if group in NUMERIC_GROUPS]
+
+    @classmethod
+    def from_mock_data(cls, mock_data: Dict[str, Any]) -> "MeterSchema":
+        return cls(mock_data["Meter"])
+
+    def field_code(self, prefix: str) -> Optional[str]:
+        """Returns the first data field code starting with prefix, e.g. "memory_consumption"."""
+        return next((code for code in self.data_fields if code.startswith(prefix)), None)
+
+    def _check_envelope(self, measurements: List[Dict[str, Any]],
+                        errors: List[List[str]]) -> None:
+        # each check looks at a whole column first and only walks the rows
+        # one by one when the column has something wrong in it
+        uids = [m.get("uid") for m in measurements]
+        if set(map(type, uids)) != {str} or not all(uids) or len(set(uids)) != len(uids):
+            seen = set()
+            for row, uid in enumerate(uids):
+                if not isinstance(uid, str) or not uid:
+                    errors[row].append("uid is missing")
+                elif uid in seen:
+                    errors[row].append(f"duplicate uid '{uid}' in batch")
+                else:
+                    seen.add(uid)
+
+        if self.meter_code is not None:
+            meters = [m.get("meter") for m in measurements]
+            if set(meters) != {self.meter_code}:
+                for row, meter in enumerate(meters):
+                    if meter != self.meter_code:
+                        errors[row].append(f"meter '{meter}' is not '{self.meter_code}'")
+
+        accounts = [m.get("account") for m in measurements]
+        if set(map(type, accounts)) != {str} or not all(accounts):
+            for row, account in enumerate(accounts):
+                if not isinstance(account, str) or not account:
+                    errors[row].append("account is missing")
+
+        timestamps = [m.get("ts") for m in measurements]
+        for row, valid in enumerate(map(is_timestamp, timestamps)):
+            if not valid:
+                errors[row].append(f"ts '{timestamps[row]}' is not an ISO 8601 timestamp")
+
+        # only the groups that occur in the batch, usually just "measure"
+        keys = set().union(*{frozenset(m) for m in measurements})
+        for group in keys.intersection(CATEGORY_GROUPS.values()):
+            values = [m.get(group) for m in measurements]
+            allowed = self.group_fields.get(group, frozenset())
+            key_sets = {frozenset(value) for value in values if type(value) is dict}
+            if all(keys <= allowed for keys in key_sets) and \
+                    set(map(type, values)) <= {dict, type(None)}:
+                continue
+            for row, value in enumerate(values):
+                if value is None:
+                    continue
+                if not isinstance(value, dict):
+                    errors[row].append(f"{group} is not an object")
+                    continue
+                unknown = value.keys() - allowed
+                if unknown:
+                    errors[row].append(f"unknown {group} fields {sorted(unknown)}")
+
+    def _numeric_columns(self, measurements: List[Dict[str, Any]],
+                         errors: List[List[str]]) -> Dict[str, np.ndarray]:
+        # NaN marks a missing value; a value that is not a finite number is an error
+        columns = {}
+        for code, group in self._numeric_fields:
+            values = [m[group].get(code) if type(m.get(group)) is dict else None
+                      for m in measurements]
+            if set(map(type, values)) <= _PLAIN_NUMBER_TYPES:
+                # fast path: convert the whole column at once
+                column = np.array([np.nan if value is None else value for value in values],
+                                  dtype=np.float64)
+                missing = np.fromiter((value is None for value in values), dtype=bool,
+                                      count=len(values))
+                for row in np.flatnonzero(~np.isfinite(column) & ~missing).tolist():
+                    errors[row].append(f"{group}.{code} value {values[row]!r} is not a finite number")
+                    column[row] = np.nan
+            else:
+                column = np.full(len(values), np.nan)
+                for row, value in enumerate(values):
+                    if value is None:
+                        continue
+                    if isinstance(value, bool) or not isinstance(value, (int, float)) \
+                            or not math.isfinite(value):
+                        errors[row].append(f"{group}.{code} value {value!r} is not a finite number")
+                    else:
+                        column[row] = value
+            columns[code] = column
+        return columns
+
+    def validate(self, measurements: List[Dict[str, Any]]) -> ValidationResult:
+        """Checks a batch of measurements against the meter definition."""
+        errors = [[] for _ in measurements]
+        # rows that are not objects are rejected right away, the rest are checked together
+        rows = []
+        for row, measurement in enumerate(measurements):
+            if isinstance(measurement, dict):
+                rows.append(row)
+            else:
+                errors[row].append("measurement is not an object")
+        objects = [measurements[row] for row in rows]
+        object_errors = [errors[row] for row in rows]
+
+        if objects:
+            self._check_envelope(objects, object_errors)
+            columns = self._numeric_columns(objects, object_errors)
+            for code, calculation in self.derived_fields.items():
+                present = np.ones(len(objects), dtype=bool)
+                for name in calculation.fields:
+                    present &= ~np.isnan(columns[name])
+                result = calculation(columns)
+                for row in np.flatnonzero(~present).tolist():
+                    object_errors[row].append(f"derived field {code} needs {calculation.fields}")
+                for row in np.flatnonzero(present & ~np.isfinite(result)).tolist():
+                    object_errors[row].append(f"derived field {code} is not a finite number")
+
+        valid = []
+        rejected = []
+        for measurement, row_errors in zip(measurements, errors):
+            if row_errors:
+                rejected.append((measurement, row_errors))
+            else:
+                valid.append(measurement)
+        return ValidationResult(valid, rejected)
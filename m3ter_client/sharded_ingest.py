@@ -0,0 +1,220 @@
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from m3ter_client.api_client import (DEFAULT_BASE_URL, DEFAULT_INGEST_URL,
+                                     M3terApiClient)
+from m3ter_client.batcher import MAX_BATCH_BYTES, MAX_BATCH_SIZE
+from m3ter_client.generator import generate_measurement_batch
+from m3ter_client.streaming import DEFAULT_GENERATION_CHUNK, encode_batch
+
+logger = logging.getLogger(__name__)
+
+# Ingest requests in flight at once in each worker process
+DEFAULT_WORKER_IN_FLIGHT = 4
+# Keep at most this many error messages per shard in the result
+MAX_ERRORS_PER_SHARD = 10
+
+_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+# Set in each worker process by _init_worker
+_progress_queue = None
+
+
+class WorkUnit:
+    """Measurements of one account within one time window, generated and sent by one worker."""
+
+    def __init__(self, account_code: str, start_ts: str, end_ts: str, size: int, seed: int):
+        self.account_code = account_code
+        self.start_ts = start_ts
+        self.end_ts = end_ts
+        self.size = size
+        self.seed = seed
+
+
+class ShardedIngestResult:
+    """Totals of a sharded_ingest run, aggregated over all shards."""
+
+    def __init__(self, shards: List[Dict[str, Any]], elapsed: float):
+        self.shards = shards
+        self.elapsed = elapsed
+        self.sent = sum(shard["sent"] for shard in shards)
+        self.failed = sum(shard["failed"] for shard in shards)
+        self.errors = [error for shard in shards for error in shard["errors"]]
+
+    @property
+    def measurements_per_second(self) -> float:
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _split_window(start_ts: str, end_ts: str, parts: int) -> List[Tuple[str, str]]:
+    start = datetime.strptime(start_ts, _TIMESTAMP_FORMAT)
+    end = datetime.strptime(end_ts, _TIMESTAMP_FORMAT)
+    step = (end - start) / parts
+    bounds = [(start + step * i).strftime(_TIMESTAMP_FORMAT) for i in range(parts)] + [end_ts]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def plan_shards(account_codes: Sequence[str], size: int, start_ts: str, end_ts: str,
+                shards: int, seed: Optional[int] = None) -> List[List[WorkUnit]]:
+    """
+    Partitions size measurements per account into shards of work units.
+    Accounts are dealt round-robin; when there are fewer accounts than
+    shards, each account's time window is split as well so every shard
+    gets work. Each unit gets its own seed derived from seed.
+    """
+    windows = max(1, -(-shards // max(1, len(account_codes))))
+    units = []
+    for account_code in account_codes:
+        for index, (window_start, window_end) in enumerate(_split_window(start_ts, end_ts, windows)):
+            # spread the account's measurements over its windows
+            unit_size = size // windows + (1 if index < size % windows else 0)
+            if unit_size:
+                units.append((account_code, window_start, window_end, unit_size))
+
+    seeds = np.random.SeedSequence(seed).generate_state(len(units)).tolist() if units else []
+    plan = [[] for _ in range(min(shards, len(units)))]
+    for index, (unit, unit_seed) in enumerate(zip(units, seeds)):
+        plan[index % len(plan)].append(WorkUnit(*unit, seed=unit_seed))
+    return plan
+
+
+def _init_worker(progress_queue) -> None:
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def _run_shard(shard: int, units: List[WorkUnit], client_options: Dict[str, Any],
+               meter_code: str, measures: Dict[str, Tuple[int, int]],
+               batch_size: int, max_batch_bytes: int, max_in_flight: int) -> Dict[str, Any]:
+    """Worker process body: generates and sends every unit of one shard."""
+    started = time.monotonic()
+    sent = 0
+    failed = 0
+    errors = []
+    lock = threading.Lock()
+
+    def send(batch: List[bytes]) -> None:
+        nonlocal sent, failed
+        try:
+            client.ingest_usage_body(encode_batch(batch), measurement_count=len(batch))
+        except Exception as e:
+            with lock:
+                failed += len(batch)
+                if len(errors) < MAX_ERRORS_PER_SHARD:
+                    errors.append(f"shard {shard}: {e}")
+            _progress_queue.put((shard, 0, len(batch)))
+            return
+        with lock:
+            sent += len(batch)
+        _progress_queue.put((shard, len(batch), 0))
+
+    # one pooled client per worker; generation on this thread overlaps
+    # with up to max_in_flight requests on the sender threads
+    with M3terApiClient(pool_maxsize=max_in_flight, **client_options) as client:
+        client.authenticate()
+        slots = threading.BoundedSemaphore(max_in_flight)
+
+        def release_slot(_future) -> None:
+            slots.release()
+
+        with ThreadPoolExecutor(max_workers=max_in_flight,
+                                thread_name_prefix=f"m3ter-shard-{shard}") as executor:
+            for unit in units:
+                # generated column-wise and encoded straight from the columns,
+                # no dict is built per measurement
+                rng = np.random.default_rng(unit.seed)
+                remaining = unit.size
+                while remaining > 0:
+                    count = min(DEFAULT_GENERATION_CHUNK, remaining)
+                    remaining -= count
+                    chunk = generate_measurement_batch(meter_code, unit.account_code, unit.start_ts,
+                                                       unit.end_ts, count, measures, rng=rng)
+                    for batch in chunk.encoded_batches(batch_size, max_batch_bytes):
+                        slots.acquire()
+                        executor.submit(send, batch).add_done_callback(release_slot)
+
+    return {"shard": shard, "pid": os.getpid(), "sent": sent, "failed": failed,
+            "errors": errors, "elapsed": time.monotonic() - started}
+
+
+def _log_progress(sent: int, failed: int, total: int, elapsed: float) -> None:
+    logger.info("Sharded ingest: %s / %s measurements sent, %s failed (%.0f measurements/s)",
+                sent, total, failed, sent / elapsed if elapsed > 0 else 0.0)
+
+
+def sharded_ingest(access_key, api_secret, org_id, meter_code: str,
+                   account_codes: Sequence[str], size: int,
+                   measures: Dict[str, Tuple[int, int]], start_ts: str, end_ts: str,
+                   processes: Optional[int] = None, seed: Optional[int] = None,
+                   base_url: str = DEFAULT_BASE_URL, ingest_url: str = DEFAULT_INGEST_URL,
+                   token_cache_path: Optional[str] = None,
+                   batch_size: int = MAX_BATCH_SIZE, max_batch_bytes: int = MAX_BATCH_BYTES,
+                   max_in_flight: int = DEFAULT_WORKER_IN_FLIGHT,
+                   gzip_level: Optional[int] = None,
+                   on_progress: Optional[Callable[[int, int, int], None]] = None,
+                   progress_interval: float = 5.0) -> ShardedIngestResult:
+    """
+    Generates and ingests size random measurements per account with a pool
+    of worker processes, so generation and JSON encoding use every core and
+    overlap with network waits.
+
+    The work is split by plan_shards; each worker has its own pooled
+    client and sends its shard with max_in_flight requests at a time,
+    gzip-compressed when gzip_level is set. The
+    coordinator (this process) collects progress from all workers and calls
+    on_progress(sent, failed, total) after each batch, or logs progress every
+    progress_interval seconds. Failed batches are counted and reported in
+    the result, they do not stop the other shards. With no accounts or a
+    size of 0 no worker is started and an empty result is returned.
+    """
+    processes = processes or os.cpu_count() or 1
+    plan = plan_shards(account_codes, size, start_ts, end_ts, processes, seed)
+    total = size * len(account_codes)
+    client_options = {"access_key": access_key, "api_secret": api_secret, "org_id": org_id,
+                      "base_url": base_url, "ingest_url": ingest_url,
+                      "token_cache_path": token_cache_path, "gzip_level": gzip_level}
+    if not plan:
+        # no accounts or size 0: nothing to send, and a pool needs a worker
+        logger.info("Sharded ingest: nothing to send")
+        return ShardedIngestResult([], 0.0)
+
+    # spawn: forking a process that already runs threads (e.g. a batcher) can deadlock
+    context = multiprocessing.get_context("spawn")
+    progress_queue = context.Queue()
+    started = time.monotonic()
+    sent = failed = 0
+
+    with ProcessPoolExecutor(max_workers=len(plan), mp_context=context,
+                             initializer=_init_worker, initargs=(progress_queue,)) as executor:
+        futures = [executor.submit(_run_shard, shard, units, client_options, meter_code,
+                                   measures, batch_size, max_batch_bytes, max_in_flight)
+                   for shard, units in enumerate(plan)]
+
+        last_logged = time.monotonic()
+        while not all(future.done() for future in futures) or not progress_queue.empty():
+            try:
+                _, batch_sent, batch_failed = progress_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            sent += batch_sent
+            failed += batch_failed
+            if on_progress is not None:
+                on_progress(sent, failed, total)
+            elif time.monotonic() - last_logged >= progress_interval:
+                last_logged = time.monotonic()
+                _log_progress(sent, failed, total, time.monotonic() - started)
+
+        shards = [future.result() for future in futures]
+
+    result = ShardedIngestResult(shards, time.monotonic() - started)
+    _log_progress(result.sent, result.failed, total, result.elapsed)
+    return result
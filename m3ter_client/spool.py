@@ -0,0 +1,247 @@
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from m3ter_client.api_client import M3terApiClient
+from m3ter_client.codec import dumps, loads
+from m3ter_client.dead_letter import DeadLetterFile
+from m3ter_client.dedupe import UidDeduplicator
+from m3ter_client.recovery import ingest_with_recovery
+
+logger = logging.getLogger(__name__)
+
+# fsync policies
+FSYNC_ALWAYS = "always"      # fsync after every append and ack
+FSYNC_INTERVAL = "interval"  # fsync at most every fsync_interval seconds
+FSYNC_NEVER = "never"        # leave flushing to the OS
+
+DEFAULT_SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+# Record header: payload length and crc32 of the payload
+_HEADER = struct.Struct("<II")
+_SEGMENT_PREFIX = "segment-"
+_SEGMENT_SUFFIX = ".log"
+_ACK_SUFFIX = ".ack"
+
+RecordId = Tuple[str, int]
+
+
+class IngestSpool:
+    """
+    Append-only on-disk log of outgoing ingest batches.
+    Each batch is appended before it is sent and acked once the Measurements
+    API accepted it; anything not acked survives a crash and is returned by
+    pending(). Records live in segment files of up to segment_max_bytes, acks
+    in a matching .ack file; a segment is deleted once every record in it is
+    acked and it is no longer the active segment.
+    """
+
+    def __init__(self, directory: str,
+                 segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES,
+                 fsync: str = FSYNC_INTERVAL, fsync_interval: float = 1.0):
+        if fsync not in (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+
+        self._lock = threading.Lock()
+        self._last_sync = time.monotonic()
+        # segment name -> offsets of records not acked yet
+        self._unacked: Dict[str, Set[int]] = {}
+
+        os.makedirs(directory, exist_ok=True)
+        segments = self._segment_names()
+        for name in segments:
+            self._unacked[name] = {offset for offset, _ in self._read_segment(name)} - \
+                self._read_acks(name)
+
+        next_number = self._segment_number(segments[-1]) + 1 if segments else 1
+        self._open_segment(next_number)
+        for name in segments:
+            self._remove_if_done(name)
+
+    # Segment files
+
+    def _segment_names(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX))
+
+    @staticmethod
+    def _segment_number(name: str) -> int:
+        return int(name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)])
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _open_segment(self, number: int) -> None:
+        self._active = f"{_SEGMENT_PREFIX}{number:08d}{_SEGMENT_SUFFIX}"
+        self._segment_file = open(self._path(self._active), "ab")
+        self._ack_file = open(self._path(self._active + _ACK_SUFFIX), "ab")
+        self._unacked.setdefault(self._active, set())
+
+    def _read_segment(self, name: str) -> Iterator[Tuple[int, bytes]]:
+        """Yields (offset, payload); stops at a torn or corrupt tail record."""
+        with open(self._path(name), "rb") as file:
+            offset = 0
+            while True:
+                header = file.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return
+                length, checksum = _HEADER.unpack(header)
+                payload = file.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    logger.warning("Ignoring torn record at %s:%s", name, offset)
+                    return
+                yield offset, payload
+                offset += _HEADER.size + length
+
+    def _read_acks(self, name: str) -> Set[int]:
+        try:
+            with open(self._path(name + _ACK_SUFFIX), "r") as file:
+                return {int(line) for line in file if line.strip().isdigit()}
+        except OSError:
+            return set()
+
+    def _sync(self, file, force: bool = False) -> None:
+        file.flush()
+        if self.fsync == FSYNC_ALWAYS or force:
+            os.fsync(file.fileno())
+        elif self.fsync == FSYNC_INTERVAL:
+            now = time.monotonic()
+            if now - self._last_sync >= self.fsync_interval:
+                os.fsync(file.fileno())
+                self._last_sync = now
+
+    def _remove_if_done(self, name: str) -> None:
+        if name != self._active and not self._unacked.get(name):
+            self._unacked.pop(name, None)
+            for path in (self._path(name), self._path(name + _ACK_SUFFIX)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    # Public API
+
+    def append(self, payload: Dict[str, Any]) -> RecordId:
+        """Writes one ingest payload to the spool and returns its record id."""
+        data = dumps(payload)
+        with self._lock:
+            if self._segment_file.tell() >= self.segment_max_bytes:
+                self._rotate()
+            offset = self._segment_file.tell()
+            self._segment_file.write(_HEADER.pack(len(data), zlib.crc32(data)))
+            self._segment_file.write(data)
+            self._sync(self._segment_file)
+            self._unacked[self._active].add(offset)
+            return self._active, offset
+
+    def ack(self, record_id: RecordId) -> None:
+        """Marks a record as accepted by the server."""
+        name, offset = record_id
+        with self._lock:
+            if offset not in self._unacked.get(name, ()):
+                return
+            if name == self._active:
+                ack_file = self._ack_file
+                ack_file.write(f"{offset}\n".encode("ascii"))
+                self._sync(ack_file)
+            else:
+                with open(self._path(name + _ACK_SUFFIX), "ab") as ack_file:
+                    ack_file.write(f"{offset}\n".encode("ascii"))
+                    self._sync(ack_file)
+            self._unacked[name].discard(offset)
+            self._remove_if_done(name)
+
+    def pending(self) -> Iterator[Tuple[RecordId, Dict[str, Any]]]:
+        """Yields (record id, payload) for every record that was not acked."""
+        with self._lock:
+            self._segment_file.flush()
+            snapshot = {name: set(offsets) for name, offsets in self._unacked.items()}
+
+        for name in sorted(snapshot):
+            if not snapshot[name]:
+                continue
+            for offset, data in self._read_segment(name):
+                if offset in snapshot[name]:
+                    yield (name, offset), loads(data)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(len(offsets) for offsets in self._unacked.values())
+
+    def _rotate(self) -> None:
+        previous = self._active
+        self._sync(self._segment_file, force=True)
+        self._sync(self._ack_file, force=True)
+        self._segment_file.close()
+        self._ack_file.close()
+        self._open_segment(self._segment_number(previous) + 1)
+        self._remove_if_done(previous)
+
+    def close(self) -> None:
+        with self._lock:
+            self._sync(self._segment_file, force=True)
+            self._sync(self._ack_file, force=True)
+            self._segment_file.close()
+            self._ack_file.close()
+
+    def __enter__(self) -> "IngestSpool":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def _ingest(client: M3terApiClient, measurements: List[Dict[str, Any]],
+            dedupe: Optional[UidDeduplicator]) -> None:
+    client.ingest_usage(payload={"measurements": measurements})
+    if dedupe is not None:
+        dedupe.record(measurements)
+
+
+def replay_spool(client: M3terApiClient, spool: IngestSpool,
+                 dead_letter: Optional[DeadLetterFile] = None,
+                 dedupe: Optional[UidDeduplicator] = None) -> Tuple[int, int]:
+    """
+    Resends every un-acked batch in the spool, e.g. after a restart.
+    Measurements whose uid was already resent during this replay are dropped,
+    and m3ter itself treats a repeated uid as the same measurement, so
+    replaying a batch that did reach the server is harmless. With a dedupe,
+    measurements accepted before (e.g. by a run that crashed before its
+    ack) are dropped too, and the resent ones are recorded. Measurements
+    the server rejects are split out of their batch and written to
+    dead_letter, if given, so they do not block the record forever.
+    Returns (batches replayed, batches still failing).
+    """
+    seen_uids: Set[str] = set()
+    replayed = 0
+    failed = 0
+
+    for record_id, payload in spool.pending():
+        measurements = [m for m in payload.get("measurements", [])
+                        if m.get("uid") not in seen_uids]
+        if measurements and dedupe is not None:
+            measurements = dedupe.filter_new(measurements)
+        if measurements:
+            result = ingest_with_recovery(
+                lambda part: _ingest(client, part, dedupe), measurements, dead_letter)
+            if result.error is not None:
+                failed += 1
+                logger.error("Replay of spool record %s failed: %s", record_id, result.error)
+                continue
+
+        seen_uids.update(m.get("uid") for m in measurements)
+        spool.ack(record_id)
+        replayed += 1
+
+    logger.info("Spool replay finished: %s batches replayed, %s failed",
+                replayed, failed)
+    return replayed, failed
@@ -0,0 +1,61 @@
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+
+class ProvisioningStateStore:
+    """
+    SQLite record of the m3ter entities created so far, keyed by entity type + code.
+    Each id is committed the moment the API returns it, so a provisioning run
+    that fails midway can be rerun and skips everything already created.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # one connection shared by the provisioning worker threads, guarded by _lock
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS entities ("
+                " entity_type TEXT NOT NULL,"
+                " code TEXT NOT NULL,"
+                " m3ter_id TEXT NOT NULL,"
+                " created_at TEXT NOT NULL,"
+                " PRIMARY KEY (entity_type, code))")
+
+    def get_id(self, entity_type: str, code: str) -> Optional[str]:
+        """Returns the recorded m3ter id, or None if the entity was not created yet."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT m3ter_id FROM entities WHERE entity_type = ? AND code = ?",
+                (entity_type, code)).fetchone()
+        return row[0] if row else None
+
+    def record(self, entity_type: str, code: str, m3ter_id: str) -> None:
+        """Stores the id of a newly created entity and commits immediately."""
+        created_at = datetime.now(timezone.utc).isoformat()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entities (entity_type, code, m3ter_id, created_at)"
+                " VALUES (?, ?, ?, ?)",
+                (entity_type, code, m3ter_id, created_at))
+
+    def all(self) -> Dict[Tuple[str, str], str]:
+        """Returns {(entity_type, code): m3ter_id} for every recorded entity."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT entity_type, code, m3ter_id FROM entities").fetchall()
+        return {(entity_type, code): m3ter_id for entity_type, code, m3ter_id in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self) -> "ProvisioningStateStore":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
@@ -0,0 +1,132 @@
+import logging
+from itertools import islice
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Sequence, Tuple, Union)
+
+import numpy as np
+
+from m3ter_client.api_client import M3terApiClient
+from m3ter_client.batcher import MAX_BATCH_BYTES, MAX_BATCH_SIZE
+from m3ter_client.codec import dumps as dumps_json
+from m3ter_client.generator import generate_measurement_columns
+
+logger = logging.getLogger(__name__)
+
+# Measurements drawn per generate_measurement_columns call by iter_measurements
+DEFAULT_GENERATION_CHUNK = 10000
+
+# compact, like the codec's dumps
+_BODY_PREFIX = b'{"measurements":['
+_BODY_SUFFIX = b']}'
+_SEPARATOR = b','
+
+
+def iter_measurements(meter_code: str, account_codes: Sequence[str], start_ts: str, end_ts: str,
+                      size: int, measures: Dict[str, Tuple[int, int]],
+                      seed: Optional[int] = None,
+                      chunk_size: int = DEFAULT_GENERATION_CHUNK) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yields size random measurements for each account.
+    Values are drawn chunk_size rows at a time, so memory use does not grow
+    with size.
+    """
+    rng = np.random.default_rng(seed)
+
+    for account_code in account_codes:
+        remaining = size
+        while remaining > 0:
+            count = min(chunk_size, remaining)
+            remaining -= count
+            columns = generate_measurement_columns(
+                start_ts, end_ts, count, measures, rng)
+
+            codes = list(columns["measure"])
+            values = zip(*(column.tolist()
+                         for column in columns["measure"].values()))
+            for uid, ts, row in zip(columns["uid"].tolist(), columns["ts"].tolist(), values):
+                yield {
+                    "uid": uid,
+                    "meter": meter_code,
+                    "account": account_code,
+                    "ts": ts,
+                    "measure": dict(zip(codes, row))
+                }
+
+
+def chunk_measurements(measurements: Iterable[Dict[str, Any]],
+                       batch_size: int = MAX_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Groups a measurement stream into lists of at most batch_size measurements."""
+    iterator = iter(measurements)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def encode_batch(batch: Iterable[bytes]) -> bytes:
+    """Joins already encoded measurements into one Measurements API request body."""
+    return _BODY_PREFIX + _SEPARATOR.join(batch) + _BODY_SUFFIX
+
+
+def stream_batch(batch: Iterable[bytes]) -> Iterator[bytes]:
+    """Like encode_batch, but yields the body piece by piece for a streamed request."""
+    yield _BODY_PREFIX
+    for index, encoded in enumerate(batch):
+        if index:
+            yield _SEPARATOR
+        yield encoded
+    yield _BODY_SUFFIX
+
+
+def iter_encoded_batches(measurements: Iterable[Dict[str, Any]],
+                         batch_size: int = MAX_BATCH_SIZE,
+                         max_batch_bytes: int = MAX_BATCH_BYTES,
+                         dumps: Callable[[Any], Union[str, bytes]] = dumps_json
+                         ) -> Iterator[List[bytes]]:
+    """
+    Encodes a measurement stream into batches of JSON encoded measurements.
+    Each measurement is serialised exactly once; a batch is closed when it
+    holds batch_size measurements or the next one would push the request body
+    over max_batch_bytes. Pass a batch to encode_batch or stream_batch.
+    dumps defaults to the codec's fastest JSON backend; it may return str or bytes.
+    """
+    overhead = len(_BODY_PREFIX) + len(_BODY_SUFFIX)
+    batch = []
+    batch_bytes = overhead
+
+    for measurement in measurements:
+        encoded = dumps(measurement)
+        if isinstance(encoded, str):
+            encoded = encoded.encode("utf-8")
+        item_bytes = len(encoded) + (len(_SEPARATOR) if batch else 0)
+
+        if batch and (len(batch) >= batch_size or batch_bytes + item_bytes > max_batch_bytes):
+            yield batch
+            batch = []
+            batch_bytes = overhead
+            item_bytes = len(encoded)
+
+        batch.append(encoded)
+        batch_bytes += item_bytes
+
+    if batch:
+        yield batch
+
+
+def ingest_stream(client: M3terApiClient, measurements: Iterable[Dict[str, Any]],
+                  batch_size: int = MAX_BATCH_SIZE,
+                  max_batch_bytes: int = MAX_BATCH_BYTES,
+                  stream: bool = False) -> int:
+    """
+    Sends a measurement stream batch by batch and returns the number sent.
+    At most one encoded batch is held in memory at a time. With stream=True
+    the request body is sent in pieces instead of being joined first.
+    """
+    sent = 0
+    for batch in iter_encoded_batches(measurements, batch_size, max_batch_bytes):
+        body = stream_batch(batch) if stream else encode_batch(batch)
+        client.ingest_usage_body(body, measurement_count=len(batch))
+        sent += len(batch)
+        logger.debug("Ingested %s measurements so far", sent)
+    return sent
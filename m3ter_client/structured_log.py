@@ -0,0 +1,161 @@
+import itertools
+import json
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Union
+
+# Uids listed in a payload summary
+DEFAULT_SUMMARY_UIDS = 3
+# Response bodies are cut to this many characters in log records
+MAX_RESPONSE_CHARS = 500
+
+
+class PayloadSummary:
+    """
+    Stands in for a request payload in a log record: measurement count,
+    body size and the first few uids instead of the whole body. Nothing
+    is counted until a handler actually formats the record. Pass body_bytes
+    when the encoded body is at hand; a dict payload is otherwise encoded
+    once, on first use, to size it.
+    """
+
+    def __init__(self, payload: Union[Dict[str, Any], bytes, Iterable[bytes], None] = None,
+                 measurement_count: Optional[int] = None, max_uids: int = DEFAULT_SUMMARY_UIDS,
+                 body_bytes: Optional[int] = None):
+        self.payload = payload
+        self.measurement_count = measurement_count
+        self.max_uids = max_uids
+        self.body_bytes = body_bytes
+
+    def as_dict(self) -> Dict[str, Any]:
+        payload = self.payload
+        summary = {}
+        if isinstance(payload, dict):
+            measurements = payload.get("measurements")
+            if isinstance(measurements, list):
+                summary["measurements"] = len(measurements)
+                summary["uids"] = [m.get("uid") for m in measurements[:self.max_uids]
+                                   if isinstance(m, dict)]
+            else:
+                # config entities: the code identifies them well enough
+                summary.update({key: payload[key] for key in ("code", "name") if key in payload})
+            if self.body_bytes is None:
+                self.body_bytes = len(json.dumps(payload, default=str))
+            summary["bytes"] = self.body_bytes
+        elif isinstance(payload, (bytes, bytearray)):
+            summary["bytes"] = len(payload)
+        elif payload is not None:
+            summary["bytes"] = "streamed"
+        if self.measurement_count is not None:
+            summary["measurements"] = self.measurement_count
+        return summary
+
+    def __str__(self) -> str:
+        fields = self.as_dict()
+        if "uids" in fields:
+            fields["uids"] = ",".join(map(str, fields["uids"]))
+        return f"[{format_fields(fields)}]"
+
+
+def truncate(text: Optional[str], limit: int = MAX_RESPONSE_CHARS) -> Optional[str]:
+    if text is None or len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text)} chars)"
+
+
+def format_fields(fields: Dict[str, Any]) -> str:
+    """key=value pairs, as in 'measurements=1000 bytes=181234'."""
+    return " ".join(f"{key}={value}" for key, value in fields.items())
+
+
+class _Fields:
+    # formatted only when the record is emitted
+    __slots__ = ("fields",)
+
+    def __init__(self, fields: Dict[str, Any]):
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return format_fields(self.fields)
+
+
+class StructuredLogger:
+    """
+    Logs named events with key=value fields on top of a standard logger.
+
+        log = StructuredLogger(logger, sample_every={"usage.submitted": 100})
+        log.info("usage.submitted", measurements=1000, status=200)
+
+    When the level is disabled an event costs one isEnabledFor() check.
+    Events listed in sample_every are only logged for every Nth
+    occurrence (the record carries sampled="1/N"), errors are normally
+    left out of sampling. Field values are formatted by the handler, so
+    a PayloadSummary is only computed for records that are written. The
+    event name and fields are also attached to the record as record.event
+    and record.fields for JsonLogFormatter or other structured handlers.
+    """
+
+    def __init__(self, logger: logging.Logger, sample_every: Optional[Dict[str, int]] = None):
+        self.logger = logger
+        self.sample_every = dict(sample_every or {})
+        self._counters: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _sampled(self, event: str) -> bool:
+        every = self.sample_every.get(event, 1)
+        if every <= 1:
+            return True
+        counter = self._counters.get(event)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(event, itertools.count())
+        # next() on itertools.count is atomic under the GIL
+        return next(counter) % every == 0
+
+    def _emit(self, level: int, event: str, fields: Dict[str, Any]) -> None:
+        if not self._sampled(event):
+            return
+        every = self.sample_every.get(event, 1)
+        if every > 1:
+            fields["sampled"] = f"1/{every}"
+        # stacklevel: report the caller of debug() / info() / ..., not this module
+        self.logger.log(level, "%s %s", event, _Fields(fields),
+                        extra={"event": event, "fields": fields}, stacklevel=3)
+
+    def log(self, level: int, event: str, **fields: Any) -> None:
+        if self.logger.isEnabledFor(level):
+            self._emit(level, event, fields)
+
+    def debug(self, event: str, **fields: Any) -> None:
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._emit(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields: Any) -> None:
+        if self.logger.isEnabledFor(logging.INFO):
+            self._emit(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields: Any) -> None:
+        if self.logger.isEnabledFor(logging.WARNING):
+            self._emit(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields: Any) -> None:
+        if self.logger.isEnabledFor(logging.ERROR):
+            self._emit(logging.ERROR, event, fields)
+
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per record; events of a StructuredLogger keep their fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"time": self.formatTime(record), "level": record.levelname,
+                 "logger": record.name}
+        event = getattr(record, "event", None)
+        if event is not None:
+            entry["event"] = event
+            for key, value in record.fields.items():
+                entry[key] = value.as_dict() if isinstance(value, PayloadSummary) else value
+        else:
+            entry["message"] = record.getMessage()
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
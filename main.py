@@ -1,327 +1,195 @@
+"""
+Command line entry point for the m3ter tasks.
+
+    python main.py provision [--task 1|2|3|all] [--workers N]
+    python main.py ingest [--file usage.csv] [--processes N] [--size N]
+    python main.py replay [--spool-dir DIR]
+    python main.py load [--rate N --duration S | --profile STAGES] [--url URL]
+    python main.py bench generator|client|rating|batch|codec|load|startup [options]
+
+Only the standard library is imported up front; tasks.py (with yaml,
+requests, numpy and config) is imported once a subcommand needs it, so
+--help and argument errors return right away. Exits with 1 if the task
+failed, for cron and orchestration hooks.
+"""
+import argparse
 import logging
-import random
-import uuid
-from datetime import datetime, timedelta
-from pprint import pprint
-from typing import Any, Dict
+import sys
+import time
 
-import yaml
+# Time from interpreter start to this module is not visible from here;
+# startup is measured from the first line of this module instead
+_STARTED = time.perf_counter()
 
-import config
-from m3ter_client.api_client import AuthenticationError, M3terApiClient
+# Seconds the CLI may spend before handing over to the subcommand and its
+# deferred imports; logged with --timing, and checked for the whole process
+# by python -m benchmarks.bench_startup
+STARTUP_BUDGET = 0.25
+
+BENCHMARKS = ("generator", "client", "rating", "batch", "codec", "load", "startup")
 
-# Configure logging only in main.py
-logging.basicConfig(level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
-def create_pricing_payload(mock_data):
-    # This function gets aggregation M3ter ids from mock_data
-    # and adds them to the payload of pricing
-    # it avoids manual work
-    # it is called in task1()
-
-    # Extract the Aggregations and Pricings
-    aggregations = mock_data["Aggregation"]
-    pricings = mock_data["Pricing"]
-
-    # Create a keyword-based mapping from aggregation names to their IDs
-    aggregation_map = {}
-    for agg in aggregations:
-        if "Requests" in agg["name"]:
-            aggregation_map["Requests"] = agg["id"]
-        elif "Duration" in agg["name"]:
-            aggregation_map["Duration"] = agg["id"]
-
-    # Map the IDs to the pricing description fields
-    for pricing in pricings:
-        description = pricing["description"]
-
-        # Update the aggregationId based on the description keyword
-        pricing["aggregationId"] = aggregation_map.get(description)
-
-
-def generate_random_timestamp(start_ts: str, end_ts: str) -> str:
-    # Generates a random timestamp between start_ts and end_ts date strings.
-
-    start = datetime.strptime(start_ts, "%Y-%m-%dT%H:%M:%S.%fZ")
-    end = datetime.strptime(end_ts, "%Y-%m-%dT%H:%M:%S.%fZ")
-    delta = end - start
-    random_seconds = random.randint(0, int(delta.total_seconds()))
-    ts = (start + timedelta(seconds=random_seconds)
-          ).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-    return ts
-
-
-def generate_measurements_payload(meter_code: str, account_code: str, start_ts: str, end_ts: str, size: int) -> Dict[str, Any]:
-    # Generates a payload with a list of random measurements.
-    # manually update measure memory_consumption_api_x and xecution_time_api_x with the correct aggregation names
-    # this function will generate below values for each measurement:
-    #   - a random uid
-    #   - a random integer for memory consumption between 1 and 100
-    #   - a random integer for execution time between 1000 and 5000
-    #   - a random timestamp in December 2024
-
-    measurements = []
-    for _ in range(size):
-        measurement = {
-            "uid": str(uuid.uuid4()),
-            "meter": meter_code,
-            "account": account_code,
-            "ts": generate_random_timestamp(start_ts, end_ts),
-            # update aggregation codes suffix before you run
-            "measure": {
-                # update this before running task4
-                "memory_consumption_api_3": random.randint(1, 100),
-                # update this before running task4
-                "execution_time_api_3": random.randint(1000, 5000)
-            }
-        }
-        measurements.append(measurement)
-
-    return {"measurements": measurements}
-
-
-def task1() -> None:
-    # This function needs mock_data.yaml file
-    # It creates below  entities:
-    #
-    # Product: AWS Lambda API X
-    # Meter: Compute and Requests Meter API X
-    # Aggregations:
-    #     - Duration Aggregation API X
-    #     - Total Number of Requests API X
-
-    try:
-        # Load mock data
-        with open("mock_data.yaml", "r") as file:
-            mock_data = yaml.safe_load(file)
-
-        # Initialize client
-        client = M3terApiClient(access_key=config.access_key,
-                                api_secret=config.api_secret, org_id=config.org_id)
-
-        # Authenticate
-        client.authenticate()
-
-        # Create Product
-        product_name = mock_data["Product"]["name"]
-        product_code = mock_data["Product"]["code"]
-        # Make create product request
-        product_response = client.create_product(
-            name=product_name, code=product_code)
-        product_id = product_response.get("id")
-        # Save m3ter product id for other requests: create_meter
-        mock_data["Product"]["id"] = product_id
-
-        # Create Meter
-        mock_data["Meter"]["productId"] = mock_data["Product"]["id"]
-        meter_payload = mock_data["Meter"]
-        # Make create meter request
-        meter_response = client.create_meter(payload=meter_payload)
-        meter_id = meter_response.get("id")
-        # Save m3ter meter id for other requests: create_aggregations
-        mock_data["Meter"]["id"] = meter_id
-
-        # Create 2 Aggregations required in the task
-        aggregations = mock_data["Aggregation"]
-        for aggregation_payload in aggregations:
-            # add meterId to aggregation payload
-            aggregation_payload["meterId"] = meter_id
-            aggregation_response = client.create_aggregation(
-                aggregation_payload)
-            aggregation_id = aggregation_response.get("id")
-            aggregation_payload["id"] = aggregation_id
-
-        # After M3ter entities are created, mock data is updated with M3ter ids
-        # and saved in this new yaml file for task 2: mock_data_after_task1.yaml
-        with open("mock_data_after_task1.yaml", "w") as file:
-            yaml.safe_dump(
-                mock_data, file, default_flow_style=False, sort_keys=False)
-
-    except AuthenticationError as auth_err:
-        logger.error("Authentication Error: %s", auth_err)
-    except Exception as e:
-        logger.error("Error: %s", e)
-
-
-def task2() -> None:
-    # This function needs mock_data_after_task1.yaml file
-    # It needs to be run after task1
-    # It creates below  entities:
-    #
-    # Plan Template: Lambda Template API X
-    # Plan: Lambda Plan API X
-    # Pricing
-
-    try:
-        # Load mock data
-        with open("mock_data_after_task1.yaml", "r") as file:
-            mock_data = yaml.safe_load(file)
-
-        # Initialize client
-        client = M3terApiClient(access_key=config.access_key,
-                                api_secret=config.api_secret, org_id=config.org_id)
-
-        # Authenticate
-        client.authenticate()
-
-        # Create PlanTemplate
-        mock_data["PlanTemplate"]["productId"] = mock_data["Product"]["id"]
-        plan_template_payload = mock_data["PlanTemplate"]
-        # Make create plan template request
-        plan_template_response = client.create_plan_template(
-            payload=plan_template_payload)
-        # Save m3ter planTemplate id for other requests
-        plan_template_id = plan_template_response.get("id")
-        mock_data["PlanTemplate"]["id"] = plan_template_id
-
-        # Create Plan
-        mock_data["Plan"]["planTemplateId"] = mock_data["PlanTemplate"]["id"]
-        plan_payload = mock_data["Plan"]
-        plan_response = client.create_plan(payload=plan_payload)
-        # Save m3ter plan id for other requests
-        plan_id = plan_response.get("id")
-        mock_data["Plan"]["id"] = plan_id
-
-        # Create Pricing
-        # Generate Pricing Payload
-        create_pricing_payload(mock_data)
-
-        # Create 2 pricing components of the plan required in the task
-        pricings = mock_data["Pricing"]
-        for pricing_payload in pricings:
-
-            pricing_payload["planId"] = plan_id
-            pricing_response = client.create_pricing(pricing_payload)
-            pricing_id = pricing_response.get("id")
-            pricing_payload["id"] = pricing_id
-
-        # After M3ter entities are created, mock data is updated with M3ter ids
-        # and saved in this new yaml file for task 3: mock_data_after_task2.yaml
-        with open("mock_data_after_task2.yaml", "w") as file:
-            yaml.safe_dump(
-                mock_data, file, default_flow_style=False, sort_keys=False)
-
-    except AuthenticationError as auth_err:
-        logger.error("Authentication Error: %s", auth_err)
-    except Exception as e:
-        logger.error("Error: %s", e)
-
-
-def task3() -> None:
-    # This function needs mock_data_after_task2.yaml file
-    # It needs to be run after task2
-    # It creates below  entities:
-    #
-    # Account:
-    #   - Mickey Mouse Inc API X
-    #   - Donald Duck Ltd API X
-    #   - Pluto LLP API X
-    # AccountPlan (see attached plans for each account in the UI)
-
-    try:
-        # Load mock data
-        with open("mock_data_after_task2.yaml", "r") as file:
-            mock_data = yaml.safe_load(file)
-
-        # Initialize client
-        client = M3terApiClient(access_key=config.access_key,
-                                api_secret=config.api_secret, org_id=config.org_id)
-        # Authenticate
-        client.authenticate()
-
-        # Create Accounts and AccountPlans
-        # Extract the list of accounts from mock_data
-        accounts = mock_data["Account"]
-        # add plan id to the account plan payload
-        mock_data["AccountPlan"]["planId"] = mock_data["Plan"]["id"]
-        account_plan_payload = mock_data["AccountPlan"]
-
-        for account_payload in accounts:
-            # make account request
-            account_response = client.create_account(account_payload)
-            account_id = account_response.get("id")
-            account_payload["id"] = account_id
-            # make account plan request
-            account_plan_payload["accountId"] = account_id
-            client.create_account_plan(account_plan_payload)
-
-        # After M3ter entities are created, mock data is updated with M3ter ids
-        # and saved in this new yaml file: mock_data_after_task3.yaml
-        with open("mock_data_after_task3.yaml", "w") as file:
-            yaml.safe_dump(
-                mock_data, file, default_flow_style=False, sort_keys=False)
-
-    except AuthenticationError as auth_err:
-        logger.error("Authentication Error: %s", auth_err)
-    except Exception as e:
-        logger.error("Error: %s", e)
-
-
-def task4() -> None:
-    # This function needs mock_data_after_task3.yaml file
-    # It needs to be run after task3
-    # It ingests usage data. It generates any number of usage events (measurements) with random values
-    # Usage timestamps are created for December.
-
-    # Before ingesting usage in task4, go to the function generate_measurements_payload above
-    # and update the aggregation names (keys) in measure field:
-    # memory_consumption_api_x, execution_time_api_x
-
-    try:
-        # Load mock data
-        with open("mock_data_after_task3.yaml", "r") as file:
-            mock_data = yaml.safe_load(file)
-
-        # Initialize client
-        client = M3terApiClient(access_key=config.access_key,
-                                api_secret=config.api_secret, org_id=config.org_id)
-        # Authenticate
-        client.authenticate()
-
-        # for random usage timestamps. ts will be between below two dates
-        start_ts = "2024-12-01T00:00:00.000Z"
-        end_ts = "2024-12-31T20:00:00.000Z"
-
-        # fields to be used in measurements payload
-        meter_code = mock_data["Meter"]["code"]
-        accounts = mock_data["Account"]
-
-        # Generating random single measurement and ingesting for each account
-        size = 1
-        for account in accounts:
-            account_code = account["code"]
-            measurements = generate_measurements_payload(
-                meter_code, account_code, start_ts, end_ts, size)
-            client.ingest_usage(payload=measurements)
-
-        # Generating random 120 measurements and ingesting for each account
-        size = 120
-        for account in accounts:
-            account_code = account["code"]
-            measurements = generate_measurements_payload(
-                meter_code, account_code, start_ts, end_ts, size)
-            client.ingest_usage(payload=measurements)
-
-    except AuthenticationError as auth_err:
-        logger.error("Authentication Error: %s", auth_err)
-    except Exception as e:
-        logger.error("Error: %s", e)
+def _task_options(args: argparse.Namespace, *names: str) -> dict:
+    # only pass the flags that were given, the tasks keep their own defaults
+    return {name: getattr(args, name) for name in names if getattr(args, name) is not None}
+
+
+def _report_startup(args: argparse.Namespace) -> None:
+    elapsed = time.perf_counter() - _STARTED
+    if args.timing:
+        logger.info("Startup took %.1f ms (budget %.0f ms)", elapsed * 1000, STARTUP_BUDGET * 1000)
+    if elapsed > STARTUP_BUDGET:
+        logger.warning("Startup took %.1f ms, over the %.0f ms budget",
+                       elapsed * 1000, STARTUP_BUDGET * 1000)
+
+
+def run_provision(args: argparse.Namespace) -> bool:
+    _report_startup(args)
+    import tasks
+
+    if args.task == "all":
+        return tasks.provision_all(**_task_options(args, "mock_data_path", "max_workers", "state_db"))
+    if args.task == "1":
+        return tasks.task1(**_task_options(args, "mock_data_path"))
+    if args.task == "2":
+        return tasks.task2(**_task_options(args, "mock_data_path"))
+    return tasks.task3(**_task_options(args, "mock_data_path"))
+
+
+def run_ingest(args: argparse.Namespace) -> bool:
+    _report_startup(args)
+    import tasks
+
+    if args.file:
+        columns = dict(column.split("=", 1) for column in args.column) if args.column else None
+        return tasks.task4_from_file(args.file, columns=columns, **_task_options(
+            args, "file_format", "batch_size", "max_in_flight", "mock_data_path", "gzip_level"))
+    if args.processes:
+        return tasks.task4_sharded(processes=args.processes, **_task_options(
+            args, "size", "batch_size", "max_in_flight", "mock_data_path", "gzip_level"))
+    return tasks.task4(**_task_options(args, "mock_data_path", "size", "batch_size", "spool_dir",
+                                       "gzip_level", "dedupe_dir"))
+
+
+def run_replay(args: argparse.Namespace) -> bool:
+    _report_startup(args)
+    import tasks
+    return tasks.replay(**_task_options(args, "spool_dir", "dedupe_dir"))
+
+
+def run_load(args: argparse.Namespace) -> bool:
+    _report_startup(args)
+    import tasks
+
+    profile = args.profile or f"{args.duration:g}:{args.rate:g}"
+    return tasks.task4_load(profile, **_task_options(
+        args, "arrivals", "batch_size", "max_in_flight", "accounts", "meters", "url", "seed",
+        "mock_data_path"))
+
+
+def run_bench(args: argparse.Namespace) -> bool:
+    import importlib
+    _report_startup(args)
+    module = importlib.import_module(f"benchmarks.bench_{args.benchmark}")
+    # the benchmark parses its own options
+    sys.argv = [f"bench {args.benchmark}"] + args.options
+    result = module.main()
+    return result is None or bool(result)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="m3ter provisioning and usage ingest tasks")
+    parser.add_argument("--log-level", default="INFO",
+                        choices=("DEBUG", "INFO", "WARNING", "ERROR"))
+    parser.add_argument("--log-format", choices=("text", "json"), default="text",
+                        help="json writes one object per line with the event fields")
+    parser.add_argument("--timing", action="store_true",
+                        help="log the startup time of the command line")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    provision = subparsers.add_parser(
+        "provision", help="create the product catalog and accounts (task1 - task3)")
+    provision.add_argument("--task", choices=("1", "2", "3", "all"), default="all",
+                           help="run one task, or all of them in one concurrent run (default)")
+    provision.add_argument("--mock-data", dest="mock_data_path",
+                           help="input catalog (default mock_data.yaml, or the previous "
+                                "task's output for --task 2 and 3)")
+    provision.add_argument("--workers", dest="max_workers", type=int,
+                           help="entities created concurrently")
+    provision.add_argument("--state-db", help="resume state database")
+    provision.set_defaults(handler=run_provision)
+
+    ingest = subparsers.add_parser(
+        "ingest", help="ingest usage (task4): random, from a file, or sharded over processes")
+    ingest.add_argument("--mock-data", dest="mock_data_path",
+                        help="catalog with m3ter ids (default mock_data_after_task3.yaml)")
+    ingest.add_argument("--file", help="CSV or JSONL file to ingest instead of random usage")
+    ingest.add_argument("--format", dest="file_format", choices=("csv", "jsonl"),
+                        help="file format, by default taken from the extension")
+    ingest.add_argument("--column", action="append", metavar="FIELD=COLUMN",
+                        help="map a measurement field to a file column, repeatable")
+    ingest.add_argument("--size", type=int,
+                        help="random measurements per account")
+    ingest.add_argument("--processes", type=int,
+                        help="generate and send random usage with this many worker processes")
+    ingest.add_argument("--batch-size", type=int, help="measurements per ingest request")
+    ingest.add_argument("--concurrency", dest="max_in_flight", type=int,
+                        help="ingest requests in flight (per process)")
+    ingest.add_argument("--spool-dir", help="ingest spool directory")
+    ingest.add_argument("--dedupe-dir", help="directory of accepted measurement uids")
+    ingest.add_argument("--gzip-level", type=int, choices=range(1, 10), metavar="1-9",
+                        help="gzip-compress request bodies at this zlib level")
+    ingest.set_defaults(handler=run_ingest)
+
+    replay = subparsers.add_parser("replay", help="resend spooled batches that were not delivered")
+    replay.add_argument("--spool-dir", help="ingest spool directory")
+    replay.add_argument("--dedupe-dir", help="directory of accepted measurement uids")
+    replay.set_defaults(handler=run_replay)
+
+    load = subparsers.add_parser(
+        "load", help="open-loop ingest load at a target rate, with latency percentiles")
+    load.add_argument("--rate", type=float, default=100.0, help="events (measurements) per second")
+    load.add_argument("--duration", type=float, default=60.0, help="seconds")
+    load.add_argument("--profile", metavar="DURATION:RATE[-RATE],...",
+                      help="load stages instead of --rate/--duration, e.g. 30:100-1000,120:1000")
+    load.add_argument("--arrivals", choices=("constant", "poisson"),
+                      help="event arrival process (default constant)")
+    load.add_argument("--batch-size", type=int, help="events per ingest request")
+    load.add_argument("--concurrency", dest="max_in_flight", type=int,
+                      help="ingest requests in flight")
+    load.add_argument("--accounts", type=int,
+                      help="distinct accounts; beyond the catalog's, synthetic codes are used")
+    load.add_argument("--meters", type=int,
+                      help="distinct meters; beyond the catalog's, synthetic codes are used")
+    load.add_argument("--url", help="send to this stand-in (e.g. benchmarks.stub_server) "
+                                    "instead of m3ter")
+    load.add_argument("--seed", type=int, help="seed for reproducible arrival times")
+    load.add_argument("--mock-data", dest="mock_data_path",
+                      help="catalog with m3ter ids (default mock_data_after_task3.yaml)")
+    load.set_defaults(handler=run_load)
+
+    bench = subparsers.add_parser("bench", help="run an offline benchmark")
+    bench.add_argument("benchmark", choices=BENCHMARKS)
+    bench.add_argument("options", nargs=argparse.REMAINDER,
+                       help="options of the benchmark, see bench <name> --help")
+    bench.set_defaults(handler=run_bench)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=args.log_level,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.log_format == "json":
+        from m3ter_client.structured_log import JsonLogFormatter
+        for handler in logging.getLogger().handlers:
+            handler.setFormatter(JsonLogFormatter())
+    return 0 if args.handler(args) else 1
 
 
 if __name__ == "__main__":
-
-    # update mock_data.yaml if needed before you run task1
-    # to verify changes run each task at a in below order
-    # see READ.md
-
-    # task1()
-    # task2()
-    # task3()
-
-    # Before ingesting usage in task4, go to the function generate_measurements_payload above
-    # and update the aggregation names (keys) in measure field:
-    # memory_consumption_api_x, execution_time_api_x
-    task4()
+    sys.exit(main())
@@ -0,0 +1,525 @@
+import logging
+
+import yaml
+
+import config
+from m3ter_client.api_client import M3terApiClient
+from m3ter_client.auth import AuthenticationError
+from m3ter_client.batcher import MAX_BATCH_SIZE, IngestBatcher
+from m3ter_client.dead_letter import DeadLetterFile
+from m3ter_client.dedupe import UidDeduplicator
+from m3ter_client.file_ingest import DEFAULT_MAX_IN_FLIGHT, ingest_file
+from m3ter_client.generator import generate_measurements_payload
+from m3ter_client.load_generator import (CONSTANT, DEFAULT_LOAD_BATCH_SIZE,
+                                         DEFAULT_LOAD_IN_FLIGHT, load_codes, parse_profile,
+                                         run_load)
+from m3ter_client.provisioning import DEFAULT_MAX_WORKERS, provision
+from m3ter_client.schema import MeterSchema
+from m3ter_client.sharded_ingest import DEFAULT_WORKER_IN_FLIGHT, sharded_ingest
+from m3ter_client.spool import IngestSpool, replay_spool
+from m3ter_client.state_store import ProvisioningStateStore
+
+# Logging is configured by the command line entry point in main.py
+logger = logging.getLogger(__name__)
+
+# Access token is cached here between runs, so each task can skip authentication
+TOKEN_CACHE_FILE = ".m3ter_token_cache.json"
+# Outgoing ingest batches are spooled here until the server accepted them
+INGEST_SPOOL_DIR = "ingest_spool"
+# Uids of measurements the server accepted, so retries and replays skip them
+INGEST_DEDUPE_DIR = "ingest_dedupe"
+# Measurements that failed validation against the Meter, with the reasons
+INGEST_DEAD_LETTER_FILE = "ingest_rejected.jsonl"
+# Ids of entities created by provision_all, used to resume a failed run
+PROVISIONING_STATE_DB = "provisioning_state.db"
+
+
+def create_pricing_payload(mock_data, client=None):
+    # This function gets aggregation M3ter ids from mock_data
+    # and adds them to the payload of pricing
+    # it avoids manual work
+    # it is called in task2()
+    #
+    # A pricing with an "aggregationCode" is linked by that code, looked up
+    # in m3ter through the client's code index (one bulk listing, then local hits).
+    # Otherwise the description keyword is matched against aggregation names.
+
+    # Extract the Aggregations and Pricings
+    aggregations = mock_data["Aggregation"]
+    pricings = mock_data["Pricing"]
+
+    # Create a keyword-based mapping from aggregation names to their IDs
+    aggregation_map = {}
+    for agg in aggregations:
+        if "Requests" in agg["name"]:
+            aggregation_map["Requests"] = agg["id"]
+        elif "Duration" in agg["name"]:
+            aggregation_map["Duration"] = agg["id"]
+
+    # Map the IDs to the pricing description fields
+    for pricing in pricings:
+        aggregation_code = pricing.pop("aggregationCode", None)
+        if aggregation_code is not None and client is not None:
+            aggregation_id = client.find_id("aggregations", aggregation_code)
+            if aggregation_id is None:
+                raise Exception(f"Failed to find aggregation '{aggregation_code}' for pricing")
+            pricing["aggregationId"] = aggregation_id
+            continue
+
+        description = pricing["description"]
+
+        # Update the aggregationId based on the description keyword
+        pricing["aggregationId"] = aggregation_map.get(description)
+
+
+def task1(mock_data_path="mock_data.yaml") -> bool:
+    # This function needs mock_data.yaml file
+    # It creates below  entities:
+    #
+    # Product: AWS Lambda API X
+    # Meter: Compute and Requests Meter API X
+    # Aggregations:
+    #     - Duration Aggregation API X
+    #     - Total Number of Requests API X
+
+    try:
+        # Load mock data
+        with open(mock_data_path, "r") as file:
+            mock_data = yaml.safe_load(file)
+
+        # Initialize client
+        with M3terApiClient(access_key=config.access_key,
+                            api_secret=config.api_secret, org_id=config.org_id,
+                            token_cache_path=TOKEN_CACHE_FILE) as client:
+
+            # Authenticate
+            client.authenticate()
+
+            # Create Product
+            product_name = mock_data["Product"]["name"]
+            product_code = mock_data["Product"]["code"]
+            # Make create product request
+            product_response = client.create_product(
+                name=product_name, code=product_code)
+            product_id = product_response.get("id")
+            # Save m3ter product id for other requests: create_meter
+            mock_data["Product"]["id"] = product_id
+
+            # Create Meter
+            mock_data["Meter"]["productId"] = mock_data["Product"]["id"]
+            meter_payload = mock_data["Meter"]
+            # Make create meter request
+            meter_response = client.create_meter(payload=meter_payload)
+            meter_id = meter_response.get("id")
+            # Save m3ter meter id for other requests: create_aggregations
+            mock_data["Meter"]["id"] = meter_id
+
+            # Create 2 Aggregations required in the task
+            aggregations = mock_data["Aggregation"]
+            for aggregation_payload in aggregations:
+                # add meterId to aggregation payload
+                aggregation_payload["meterId"] = meter_id
+                aggregation_response = client.create_aggregation(
+                    aggregation_payload)
+                aggregation_id = aggregation_response.get("id")
+                aggregation_payload["id"] = aggregation_id
+
+            # After M3ter entities are created, mock data is updated with M3ter ids
+            # and saved in this new yaml file for task 2: mock_data_after_task1.yaml
+            with open("mock_data_after_task1.yaml", "w") as file:
+                yaml.safe_dump(
+                    mock_data, file, default_flow_style=False, sort_keys=False)
+
+    except AuthenticationError as auth_err:
+        logger.error("Authentication Error: %s", auth_err)
+        return False
+    except Exception as e:
+        logger.error("Error: %s", e)
+        return False
+
+    return True
+
+
+def task2(mock_data_path="mock_data_after_task1.yaml") -> bool:
+    # This function needs mock_data_after_task1.yaml file
+    # It needs to be run after task1
+    # It creates below  entities:
+    #
+    # Plan Template: Lambda Template API X
+    # Plan: Lambda Plan API X
+    # Pricing
+
+    try:
+        # Load mock data
+        with open(mock_data_path, "r") as file:
+            mock_data = yaml.safe_load(file)
+
+        # Initialize client
+        with M3terApiClient(access_key=config.access_key,
+                            api_secret=config.api_secret, org_id=config.org_id,
+                            token_cache_path=TOKEN_CACHE_FILE) as client:
+
+            # Authenticate
+            client.authenticate()
+
+            # Create PlanTemplate
+            mock_data["PlanTemplate"]["productId"] = mock_data["Product"]["id"]
+            plan_template_payload = mock_data["PlanTemplate"]
+            # Make create plan template request
+            plan_template_response = client.create_plan_template(
+                payload=plan_template_payload)
+            # Save m3ter planTemplate id for other requests
+            plan_template_id = plan_template_response.get("id")
+            mock_data["PlanTemplate"]["id"] = plan_template_id
+
+            # Create Plan
+            mock_data["Plan"]["planTemplateId"] = mock_data["PlanTemplate"]["id"]
+            plan_payload = mock_data["Plan"]
+            plan_response = client.create_plan(payload=plan_payload)
+            # Save m3ter plan id for other requests
+            plan_id = plan_response.get("id")
+            mock_data["Plan"]["id"] = plan_id
+
+            # Create Pricing
+            # Generate Pricing Payload
+            create_pricing_payload(mock_data, client)
+
+            # Create 2 pricing components of the plan required in the task
+            pricings = mock_data["Pricing"]
+            for pricing_payload in pricings:
+
+                pricing_payload["planId"] = plan_id
+                pricing_response = client.create_pricing(pricing_payload)
+                pricing_id = pricing_response.get("id")
+                pricing_payload["id"] = pricing_id
+
+            # After M3ter entities are created, mock data is updated with M3ter ids
+            # and saved in this new yaml file for task 3: mock_data_after_task2.yaml
+            with open("mock_data_after_task2.yaml", "w") as file:
+                yaml.safe_dump(
+                    mock_data, file, default_flow_style=False, sort_keys=False)
+
+    except AuthenticationError as auth_err:
+        logger.error("Authentication Error: %s", auth_err)
+        return False
+    except Exception as e:
+        logger.error("Error: %s", e)
+        return False
+
+    return True
+
+
+def task3(mock_data_path="mock_data_after_task2.yaml") -> bool:
+    # This function needs mock_data_after_task2.yaml file
+    # It needs to be run after task2
+    # It creates below  entities:
+    #
+    # Account:
+    #   - Mickey Mouse Inc API X
+    #   - Donald Duck Ltd API X
+    #   - Pluto LLP API X
+    # AccountPlan (see attached plans for each account in the UI)
+
+    try:
+        # Load mock data
+        with open(mock_data_path, "r") as file:
+            mock_data = yaml.safe_load(file)
+
+        # Initialize client
+        with M3terApiClient(access_key=config.access_key,
+                            api_secret=config.api_secret, org_id=config.org_id,
+                            token_cache_path=TOKEN_CACHE_FILE) as client:
+            # Authenticate
+            client.authenticate()
+
+            # Create Accounts and AccountPlans
+            # Extract the list of accounts from mock_data
+            accounts = mock_data["Account"]
+            # add plan id to the account plan payload
+            mock_data["AccountPlan"]["planId"] = mock_data["Plan"]["id"]
+            account_plan_payload = mock_data["AccountPlan"]
+
+            for account_payload in accounts:
+                # make account request
+                account_response = client.create_account(account_payload)
+                account_id = account_response.get("id")
+                account_payload["id"] = account_id
+                # make account plan request
+                account_plan_payload["accountId"] = account_id
+                client.create_account_plan(account_plan_payload)
+
+            # After M3ter entities are created, mock data is updated with M3ter ids
+            # and saved in this new yaml file: mock_data_after_task3.yaml
+            with open("mock_data_after_task3.yaml", "w") as file:
+                yaml.safe_dump(
+                    mock_data, file, default_flow_style=False, sort_keys=False)
+
+    except AuthenticationError as auth_err:
+        logger.error("Authentication Error: %s", auth_err)
+        return False
+    except Exception as e:
+        logger.error("Error: %s", e)
+        return False
+
+    return True
+
+
+def provision_all(mock_data_path="mock_data.yaml", max_workers=DEFAULT_MAX_WORKERS,
+                  state_db=PROVISIONING_STATE_DB) -> bool:
+    # This function needs mock_data.yaml file
+    # It creates every entity of task1, task2 and task3 in one run.
+    # Independent entities (aggregations, pricings, accounts, account plans)
+    # are created concurrently as soon as the ids they depend on are known.
+    # Every created id is recorded in provisioning_state.db right away, so
+    # rerunning after a failure skips the entities that already exist.
+    # Result is saved in mock_data_after_task3.yaml, so task4 can run next.
+
+    try:
+        # Load mock data
+        with open(mock_data_path, "r") as file:
+            mock_data = yaml.safe_load(file)
+
+        # Initialize client
+        with M3terApiClient(access_key=config.access_key,
+                            api_secret=config.api_secret, org_id=config.org_id,
+                            token_cache_path=TOKEN_CACHE_FILE) as client:
+            # Authenticate
+            client.authenticate()
+
+            # Create all entities, m3ter ids are filled into mock_data
+            with ProvisioningStateStore(state_db) as state_store:
+                provision(client, mock_data, max_workers=max_workers,
+                          state_store=state_store)
+
+        with open("mock_data_after_task3.yaml", "w") as file:
+            yaml.safe_dump(
+                mock_data, file, default_flow_style=False, sort_keys=False)
+
+    except AuthenticationError as auth_err:
+        logger.error("Authentication Error: %s", auth_err)
+        return False
+    except Exception as e:
+        logger.error("Error: %s", e)
+        return False
+
+    return True
+
+
+def task4(mock_data_path="mock_data_after_task3.yaml", size=120,
+          batch_size=MAX_BATCH_SIZE, spool_dir=INGEST_SPOOL_DIR, gzip_level=None,
+          dedupe_dir=INGEST_DEDUPE_DIR) -> bool:
+    # This function needs mock_data_after_task3.yaml file
+    # It needs to be run after task3
+    # It ingests usage data. It generates any number of usage events (measurements) with random values
+    # Usage timestamps are created for December.
+    # The measure keys are the data field codes of the Meter in mock_data_after_task3.yaml,
+    # and every batch is checked against that Meter before it is sent.
+    # Invalid measurements are written to ingest_rejected.jsonl instead.
+    # Set gzip_level (1-9) to send gzip-compressed request bodies.
+    # Uids the server accepted are remembered in dedupe_dir and never sent twice.
+
+    try:
+        # Load mock data
+        with open(mock_data_path, "r") as file:
+            mock_data = yaml.safe_load(file)
+
+        # Initialize client
+        with M3terApiClient(access_key=config.access_key,
+                            api_secret=config.api_secret, org_id=config.org_id,
+                            token_cache_path=TOKEN_CACHE_FILE, gzip_level=gzip_level) as client:
+            # Authenticate
+            client.authenticate()
+
+            # for random usage timestamps. ts will be between below two dates
+            start_ts = "2024-12-01T00:00:00.000Z"
+            end_ts = "2024-12-31T20:00:00.000Z"
+
+            # fields to be used in measurements payload
+            meter_code = mock_data["Meter"]["code"]
+            accounts = mock_data["Account"]
+            # measure codes are the Meter's memory_consumption / execution_time fields
+            schema = MeterSchema.from_mock_data(mock_data)
+
+            with IngestSpool(spool_dir) as spool, \
+                    DeadLetterFile(INGEST_DEAD_LETTER_FILE) as dead_letter, \
+                    UidDeduplicator(dedupe_dir) as dedupe:
+                # Resend batches a previous run could not deliver
+                replay_spool(client, spool, dead_letter, dedupe)
+
+                # Generating random single measurement and size (120) random measurements for each account.
+                # Measurements are queued on the batcher, which coalesces them
+                # into as few ingest requests as the Measurements API allows.
+                # Each batch is validated and spooled to disk before it is sent
+                with IngestBatcher(client, max_batch_size=batch_size, spool=spool,
+                                   schema=schema, dead_letter=dead_letter,
+                                   dedupe=dedupe) as batcher:
+                    for count in (1, size):
+                        for account in accounts:
+                            account_code = account["code"]
+                            measurements = generate_measurements_payload(
+                                meter_code, account_code, start_ts, end_ts, count,
+                                schema=schema)
+                            for measurement in measurements["measurements"]:
+                                batcher.add(measurement)
+
+            # Batches that could not be delivered stay in the spool for replay,
+            # rejected measurements are in the dead letter file
+            if batcher.failed_measurements or batcher.rejected_measurements:
+                logger.error("%s measurements failed, %s rejected (see %s)",
+                             batcher.failed_measurements, batcher.rejected_measurements,
+                             INGEST_DEAD_LETTER_FILE)
+                return False
+
+    except AuthenticationError as auth_err:
+        logger.error("Authentication Error: %s", auth_err)
+        return False
+    except Exception as e:
+        logger.error("Error: %s", e)
+        return False
+
+    return True
+
+
+def task4_from_file(path, columns=None, file_format=None, batch_size=MAX_BATCH_SIZE,
+                    max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                    mock_data_path="mock_data_after_task3.yaml", gzip_level=None) -> bool:
+    # Ingests usage from a CSV or JSONL file instead of random data.
+    # columns maps measurement fields to file columns, e.g.
+    # {"account": "customer_id", "ts": "timestamp", "measure.memory_consumption_api_x": "mem_mb"}
+    # Rows without a meter column are ingested for the meter in mock_data_after_task3.yaml.
+    # If the run is interrupted, run it again: it resumes from <path>.checkpoint
+
+    try:
+        with open(mock_data_path, "r") as file:
+            mock_data = yaml.safe_load(file)
+
+        with M3terApiClient(access_key=config.access_key,
+                            api_secret=config.api_secret, org_id=config.org_id,
+                            token_cache_path=TOKEN_CACHE_FILE, gzip_level=gzip_level) as client:
+            client.authenticate()
+            # Rows the API rejects are written to ingest_rejected.jsonl, the rest is ingested
+            with DeadLetterFile(INGEST_DEAD_LETTER_FILE) as dead_letter:
+                progress = ingest_file(client, path, file_format=file_format, columns=columns,
+                                       defaults={"meter": mock_data["Meter"]["code"]},
+                                       batch_size=batch_size, max_in_flight=max_in_flight,
+                                       dead_letter=dead_letter)
+            logger.info("Ingested %s measurements from %s, %s rejected",
+                        progress.measurements, path, progress.rejected)
+
+    except AuthenticationError as auth_err:
+        logger.error("Authentication Error: %s", auth_err)
+        return False
+    except Exception as e:
+        logger.error("Error: %s", e)
+        return False
+
+    return True
+
+
+def task4_sharded(size=100000, processes=None, batch_size=MAX_BATCH_SIZE,
+                  max_in_flight=DEFAULT_WORKER_IN_FLIGHT,
+                  mock_data_path="mock_data_after_task3.yaml", gzip_level=None) -> bool:
+    # Generates and ingests size random measurements for each account of
+    # mock_data_after_task3.yaml with one worker process per CPU core,
+    # for producing large usage volumes quickly
+
+    try:
+        with open(mock_data_path, "r") as file:
+            mock_data = yaml.safe_load(file)
+
+        schema = MeterSchema.from_mock_data(mock_data)
+        measures = {schema.field_code("memory_consumption"): (1, 100),
+                    schema.field_code("execution_time"): (1000, 5000)}
+
+        result = sharded_ingest(
+            config.access_key, config.api_secret, config.org_id,
+            mock_data["Meter"]["code"], [account["code"] for account in mock_data["Account"]],
+            size, measures, "2024-12-01T00:00:00.000Z", "2024-12-31T20:00:00.000Z",
+            processes=processes, token_cache_path=TOKEN_CACHE_FILE,
+            batch_size=batch_size, max_in_flight=max_in_flight, gzip_level=gzip_level)
+
+        for error in result.errors:
+            logger.error("Error: %s", error)
+        if result.failed:
+            return False
+
+    except AuthenticationError as auth_err:
+        logger.error("Authentication Error: %s", auth_err)
+        return False
+    except Exception as e:
+        logger.error("Error: %s", e)
+        return False
+
+    return True
+
+
+def task4_load(profile="60:100", arrivals=CONSTANT, batch_size=DEFAULT_LOAD_BATCH_SIZE,
+               max_in_flight=DEFAULT_LOAD_IN_FLIGHT, accounts=None, meters=None, url=None,
+               seed=None, mock_data_path="mock_data_after_task3.yaml") -> bool:
+    # Drives ingest at a target rate of events (measurements) per second for a
+    # fixed time, e.g. profile "30:100-1000,120:1000" (see parse_profile), to
+    # find out how much load one client can push and at what latency.
+    # The Meter and Accounts of mock_data_after_task3.yaml are used; accounts /
+    # meters pick fewer, or add synthetic codes for a stand-in server at url.
+    # Nothing is spooled: the measurements are random and only the timing counts.
+
+    try:
+        with open(mock_data_path, "r") as file:
+            mock_data = yaml.safe_load(file)
+
+        schema = MeterSchema.from_mock_data(mock_data)
+        measures = {schema.field_code("memory_consumption"): (1, 100),
+                    schema.field_code("execution_time"): (1000, 5000)}
+        meter_codes = load_codes([mock_data["Meter"]["code"]], meters, "load-meter")
+        account_codes = load_codes([account["code"] for account in mock_data["Account"]],
+                                   accounts, "load-account")
+        endpoints = {"base_url": url, "ingest_url": url} if url else {}
+
+        with M3terApiClient(access_key=config.access_key,
+                            api_secret=config.api_secret, org_id=config.org_id,
+                            token_cache_path=None if url else TOKEN_CACHE_FILE,
+                            pool_maxsize=max_in_flight, **endpoints) as client:
+            client.authenticate()
+            result = run_load(client, parse_profile(profile), meter_codes, account_codes,
+                              measures, "2024-12-01T00:00:00.000Z", "2024-12-31T20:00:00.000Z",
+                              arrivals=arrivals, batch_size=batch_size,
+                              max_in_flight=max_in_flight, seed=seed)
+        logger.info("Load test finished\n%s", result.format_report())
+        if result.errors:
+            return False
+
+    except AuthenticationError as auth_err:
+        logger.error("Authentication Error: %s", auth_err)
+        return False
+    except Exception as e:
+        logger.error("Error: %s", e)
+        return False
+
+    return True
+
+
+def replay(spool_dir=INGEST_SPOOL_DIR, dedupe_dir=INGEST_DEDUPE_DIR) -> bool:
+    # Resends the ingest batches left in the spool by earlier task4 runs,
+    # e.g. after an outage, without generating new usage
+
+    try:
+        with M3terApiClient(access_key=config.access_key,
+                            api_secret=config.api_secret, org_id=config.org_id,
+                            token_cache_path=TOKEN_CACHE_FILE) as client:
+            client.authenticate()
+
+            with IngestSpool(spool_dir) as spool, \
+                    DeadLetterFile(INGEST_DEAD_LETTER_FILE) as dead_letter, \
+                    UidDeduplicator(dedupe_dir) as dedupe:
+                _, failed = replay_spool(client, spool, dead_letter, dedupe)
+                if failed:
+                    return False
+
+    except AuthenticationError as auth_err:
+        logger.error("Authentication Error: %s", auth_err)
+        return False
+    except Exception as e:
+        logger.error("Error: %s", e)
+        return False
+
+    return True
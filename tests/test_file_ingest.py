@@ -0,0 +1,50 @@
+import json
+
+from m3ter_client.dead_letter import DeadLetterFile, read_dead_letters
+from m3ter_client.file_ingest import ingest_file
+
+
+class FakeClient:
+    def __init__(self):
+        self.measurements = []
+
+    def ingest_usage_body(self, body, measurement_count=None):
+        self.measurements.extend(json.loads(body)["measurements"])
+        return {}
+
+
+def test_corrupt_jsonl_line_is_dead_lettered(tmp_path):
+    path = tmp_path / "usage.jsonl"
+    path.write_text(
+        '{"uid": "a", "meter": "api_calls", "measure": {"calls": 1}}\n'
+        '{"uid": "b", "meter": "api_calls", "measure": \n'
+        '{"uid": "c", "meter": "api_calls", "measure": {"calls": 3}}\n')
+    client = FakeClient()
+
+    with DeadLetterFile(str(tmp_path / "dead.jsonl")) as dead_letter:
+        progress = ingest_file(client, str(path), dead_letter=dead_letter)
+
+    assert [measurement["uid"] for measurement in client.measurements] == ["a", "c"]
+    assert progress.measurements == 2
+    assert progress.rejected == 1
+    assert progress.offset == path.stat().st_size
+    entries = list(read_dead_letters(str(tmp_path / "dead.jsonl")))
+    assert len(entries) == 1
+    assert entries[0]["measurement"].startswith('{"uid": "b"')
+
+
+def test_non_numeric_csv_measure_is_dead_lettered(tmp_path):
+    path = tmp_path / "usage.csv"
+    path.write_text("uid,meter,measure.calls\n"
+                    "a,api_calls,1\n"
+                    "b,api_calls,lots\n"
+                    "c,api_calls,3\n")
+    client = FakeClient()
+
+    with DeadLetterFile(str(tmp_path / "dead.jsonl")) as dead_letter:
+        progress = ingest_file(client, str(path), dead_letter=dead_letter)
+
+    assert [measurement["measure"]["calls"] for measurement in client.measurements] == [1, 3]
+    assert progress.rejected == 1
+    entries = list(read_dead_letters(str(tmp_path / "dead.jsonl")))
+    assert entries[0]["measurement"] == {"uid": "b", "meter": "api_calls", "measure.calls": "lots"}
@@ -0,0 +1,26 @@
+import pytest
+
+from m3ter_client.rating import ShadowRater
+
+METER = {"code": "compute", "dataFields": [
+    {"code": "memory", "category": "MEASURE"},
+    {"code": "seconds", "category": "MEASURE"}]}
+AGGREGATIONS = [
+    {"code": "memory_sum", "name": "Memory", "targetField": "memory", "aggregation": "SUM"},
+    {"code": "seconds_sum", "name": "Seconds", "targetField": "seconds", "aggregation": "SUM"}]
+
+
+def test_null_values_are_rated_as_missing():
+    rater = ShadowRater(METER, AGGREGATIONS, [])
+    rater.add([
+        {"account": "acme", "measure": {"memory": 2.0, "seconds": 3.0}},
+        {"account": "acme", "measure": {"memory": None, "seconds": 4.0}},
+        {"account": "acme", "measure": None},
+        {"account": "acme"},
+    ])
+
+    quantities = rater.quantities()
+    assert quantities["memory_sum"].tolist() == pytest.approx([2.0])
+    assert quantities["seconds_sum"].tolist() == pytest.approx([7.0])
+    assert rater.measurements == 4
+    assert rater.null_values == 1
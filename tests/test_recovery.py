@@ -0,0 +1,59 @@
+import requests
+
+from m3ter_client.recovery import ingest_with_recovery
+
+
+def _rejected(message="Invalid request body"):
+    response = requests.Response()
+    response.status_code = 400
+    response._content = ('{"message": "%s"}' % message).encode()
+    error = requests.HTTPError(f"400 Client Error: {message}")
+    error.response = response
+    return error
+
+
+def _send_rejecting(bad, sent):
+    def send(part):
+        if any(measurement["uid"] in bad for measurement in part):
+            raise _rejected()
+        sent.extend(part)
+    return send
+
+
+def _batch(size):
+    return [{"uid": f"m-{i}", "meter": "api_calls"} for i in range(size)]
+
+
+def test_two_adjacent_bad_leading_rows_are_isolated():
+    batch = _batch(8)
+    sent = []
+    result = ingest_with_recovery(_send_rejecting({"m-0", "m-1"}, sent), batch)
+
+    assert result.error is None
+    assert result.sent == 6
+    assert result.failed == []
+    assert [measurement["uid"] for measurement, _ in result.rejected] == ["m-0", "m-1"]
+    assert sorted(m["uid"] for m in sent) == [f"m-{i}" for i in range(2, 8)]
+
+
+def test_batch_refused_as_a_whole_fails():
+    batch = _batch(8)
+
+    def send(part):
+        raise _rejected()
+
+    result = ingest_with_recovery(send, batch)
+
+    assert result.error is not None
+    assert result.sent == 0
+    assert result.rejected == []
+    assert sorted(m["uid"] for m in result.failed) == sorted(m["uid"] for m in batch)
+
+
+def test_two_row_batch_with_both_rows_bad_is_rejected():
+    batch = _batch(2)
+    result = ingest_with_recovery(_send_rejecting({"m-0", "m-1"}, []), batch)
+
+    assert result.error is None
+    assert result.failed == []
+    assert len(result.rejected) == 2
@@ -0,0 +1,14 @@
+import pytest
+
+from m3ter_client.sharded_ingest import sharded_ingest
+
+
+@pytest.mark.parametrize("account_codes, size", [([], 100), (["acme", "globex"], 0)])
+def test_nothing_to_send_returns_empty_result(account_codes, size):
+    result = sharded_ingest("key", "secret", "org", "api_calls", account_codes, size,
+                            {"calls": (1, 10)}, "2024-01-01T00:00:00.000Z", "2024-01-02T00:00:00.000Z")
+
+    assert result.sent == 0
+    assert result.failed == 0
+    assert result.shards == []
+    assert result.errors == []